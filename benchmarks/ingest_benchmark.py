@@ -0,0 +1,84 @@
+"""
+Ingest time of a big video: the old copy into media storage vs media_ingest.
+
+A file of `size_mb` MiB is written to `source_dir` (stands in for /bot_data)
+and put into `dest_dir` (VIDEO_STORAGE_DIR) by:
+- copy2: shutil.copy2, what the bot did before
+- ingest: media_ingest.ingest_file, a hard link on the same filesystem
+- ingest (no links): the rename fallback
+- ingest (other fs): the chunked copy fallback
+Give directories on different filesystems to see the real cross-device path.
+The page cache is warm after writing the source, a cold copy is slower.
+
+Usage:
+    python benchmarks/ingest_benchmark.py [size_mb] [source_dir] [dest_dir]
+"""
+import errno
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import media_ingest
+from media_ingest import ingest_file
+
+
+def make_source(path: str, size_mb: int) -> None:
+    block = os.urandom(1024 * 1024)
+    with open(path, "wb") as f:
+        for _ in range(size_mb):
+            f.write(block)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def no_link(error_number):
+    def link(*args):
+        raise OSError(error_number, os.strerror(error_number))
+    return link
+
+
+def run(name: str, ingest, source_dir: str, dest_dir: str, size_mb: int) -> None:
+    source = os.path.join(source_dir, "file_0.mp4")
+    dest = os.path.join(dest_dir, "video.mp4")
+    make_source(source, size_mb)
+    started = time.perf_counter()
+    ingest(source, dest)
+    elapsed = time.perf_counter() - started
+    assert os.path.getsize(dest) == size_mb * 1024 * 1024
+    print(f"{name:>20}: {elapsed * 1000:10.1f} ms")
+    for path in (source, dest):
+        if os.path.exists(path):
+            os.unlink(path)
+
+
+def main():
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 2048
+    with tempfile.TemporaryDirectory() as tmp:
+        source_dir = sys.argv[2] if len(sys.argv) > 2 else os.path.join(tmp, "bot_data")
+        dest_dir = sys.argv[3] if len(sys.argv) > 3 else os.path.join(tmp, "media")
+        os.makedirs(source_dir, exist_ok=True)
+        os.makedirs(dest_dir, exist_ok=True)
+        print(f"{size_mb} MiB, {source_dir} -> {dest_dir}")
+
+        def copy2(source, dest):
+            shutil.copy2(source, dest)
+            os.unlink(source)
+
+        run("copy2", copy2, source_dir, dest_dir, size_mb)
+        run("ingest", ingest_file, source_dir, dest_dir, size_mb)
+        link = media_ingest.os.link
+        try:
+            media_ingest.os.link = no_link(errno.EPERM)
+            run("ingest (no links)", ingest_file, source_dir, dest_dir, size_mb)
+            media_ingest.os.link = no_link(errno.EXDEV)
+            run("ingest (other fs)", ingest_file, source_dir, dest_dir, size_mb)
+        finally:
+            media_ingest.os.link = link
+
+
+if __name__ == "__main__":
+    main()
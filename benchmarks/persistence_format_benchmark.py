@@ -0,0 +1,135 @@
+"""
+Size and flush time of user_data: pickle vs persistence_format.MsgpackSerializer.
+
+Builds a synthetic dataset of N users whose user_data looks like the bot's:
+a copy of the "user" row, the active tournament, timetable buttons, a state
+handler and a long messages_to_delete list. Then measures
+
+- PicklePersistence: one pickle file with all users (what the bot used before);
+- pickle rows: one pickled row per user (PostgresPersistence default);
+- msgpack rows: one MsgpackSerializer row per user.
+
+Flush time is serialization of every user plus writing the bytes to a file.
+No database is needed: referenced rows are read back from the dataset itself.
+
+Usage:
+    python benchmarks/persistence_format_benchmark.py [users]
+"""
+import datetime
+import os
+import pickle
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from telegram import InlineKeyboardButton
+
+from persistence import PickleSerializer
+from persistence_format import MsgpackSerializer
+
+
+def process_input_nickname(update, context):
+    pass
+
+
+class DatasetRows:
+    """Answers the row lookups of MsgpackSerializer.loads from the dataset."""
+    def __init__(self, users: dict, tournaments: dict):
+        self.users = users
+        self.tournaments = tournaments
+
+    def get_user_on_telegram_id(self, telegram_id: int) -> dict:
+        return dict(self.users[telegram_id])
+
+    def get_tournament_on_id(self, tournament_id: int) -> dict:
+        return dict(self.tournaments[tournament_id])
+
+
+def build_dataset(n: int):
+    rnd = random.Random(1)
+    now = datetime.datetime(2025, 10, 1, 18, 0)
+    tournaments = {
+        i: {
+            "tournament_id": i, "tg_channel": "@repchess", "message_id": 1000 + i,
+            "date_time": now + datetime.timedelta(days=i), "is_open": True, "results_uploaded": False,
+        }
+        for i in range(1, 8)
+    }
+    buttons = [
+        [InlineKeyboardButton(str(i), callback_data=f"timetable:{i}:@repchess:{1000 + i}") for i in range(1, 8)],
+        [InlineKeyboardButton("<< Назад", callback_data="go_main_menu")],
+    ]
+    users, user_data = {}, {}
+    for telegram_id in range(10**8, 10**8 + n):
+        users[telegram_id] = {
+            "user_id": telegram_id - 10**8 + 1, "telegram_id": telegram_id, "public_id": rnd.randint(101, 999999),
+            "is_admin": False, "name": "Иван", "surname": "Петров", "nickname": f"player{telegram_id % 100000}",
+            "age": rnd.randint(8, 70), "city_id": 1, "rep_rating": rnd.randint(800, 2200),
+            "lichess_rating": rnd.choice((None, rnd.randint(800, 2500))), "chesscom_rating": None,
+            "games_played": rnd.randint(0, 300), "phone": None, "last_contact": now,
+        }
+        user_data[telegram_id] = {
+            "user_db_data": dict(users[telegram_id]),
+            "active_tournament": dict(tournaments[rnd.randint(1, 7)]),
+            "timetable_buttons": buttons,
+            "text_state": process_input_nickname if rnd.random() < 0.1 else None,
+            "forwarded_state": None,
+            "file_state": None,
+            "messages_to_delete": [rnd.randint(1, 10**6) for _ in range(rnd.randint(0, 400))],
+        }
+    return user_data, DatasetRows(users, tournaments)
+
+
+def flush_rows(serializer, user_data: dict) -> tuple[int, float]:
+    started = time.perf_counter()
+    size = 0
+    with tempfile.TemporaryFile() as f:
+        for data in user_data.values():
+            raw = serializer.dumps(data)
+            size += len(raw)
+            f.write(raw)
+        f.flush()
+        os.fsync(f.fileno())
+    return size, time.perf_counter() - started
+
+
+def flush_pickle_file(user_data: dict) -> tuple[int, float]:
+    started = time.perf_counter()
+    with tempfile.TemporaryFile() as f:
+        # PicklePersistence dumps all of its data at once
+        pickle.dump({"user_data": user_data}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        f.flush()
+        os.fsync(f.fileno())
+        size = f.tell()
+    return size, time.perf_counter() - started
+
+
+def load_rows(serializer, user_data: dict) -> float:
+    rows = [serializer.dumps(data) for data in user_data.values()]
+    started = time.perf_counter()
+    for raw in rows:
+        serializer.loads(raw)
+    return time.perf_counter() - started
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    user_data, rows = build_dataset(n)
+    pickle_rows, msgpack_rows = PickleSerializer(), MsgpackSerializer(rows)
+
+    results = [
+        ("PicklePersistence", *flush_pickle_file(user_data), None),
+        ("pickle rows", *flush_rows(pickle_rows, user_data), load_rows(pickle_rows, user_data)),
+        ("msgpack rows", *flush_rows(msgpack_rows, user_data), load_rows(msgpack_rows, user_data)),
+    ]
+    print(f"{n} users")
+    for name, size, flush, load in results:
+        load_str = f", load {load:.2f}s" if load is not None else ""
+        print(f"{name:>18}: {size / 2**20:8.1f} MiB, flush {flush:.2f}s{load_str}")
+
+
+if __name__ == "__main__":
+    main()
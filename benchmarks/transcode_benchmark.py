@@ -0,0 +1,72 @@
+"""
+Single-decode transcoding vs one ffmpeg run per rendition.
+
+Both modes of VideoProcessor produce the same 480p and 1080p files. The
+two-pass mode decodes the source twice, the single mode decodes it once and
+`split`s the frames between the two encoders. Wall time and the CPU time of
+the ffmpeg processes (user + sys of the children) are measured.
+
+Without a path a sample clip is generated with ffmpeg's test source.
+
+Usage:
+    python benchmarks/transcode_benchmark.py [video_path] [seconds_of_sample]
+"""
+import asyncio
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from video_processor import ENCODE, VideoProcessor
+
+
+def make_sample(path: str, seconds: int) -> None:
+    subprocess.run([
+        "ffmpeg", "-y", "-v", "error",
+        "-f", "lavfi", "-i", f"testsrc2=size=1920x1080:rate=30:duration={seconds}",
+        "-f", "lavfi", "-i", f"sine=frequency=440:duration={seconds}",
+        "-c:v", "libx264", "-preset", "veryfast", "-c:a", "aac", "-shortest", path,
+    ], check=True)
+
+
+def children_cpu() -> float:
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+async def run(mode: str, source: str, storage_dir: str, video_id: int) -> tuple[float, float]:
+    processor = VideoProcessor(bot=None, video_storage_dir=storage_dir, transcode_mode=mode)
+    video_dir = processor.video_storage_dir / f"video_{video_id}"
+    video_dir.mkdir(parents=True, exist_ok=True)
+
+    cpu_before = children_cpu()
+    started = time.perf_counter()
+    # both renditions fully encoded, the planner would remux the 1080p of the sample
+    paths = await processor._convert_planned(source, video_dir, video_id, {"480p": ENCODE, "1080p": ENCODE})
+    elapsed = time.perf_counter() - started
+    if len(paths) != 2:
+        raise RuntimeError(f"{mode} transcoding failed")
+    return elapsed, children_cpu() - cpu_before
+
+
+async def main():
+    with tempfile.TemporaryDirectory() as storage_dir:
+        if len(sys.argv) > 1:
+            source = sys.argv[1]
+        else:
+            seconds = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+            source = os.path.join(storage_dir, "sample.mp4")
+            make_sample(source, seconds)
+        print(f"source: {source} ({os.path.getsize(source) / 2 ** 20:.1f} MiB)")
+
+        for video_id, mode in enumerate(("two-pass", "single")):
+            elapsed, cpu = await run(mode, source, storage_dir, video_id)
+            print(f"{mode:>8}: wall {elapsed:7.2f}s, ffmpeg cpu {cpu:7.2f}s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,72 @@
+"""
+Throughput of PerUserUpdateProcessor with different concurrency limits.
+
+`users` users send `updates` updates each, all at once. A handler waits
+`handler_ms` (a db query / Bot API call) and records the order, like the bot's
+handlers. Updates are fed the way Application does it: a task per update in
+the order of arrival. The limit 1 is the old sequential processing.
+
+Usage:
+    python benchmarks/update_processor_benchmark.py [users] [updates_per_user] [handler_ms]
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from telegram import Bot, Update
+
+from update_processor import PerUserUpdateProcessor
+
+BOT = Bot("123:abc")
+
+
+def make_update(update_id: int, user_id: int) -> Update:
+    return Update.de_json({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 1700000000,
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Load"},
+            "text": "/start",
+        },
+    }, BOT)
+
+
+async def run(limit: int, updates: list, handler_seconds: float) -> tuple[float, bool]:
+    processor = PerUserUpdateProcessor(max_concurrent_updates=limit)
+    seen = {}
+
+    async def handler(update):
+        await asyncio.sleep(handler_seconds)
+        seen.setdefault(update.effective_user.id, []).append(update.update_id)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        asyncio.create_task(processor.process_update(update, handler(update))) for update in updates
+    ))
+    elapsed = time.perf_counter() - started
+    in_order = all(ids == sorted(ids) for ids in seen.values())
+    return elapsed, in_order
+
+
+async def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    per_user = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    handler_seconds = (float(sys.argv[3]) if len(sys.argv) > 3 else 20) / 1000
+
+    updates = [make_update(i, user_id=i % users) for i in range(users * per_user)]
+    print(f"{users} users x {per_user} updates, handler {handler_seconds * 1000:.0f}ms")
+    for limit in (1, 4, 16, 64):
+        elapsed, in_order = await run(limit, updates, handler_seconds)
+        print(
+            f"limit {limit:3d}: {len(updates) / elapsed:8.1f} updates/s "
+            f"({elapsed:.2f}s), per-user order {'kept' if in_order else 'BROKEN'}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
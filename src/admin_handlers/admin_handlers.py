@@ -16,6 +16,8 @@ from .check_chess_availability import admin_check_chess_kits_handlers
 from .add_new_city import admin_add_new_city_handlers
 from .delete_city import admin_delete_city_handlers
 from .video_management import admin_video_management_handlers
+from .db_stats import admin_db_stats_handlers
+from .send_stats import admin_send_stats_handlers
 
 
 admin_callback_handlers = admin_main_menu_handlers + \
@@ -35,4 +37,6 @@ admin_delete_admin_handlers + \
 admin_delete_user_from_tournament_handlers + \
 admin_add_new_city_handlers + \
 admin_delete_city_handlers + \
-admin_video_management_handlers
+admin_video_management_handlers + \
+admin_db_stats_handlers + \
+admin_send_stats_handlers
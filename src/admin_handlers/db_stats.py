@@ -0,0 +1,74 @@
+from telegram import Update
+from telegram.ext import CommandHandler, ContextTypes
+
+from databaseAPI import rep_chess_db
+from db_metrics import query_metrics
+from .admin_main_menu import SUPER_ADMIN_ID
+
+
+def construct_cache_stats_message(title: str, cache) -> str:
+    stats = cache.stats()
+    return (
+        f"{title}:\n"
+        f"  размер: {stats['size']}/{stats['maxsize']}\n"
+        f"  попадания: {stats['hits']}, промахи: {stats['misses']} ({stats['hit_rate']:.1%})\n"
+        f"  вытеснено: {stats['evictions']}"
+    )
+
+
+def construct_pool_stats_message() -> str:
+    stats = rep_chess_db.pool.stats()
+    return (
+        "Пул соединений:\n"
+        f"  открыто: {stats['size']}/{stats['maxconn']}, занято: {stats['in_use']} (максимум {stats['max_in_use']})\n"
+        f"  выдано: {stats['checkouts']}, с ожиданием: {stats['waits']}\n"
+        f"  ожидание: среднее {stats['wait_avg'] * 1000:.1f}мс, максимум {stats['wait_max'] * 1000:.1f}мс\n"
+        f"  таймауты: {stats['timeouts']}, ошибки: {stats['errors']}, битые соединения: {stats['broken']}"
+    )
+
+
+def construct_slow_methods_message(n: int) -> str:
+    rows = query_metrics.top(n)
+    if not rows:
+        return "Запросов к базе ещё не было"
+    lines = [f"Самые медленные методы с запуска (топ {n}):"]
+    for row in rows:
+        lines.append(
+            f"{row['method'].split('.')[-1]}: {row['count']} раз, "
+            f"ср. {row['avg_ms']:.1f}мс, p95 ≤{row['p95_ms']:.0f}мс, макс. {row['max_ms']:.1f}мс"
+            + (f", ошибок {row['errors']}" if row["errors"] else "")
+        )
+    return "\n".join(lines)
+
+
+async def admin_db_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    telegram_id = update.message.from_user.id
+    if not (rep_chess_db.is_admin(telegram_id) or telegram_id == SUPER_ADMIN_ID):
+        await context.bot.send_message(update.effective_chat.id, "Хорошая попытка, но ты не админ :)")
+        return
+
+    await context.bot.send_message(
+        update.effective_chat.id,
+        "\n\n".join((
+            construct_cache_stats_message("Кэш пользователей", rep_chess_db.user_cache),
+            construct_cache_stats_message("Кэш подписок", rep_chess_db.entitlement_cache),
+            construct_pool_stats_message(),
+        ))
+    )
+
+
+async def admin_db_slow(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/db_slow [N] - top N slowest db methods since startup."""
+    telegram_id = update.message.from_user.id
+    if not (rep_chess_db.is_admin(telegram_id) or telegram_id == SUPER_ADMIN_ID):
+        await context.bot.send_message(update.effective_chat.id, "Хорошая попытка, но ты не админ :)")
+        return
+
+    n = int(context.args[0]) if context.args and context.args[0].isdigit() else 10
+    await context.bot.send_message(update.effective_chat.id, construct_slow_methods_message(n))
+
+
+admin_db_stats_handlers = [
+    CommandHandler("db_stats", admin_db_stats),
+    CommandHandler("db_slow", admin_db_slow),
+]
@@ -8,6 +8,7 @@ from telegram.ext import (
 
 from databaseAPI import rep_chess_db
 from start import main_menu_reply_keyboard
+from timetable_handlers import timetable_cache
 
 
 async def delete_forwarded_timetable(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -24,6 +25,7 @@ async def delete_forwarded_timetable(update: Update, context: ContextTypes.DEFAU
         tg_channel,
         message_id
     )
+    timetable_cache.invalidate(tg_channel)
     context.user_data["forwarded_state"] = None
     await context.bot.send_message(update.effective_chat.id, "Запрос обработан. Проверьте, что все успешно.", reply_markup=main_menu_reply_keyboard(context))
 
@@ -46,6 +48,7 @@ async def delete_link_timetable(update: Update, context: ContextTypes.DEFAULT_TY
         return
 
     rep_chess_db.remove_tournament(channel, int(message_id))
+    timetable_cache.invalidate(channel)
     await context.bot.send_message(update.effective_chat.id, "Запрос обработан. Проверьте, что все успешно.", reply_markup=main_menu_reply_keyboard(context))
 
 
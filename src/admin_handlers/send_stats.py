@@ -0,0 +1,61 @@
+from telegram import Update
+from telegram.ext import CommandHandler, ContextTypes
+
+from bot_request import bot_request
+from databaseAPI import rep_chess_db
+from rate_limiter import Priority, send_limiter
+from .admin_main_menu import SUPER_ADMIN_ID
+
+POOL_TITLES = {
+    "interactive": "Соединения для ответов",
+    "media": "Соединения для видео и файлов",
+}
+
+PRIORITY_TITLES = {
+    Priority.INTERACTIVE: "Ответы пользователям",
+    Priority.PAYMENT: "Платежи",
+    Priority.BULK: "Рассылки",
+}
+
+
+def construct_send_stats_message() -> str:
+    stats = send_limiter.stats()
+    lines = ["Очередь отправки:"]
+    for priority, title in PRIORITY_TITLES.items():
+        row = stats[priority.name.lower()]
+        lines.append(
+            f"{title}: в очереди {row['queued']}, отправлено {row['sent']}, "
+            f"ожидание ср. {row['wait_avg'] * 1000:.0f}мс, макс. {row['wait_max'] * 1000:.0f}мс, "
+            f"flood control {row['retry_after']}"
+        )
+    if stats["paused_for"]:
+        lines.append(f"Отправка приостановлена ещё на {stats['paused_for']:.1f}с")
+    return "\n".join(lines)
+
+
+def construct_pool_stats_message() -> str:
+    lines = ["Соединения с Bot API:"]
+    for name, stats in bot_request.stats().items():
+        lines.append(
+            f"{POOL_TITLES[name]}: занято {stats['in_flight']}/{stats['size']} (максимум {stats['max_in_flight']}), "
+            f"запросов {stats['requests']}, ср. {stats['time_avg'] * 1000:.0f}мс, макс. {stats['time_max']:.1f}с, "
+            f"ошибок {stats['errors']}, нет свободного соединения {stats['pool_timeouts']}"
+        )
+    return "\n".join(lines)
+
+
+async def admin_send_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    telegram_id = update.message.from_user.id
+    if not (rep_chess_db.is_admin(telegram_id) or telegram_id == SUPER_ADMIN_ID):
+        await context.bot.send_message(update.effective_chat.id, "Хорошая попытка, но ты не админ :)")
+        return
+
+    await context.bot.send_message(
+        update.effective_chat.id,
+        "\n\n".join((construct_send_stats_message(), construct_pool_stats_message()))
+    )
+
+
+admin_send_stats_handlers = [
+    CommandHandler("send_stats", admin_send_stats),
+]
@@ -2,69 +2,38 @@ import datetime
 import io
 import csv
 import logging
+import time
 
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import CallbackQueryHandler, ContextTypes
 
-from databaseAPI import rep_chess_db
+from databaseAPI import rep_chess_db, async_rep_chess_db
+from tournament_results import build_tournament_results
 from util import construct_timetable_buttons
 
 
 logger = logging.getLogger(__name__)
 
 
-result_mapping = {
-    "+": 1,
-    "=": 0.5,
-    "-": 0,
-}
-
-
-def process_game_results(tournament_id: int, results: tuple[dict]):
+def process_game_results(tournament_id: int, results: tuple[dict], close_registration: bool = False) -> dict:
     """
     If any error appears - just throw an exception.
     It is no point to correctly process all the possible errors because
     we parse file that shouldn't contain any nonsence.
+    Everything is written in one transaction, so a broken file changes nothing.
     """
-    number_of_tours = int(max(tour for tour in results[0].keys() if tour.startswith("Тур #")).split("#")[1])
-    for row in results:
-        nickname = row["Имя"].strip()
-        user_in_tournament = rep_chess_db.get_user_on_tournament_on_nickname(tournament_id, nickname)
-        # Unknown user in tournament, just ignore him.
-        if not user_in_tournament:
-            continue
-        user_id = user_in_tournament["user_id"]
-        games_played = 0
-
-        for tour_number in range(1, number_of_tours + 1):
-            str_res = row[f"Тур #{tour_number}"].strip()
-            if not str_res:
-                continue
-            games_played += 1
-            float_res = result_mapping[str_res[0]]
-            if "W" in str_res:
-                black_user_in_tournament = rep_chess_db.get_user_on_tournament_on_nickname(tournament_id, results[int(str_res.split("W")[1]) - 1]["Имя"].strip())
-                if not black_user_in_tournament:
-                    continue
-                black_user_id = black_user_in_tournament["user_id"]
-                rep_chess_db.add_game(tournament_id, user_id, black_user_id, tour_number, float_res)
-            if str_res.startswith("+BYE"):
-                black_user_in_tournament = rep_chess_db.get_user_on_tournament_on_nickname(tournament_id, results[int(str_res.split("E")[1]) - 1]["Имя"].strip())
-                if not black_user_in_tournament:
-                    continue
-                black_user_id = black_user_in_tournament["user_id"]
-                rep_chess_db.add_game(tournament_id, user_id, black_user_id, tour_number, float_res)
-
-        new_rating = int(row["Новый рейтинг"].strip())
-        rep_chess_db.update_user_on_tournament(
-            tournament_id,
-            nickname,
-            new_rating,
-            int(row["#"].strip()),
-            float(row["Очки"].strip().replace(",", "."))
-        )
-        rep_chess_db.update_user_games_played(user_id, games_played)
-        rep_chess_db.update_user_rep_rating_with_user_id(user_id, new_rating)
+    started = time.perf_counter()
+    registered = {row["nickname"]: row for row in rep_chess_db.get_registered_users(tournament_id)}
+    games, players = build_tournament_results(results, registered)
+    parse_time = time.perf_counter() - started
+
+    with rep_chess_db.transaction():
+        timings = rep_chess_db.ingest_tournament_results(tournament_id, games, players)
+        rep_chess_db.results_uploaded(tournament_id)
+        if close_registration:
+            rep_chess_db.close_registration(tournament_id)
+    timings["parse"] = parse_time
+    return timings
 
 
 async def process_tournament_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -77,6 +46,8 @@ async def process_tournament_file(update: Update, context: ContextTypes.DEFAULT_
         return
 
     tournament_id = context.user_data["uploaded_tournament_id"]
+    tournament_key = f"tournament_{tournament_id}"
+    close_registration = tournament_key in context.bot_data["tournaments"]
     file = await update.message.document.get_file()
     with io.BytesIO() as iofile:
         await file.download_to_memory(iofile)
@@ -84,18 +55,17 @@ async def process_tournament_file(update: Update, context: ContextTypes.DEFAULT_
         with io.TextIOWrapper(iofile, encoding="utf-8-sig") as text_file:
             results = tuple(csv.DictReader(text_file, delimiter=";"))
             try:
-                process_game_results(tournament_id, results)
+                timings = await async_rep_chess_db.run(process_game_results, tournament_id, results, close_registration)
             except Exception as e: # here it is ok I think
                 await update.message.reply_text("Оу... Не получилось обработать файл. Вы уверены, что загрузили нужный файл?")
                 logger.info(e)
                 return
+    logger.info(f"tournament {tournament_id} results processed in {sum(timings.values()):.3f}s: {timings}")
 
-    rep_chess_db.results_uploaded(tournament_id)
     await update.message.reply_text("Результаты обработаны! Игроки могут посмотреть обновленный рейтинг.")
 
-    if f"tournament_{tournament_id}" in context.bot_data["tournaments"]:
-        del context.bot_data["tournaments"][f"tournament_{tournament_id}"]
-        rep_chess_db.close_registration(tournament_id)
+    if close_registration:
+        del context.bot_data["tournaments"][tournament_key]
     context.user_data["file_state"] = None
     context.user_data["uploaded_tournament_id"] = None
 
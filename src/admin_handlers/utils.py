@@ -4,20 +4,22 @@ from pathlib import Path
 import time
 from typing import Optional
 
+from media_ingest import ingest_telegram_file
+from video_processor import VIDEO_UPLOAD_DIR
+
 async def _download_video_to_persistent(file_id: str, bot) -> Optional[Path]:
     """Download video immediately after upload and save to persistent storage."""
     try:
         file = await bot.get_file(file_id)
-        # saved to /app/data/media/uploads
-        # VIDEO_STORAGE_DIR = os.getenv("VIDEO_STORAGE_DIR") or "/app/data/media"
-
-        upload_dir = Path(os.getenv("VIDEO_STORAGE_DIR", "/app/data/media"))
+        # originals go to VIDEO_UPLOAD_DIR, renditions stay in VIDEO_STORAGE_DIR/video_<id>
+        upload_dir = Path(VIDEO_UPLOAD_DIR)
         upload_dir.mkdir(parents=True, exist_ok=True)
 
         safe_name = f"{file_id}_{int(time.time())}.mp4"
         dest_path = upload_dir / safe_name
 
-        await file.download_to_drive(str(dest_path))
+        # local Bot API server: a hard link to its file, no copy (see media_ingest)
+        await ingest_telegram_file(file, dest_path)
 
         if not dest_path.exists() or dest_path.stat().st_size == 0:
             raise ValueError("Downloaded file is empty")
@@ -1,11 +1,12 @@
 import logging
-import asyncio
+import os
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, MessageHandler, filters, CallbackQueryHandler
 
-from databaseAPI import rep_chess_db
+from databaseAPI import rep_chess_db, async_rep_chess_db
 from .admin_main_menu import admin_main_menu
 from video_processor import VideoProcessor
+from video_jobs import video_jobs
 from .utils import _download_video_to_persistent
 
 logger = logging.getLogger(__name__)
@@ -311,34 +312,14 @@ async def admin_save_video_and_process(update: Update, context: ContextTypes.DEF
                 f"lesson_number={lesson_number} before adding new video"
             )
         
-        # Save video to database with pending status
-        rep_chess_db.add_video(
-            file_id_480p=None,
-            file_id_1080p=None,
-            title=metadata["title"],
-            description=metadata["description"],
-            category=category,
-            lesson_number=lesson_number,
-            original_file_id=metadata["original_file_id"],
-            original_path=metadata["original_path"],
-            processing_status="pending"
-        )
-        
-        # Get the video ID that was just created
-        videos = rep_chess_db.get_videos_by_category(category)
-        if not videos:
-            await update.message.reply_text("❌ Ошибка: не удалось найти созданное видео.")
-            return
-        video_id = videos[-1]["id"]
-        
         # Clear context data
         context.user_data["video_metadata"] = {}
         context.user_data["text_state"] = None
         
-        # Show initial processing message
+        # Show initial processing message, the worker edits it with the progress
         cleanup_msg = f"\n\n(Удалено {deleted_count} старых видео с этим номером урока)" if deleted_count > 0 else ""
         initial_message = await update.message.reply_text(
-            f"""🎬 **Начинаю обработку видео...**
+            f"""🎬 **Видео поставлено в очередь на обработку...**
 
 📝 **{metadata['title']}**
 
@@ -347,8 +328,22 @@ async def admin_save_video_and_process(update: Update, context: ContextTypes.DEF
             parse_mode="Markdown"
         )
         
-        # Start background processing with the initial message
-        asyncio.create_task(process_video_background(context.bot, video_id, metadata, update.effective_chat.id, initial_message))
+        # Save video to database with pending status, it is a job for the video workers now
+        video_id = rep_chess_db.add_video(
+            file_id_480p=None,
+            file_id_1080p=None,
+            title=metadata["title"],
+            description=metadata["description"],
+            category=category,
+            lesson_number=lesson_number,
+            original_file_id=metadata["original_file_id"],
+            original_path=metadata["original_path"],
+            processing_status="pending",
+            notify_chat_id=update.effective_chat.id,
+            notify_message_id=initial_message.message_id,
+        )
+        logger.info(f"Video {video_id} queued for processing")
+        video_jobs.notify()
         
     except Exception as e:
         logger.error(f"Error saving video to database: {e}")
@@ -357,168 +352,101 @@ async def admin_save_video_and_process(update: Update, context: ContextTypes.DEF
             reply_markup=video_management_keyboard
         )
 
-async def process_video_background(bot, video_id: int, metadata: dict, chat_id: int, initial_message=None):
-    """Background task to process video with progress notifications"""
-    progress_message = initial_message
+async def _edit_or_send(bot, video: dict, text: str, reply_markup=None):
+    chat_id = video["notify_chat_id"]
+    if not chat_id:
+        return
+    try:
+        if video["notify_message_id"]:
+            await bot.edit_message_text(
+                chat_id=chat_id,
+                message_id=video["notify_message_id"],
+                text=text,
+                parse_mode="Markdown",
+                reply_markup=reply_markup
+            )
+        else:
+            await bot.send_message(chat_id=chat_id, text=text, parse_mode="Markdown", reply_markup=reply_markup)
+    except Exception as e:
+        logger.warning(f"Failed to notify about video {video['id']}: {e}")
+
+async def process_video_job(bot, video: dict, last_attempt: bool) -> bool:
+    """Process one claimed video (see video_jobs.py) with progress notifications"""
+    video_id = video["id"]
     
     async def progress_callback(percentage: int, message: str):
         """Send progress updates to admin"""
-        nonlocal progress_message
-        try:
-            # Create progress bar
-            progress_bar = "█" * (percentage // 5) + "░" * (20 - percentage // 5)
-            progress_text = f"🎬 **Обработка видео**\n\n📝 **{metadata['title']}**\n\n{message}\n\n`[{progress_bar}] {percentage}%`"
-            
-            if progress_message:
-                # Edit existing message
-                await bot.edit_message_text(
-                    chat_id=chat_id,
-                    message_id=progress_message.message_id,
-                    text=progress_text,
-                    parse_mode="Markdown"
-                )
-        except Exception as e:
-            logger.warning(f"Failed to send progress update: {e}")
+        # Create progress bar
+        progress_bar = "█" * (percentage // 5) + "░" * (20 - percentage // 5)
+        attempt_text = f" (попытка {video['attempts']})" if video["attempts"] > 1 else ""
+        progress_text = f"🎬 **Обработка видео{attempt_text}**\n\n📝 **{video['title']}**\n\n{message}\n\n`[{progress_bar}] {percentage}%`"
+        if video["notify_message_id"]:
+            await _edit_or_send(bot, video, progress_text)
     
-    try:
-        processor = VideoProcessor(bot, progress_callback=progress_callback)
-        
-        # Check if FFmpeg is available
-        if not processor._check_ffmpeg_available():
-            # Delete video from database since FFmpeg is not available
-            rep_chess_db.delete_video(video_id)
-            
-            error_msg = f"""❌ **Критическая ошибка обработки**
-
-📝 **{metadata['title']}**
-
-Видео не удалось обработать."""
-            logger.error("FFmpeg is not available on the system")
-            
-            if progress_message:
-                await bot.edit_message_text(
-                    chat_id=chat_id,
-                    message_id=progress_message.message_id,
-                    text=error_msg,
-                    parse_mode="Markdown"
-                )
-            else:
-                await bot.send_message(chat_id=chat_id, text=error_msg, parse_mode="Markdown")
-            return
-        
-        # Process video
+    processor = VideoProcessor(bot, progress_callback=progress_callback)
+    
+    # Check if FFmpeg is available
+    if not processor._check_ffmpeg_available():
+        logger.error("FFmpeg is not available on the system")
+        file_id_480p = file_id_1080p = None
+    else:
         file_id_480p, file_id_1080p = await processor.process_video(
-            metadata["original_path"],
+            video["original_path"],
             video_id,
-            metadata["title"],
-            str(chat_id)
+            video["title"],
+            str(video["notify_chat_id"])
         )
-        
-        if file_id_480p and file_id_1080p:
-            # Update database with processed file IDs
-            rep_chess_db.update_video_quality(
-                video_id,
-                file_id_480p=file_id_480p,
-                file_id_1080p=file_id_1080p,
-                processing_status="completed"
-            )
-            
-            # Build success message with video details
-            message_parts = [
-                "🎉 **Видео успешно обработано!**",
-                "",
-                f"📝 **Название**: {metadata['title']}",
-                f"📄 **Описание**: {metadata['description'] if metadata['description'] else 'не указано'}",
-                f"🏷️ **Категория**: {metadata['category']}",
-                f"🔢 **Урок**: {metadata['lesson_number']}",
-                f"📊 **Размер**: {metadata['file_size']:.2f} MB"
-            ]
-            
-            # Only show duration if it's not 0
-            if metadata.get("duration", 0) > 0:
-                message_parts.append(f"⏱️ **Длительность**: {metadata['duration']} сек")
-            
-            # Only show resolution if it's not 0x0
-            if metadata.get("resolution") and metadata["resolution"] != "0x0":
-                message_parts.append(f"📐 **Разрешение**: {metadata['resolution']}")
-            
-            message_parts.extend([
-                "",
-                "🎬 **Доступные качества**:",
-                "• 480p (среднее качество)",
-                "• 1080p (высокое качество)",
-                "",
-                "Видео готово к просмотру!"
-            ])
-            
-            success_msg = "\n".join(message_parts)
-            
-            logger.info(f"Video {video_id} processed successfully")
-            
-            if progress_message:
-                await bot.edit_message_text(
-                    chat_id=chat_id,
-                    message_id=progress_message.message_id,
-                    text=success_msg,
-                    parse_mode="Markdown",
-                    reply_markup=video_management_keyboard
-                )
-            else:
-                await bot.send_message(
-                    chat_id=chat_id, 
-                    text=success_msg, 
-                    parse_mode="Markdown",
-                    reply_markup=video_management_keyboard
-                )
-        else:
-            # Delete failed video from database
-            rep_chess_db.delete_video(video_id)
-            
+    
+    if not (file_id_480p and file_id_1080p):
+        if last_attempt:
+            logger.error(f"Video {video_id} processing failed")
             error_msg = f"""❌ **Ошибка обработки видео**
 
-📝 **{metadata['title']}**
+📝 **{video['title']}**
 
 Видео не удалось обработать."""
-            
-            logger.error(f"Video {video_id} processing failed - deleted from database")
-            
-            if progress_message:
-                await bot.edit_message_text(
-                    chat_id=chat_id,
-                    message_id=progress_message.message_id,
-                    text=error_msg,
-                    parse_mode="Markdown",
-                    reply_markup=video_management_keyboard
-                )
-            else:
-                await bot.send_message(
-                    chat_id=chat_id, 
-                    text=error_msg, 
-                    parse_mode="Markdown",
-                    reply_markup=video_management_keyboard
-                )
-            
-    except Exception as e:
-        # Delete failed video from database
-        rep_chess_db.delete_video(video_id)
-        
-        error_msg = f"""❌ **Критическая ошибка обработки**
+        else:
+            error_msg = f"""⚠️ **Ошибка обработки видео**
 
-📝 **{metadata['title']}**
+📝 **{video['title']}**
 
-Видео не удалось обработать."""
-        
-        logger.error(f"Error in background video processing: {e}", exc_info=True)
-        
-        if progress_message:
-            await bot.edit_message_text(
-                chat_id=chat_id,
-                message_id=progress_message.message_id,
-                text=error_msg,
-                parse_mode="Markdown"
-            )
-        else:
-            await bot.send_message(chat_id=chat_id, text=error_msg, parse_mode="Markdown")
+Попытка {video['attempts']} не удалась, обработка будет повторена позже."""
+        await _edit_or_send(bot, video, error_msg, reply_markup=video_management_keyboard)
+        return False
+    
+    # Update database with processed file IDs
+    if not await async_rep_chess_db.update_video_quality(
+        video_id,
+        file_id_480p=file_id_480p,
+        file_id_1080p=file_id_1080p,
+        processing_status="completed"
+    ):
+        return False
+    
+    # Build success message with video details
+    message_parts = [
+        "🎉 **Видео успешно обработано!**",
+        "",
+        f"📝 **Название**: {video['title']}",
+        f"📄 **Описание**: {video['description'] if video['description'] else 'не указано'}",
+        f"🏷️ **Категория**: {video['category']}",
+        f"🔢 **Урок**: {video['lesson_number']}",
+    ]
+    if video["original_path"] and os.path.exists(video["original_path"]):
+        message_parts.append(f"📊 **Размер**: {os.path.getsize(video['original_path']) / (1024 * 1024):.2f} MB")
+    
+    message_parts.extend([
+        "",
+        "🎬 **Доступные качества**:",
+        "• 480p (среднее качество)",
+        "• 1080p (высокое качество)",
+        "",
+        "Видео готово к просмотру!"
+    ])
+    
+    logger.info(f"Video {video_id} processed successfully")
+    await _edit_or_send(bot, video, "\n".join(message_parts), reply_markup=video_management_keyboard)
+    return True
 
 async def admin_show_uploaded_videos(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Show list of uploaded videos"""
@@ -572,6 +500,7 @@ async def admin_show_uploaded_videos(update: Update, context: ContextTypes.DEFAU
                 status_emoji = {
                     "completed": "✅",
                     "pending": "⏳",
+                    "processing": "🔄",
                     "failed": "❌"
                 }.get(video.get('processing_status', 'unknown'), "❓")
                 
@@ -688,6 +617,7 @@ async def admin_confirm_delete_video(update: Update, context: ContextTypes.DEFAU
         status_emoji = {
             "completed": "✅",
             "pending": "⏳", 
+            "processing": "🔄",
             "failed": "❌"
         }.get(video.get('processing_status', 'unknown'), "❓")
         
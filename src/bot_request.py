@@ -0,0 +1,143 @@
+"""
+HTTP connections to the Bot API server, split in two pools.
+
+Uploading a rendition (VideoProcessor._upload_video) or getFile of a big video
+in local mode holds a connection for minutes. With one pool, menu replies waited
+for a free connection behind them. RoutingRequest sends
+
+- uploads (multipart files or local file:// paths), getFile and file downloads
+  to the media pool with long timeouts;
+- everything else to the interactive pool with short timeouts.
+
+Both pools count in-flight requests, so /send_stats shows how busy they are.
+"""
+import logging
+import os
+import time
+
+import httpx
+from telegram.request import BaseRequest, HTTPXRequest, RequestData
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE_POOL_SIZE = int(os.getenv("BOT_API_POOL_SIZE", "8"))
+INTERACTIVE_TIMEOUT = float(os.getenv("BOT_API_TIMEOUT", "30"))
+MEDIA_POOL_SIZE = int(os.getenv("BOT_API_MEDIA_POOL_SIZE", "4"))
+MEDIA_TIMEOUT = float(os.getenv("BOT_API_MEDIA_TIMEOUT", "600"))
+
+# endpoints which may take a local file path instead of an upload
+FILE_ENDPOINTS = {
+    "sendVideo", "sendDocument", "sendPhoto", "sendAnimation", "sendAudio",
+    "sendVoice", "sendVideoNote", "sendMediaGroup", "sendSticker",
+}
+
+
+class PoolStats:
+    def __init__(self, size: int):
+        self.size = size
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.requests = 0
+        self.errors = 0
+        self.pool_timeouts = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "size": self.size,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "requests": self.requests,
+            "errors": self.errors,
+            "pool_timeouts": self.pool_timeouts,
+            "time_avg": self.total_time / self.requests if self.requests else 0.0,
+            "time_max": self.max_time,
+        }
+
+
+def is_media_request(url: str, request_data: RequestData | None) -> bool:
+    endpoint = url.rsplit("/", 1)[-1]
+    if "/file/bot" in url or endpoint == "getFile":
+        return True
+    if request_data is None:
+        return False
+    if request_data.contains_files:
+        return True
+    if endpoint in FILE_ENDPOINTS:
+        # local mode: the Bot API server reads and uploads the file itself
+        return any(
+            isinstance(value, str) and value.startswith("file://")
+            for value in request_data.parameters.values()
+        )
+    return False
+
+
+class RoutingRequest(BaseRequest):
+    def __init__(self, interactive: BaseRequest, media: BaseRequest, interactive_size: int, media_size: int):
+        self.interactive = interactive
+        self.media = media
+        self.pool_stats = {
+            "interactive": PoolStats(interactive_size),
+            "media": PoolStats(media_size),
+        }
+
+    @property
+    def read_timeout(self) -> float | None:
+        return self.interactive.read_timeout
+
+    async def initialize(self) -> None:
+        await self.interactive.initialize()
+        await self.media.initialize()
+
+    async def shutdown(self) -> None:
+        await self.interactive.shutdown()
+        await self.media.shutdown()
+
+    async def do_request(self, url, method, request_data=None, **timeouts) -> tuple[int, bytes]:
+        name = "media" if is_media_request(url, request_data) else "interactive"
+        request = self.media if name == "media" else self.interactive
+        stats = self.pool_stats[name]
+        stats.in_flight += 1
+        stats.max_in_flight = max(stats.max_in_flight, stats.in_flight)
+        started = time.perf_counter()
+        try:
+            return await request.do_request(url, method, request_data, **timeouts)
+        except Exception as e:
+            stats.errors += 1
+            if isinstance(e.__cause__, httpx.PoolTimeout):
+                stats.pool_timeouts += 1
+                logger.warning(f"no free connection in the {name} pool ({stats.size})")
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            stats.in_flight -= 1
+            stats.requests += 1
+            stats.total_time += elapsed
+            stats.max_time = max(stats.max_time, elapsed)
+
+    def stats(self) -> dict:
+        return {name: stats.as_dict() for name, stats in self.pool_stats.items()}
+
+
+def build_bot_request() -> RoutingRequest:
+    interactive = HTTPXRequest(
+        connection_pool_size=INTERACTIVE_POOL_SIZE,
+        read_timeout=INTERACTIVE_TIMEOUT,
+        write_timeout=INTERACTIVE_TIMEOUT,
+        connect_timeout=10,
+        pool_timeout=10,
+    )
+    media = HTTPXRequest(
+        connection_pool_size=MEDIA_POOL_SIZE,
+        read_timeout=MEDIA_TIMEOUT,
+        write_timeout=MEDIA_TIMEOUT,
+        media_write_timeout=MEDIA_TIMEOUT,
+        connect_timeout=30,
+        # an upload waits for the previous one instead of failing
+        pool_timeout=MEDIA_TIMEOUT,
+    )
+    return RoutingRequest(interactive, media, INTERACTIVE_POOL_SIZE, MEDIA_POOL_SIZE)
+
+
+bot_request = build_bot_request()
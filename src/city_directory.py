@@ -0,0 +1,45 @@
+import threading
+from types import MappingProxyType
+from typing import Callable, NamedTuple
+
+
+class City(NamedTuple):
+    city_id: int
+    name: str
+    tg_channel: str | None
+
+
+class CityDirectory:
+    """
+    All cities in memory: city_id -> City and name -> City.
+    There are only a handful of cities and they change only through the admin
+    city handlers, so the directory is loaded at startup and refresh()-ed after
+    add_city / delete_city. Maps are replaced at once, readers never lock.
+    """
+    def __init__(self, load_rows: Callable[[], list[dict]]):
+        self._load_rows = load_rows
+        self._lock = threading.Lock()
+        # (by_id, by_name), None until the first load
+        self._maps = None
+
+    def refresh(self) -> None:
+        with self._lock:
+            cities = [City(row["city_id"], row["name"], row["tg_channel"]) for row in self._load_rows()]
+            self._maps = (
+                MappingProxyType({city.city_id: city for city in cities}),
+                MappingProxyType({city.name: city for city in cities}),
+            )
+
+    def _get_maps(self):
+        if self._maps is None:
+            self.refresh()
+        return self._maps
+
+    def by_id(self, city_id: int) -> City | None:
+        return self._get_maps()[0].get(city_id)
+
+    def by_name(self, name: str) -> City | None:
+        return self._get_maps()[1].get(name)
+
+    def names(self) -> list[str]:
+        return [city.name for city in self._get_maps()[0].values()]
@@ -1,23 +1,91 @@
 import psycopg2
-from psycopg2 import pool, sql
-from psycopg2.extras import RealDictCursor
+from psycopg2 import sql
+from psycopg2.extras import execute_values
+import asyncio
 import datetime
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from zoneinfo import ZoneInfo
 import logging
 import os
 import sys
-from collections import deque
+import threading
+import time
 from contextlib import contextmanager
 
+from cache import LRUCache
+from db_pool import InstrumentedConnectionPool
+from db_metrics import InstrumentedCursor, timed_methods
+from city_directory import CityDirectory
+from migrations import apply_migrations
+from video_catalog import VideoCatalog
+
 logger = logging.getLogger(__name__)
 MOSCOW_TZ = ZoneInfo("Europe/Moscow")
 
+# Read-through cache of "user" rows, keyed by telegram_id.
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "300"))
+# (active, valid_until) of subscriptions, keyed by telegram_id. Lessons check it on every tap.
+ENTITLEMENT_CACHE_TTL = float(os.getenv("ENTITLEMENT_CACHE_TTL", "600"))
+# Expired subscriptions with auto renew stay active this long, so the renewal can still charge them.
+SUBSCRIPTION_RENEWAL_GRACE = datetime.timedelta(hours=float(os.getenv("SUBSCRIPTION_RENEWAL_GRACE_HOURS", "72")))
+# last_contact is buffered in memory and written in one batch every N seconds (see jobs.py).
+LAST_CONTACT_FLUSH_INTERVAL = float(os.getenv("LAST_CONTACT_FLUSH_INTERVAL", "30"))
+
+
+class _CachedUser:
+    __slots__ = ("row",)
+
+    def __init__(self, row: dict):
+        self.row = row
+
+
+class _TransactionConnection:
+    """
+    Connection which methods get inside RepChessDB.transaction().
+    Their commit() does nothing - everything is committed once at the end,
+    and their rollback() makes the whole transaction fail.
+    """
+    def __init__(self, conn):
+        self._conn = conn
+        self.rollback_only = False
+        self.on_commit = []
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        self.rollback_only = True
+
+    def __getattr__(self, name: str):
+        return getattr(self._conn, name)
+
+
 # who the hell uses sqlite3? and god why
+@timed_methods
 class RepChessDB:
     # Assume that all players amount is less than 1 million.
     MAX_PUBLIC_ID = 1000000
-    # We need this variable to optimize searching public id for new player.
-    FREE_PUBLIC_IDS = deque(maxlen=100000)
+    MIN_PUBLIC_ID = 101
+    # any constant, lets only one bot instance bootstrap the public id sequence
+    PUBLIC_ID_LOCK_KEY = 715001
+    POOL_MIN_CONN = int(os.getenv("DB_POOL_MIN", "1"))
+    POOL_MAX_CONN = int(os.getenv("DB_POOL_MAX", "10"))
+    # seconds to wait for a free connection when all of them are in use
+    POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+    def __init__(self):
+        self.user_cache = LRUCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+        self.entitlement_cache = LRUCache(maxsize=USER_CACHE_SIZE, ttl=ENTITLEMENT_CACHE_TTL)
+        # lessons for lessons_handlers, rebuilt after any change of videos
+        self.video_catalog = VideoCatalog(self.get_all_videos)
+        self.cities = CityDirectory(self._load_cities)
+        # telegram_id -> last contact time which is not written to db yet
+        self._pending_last_contacts = {}
+        self._pending_last_contacts_lock = threading.Lock()
+        # current transaction() of the thread
+        self._local = threading.local()
 
     def initialize(self):
         db_url = os.getenv("DATABASE_URL")
@@ -27,18 +95,21 @@ class RepChessDB:
             sys.exit(1)
 
         try:
-            # initialize connection pool instead of single connection
-            self.pool = psycopg2.pool.SimpleConnectionPool(
-                minconn=1,
-                maxconn=10,
+            # Thread-safe pool because methods are also called from worker threads (see AsyncRepChessDB).
+            self.pool = InstrumentedConnectionPool(
+                minconn=self.POOL_MIN_CONN,
+                maxconn=self.POOL_MAX_CONN,
+                timeout=self.POOL_TIMEOUT,
                 dsn=db_url,
-                cursor_factory=RealDictCursor
+                cursor_factory=InstrumentedCursor
             )
-            logger.info("Database pool initialized (min=1, max=10 connections)")
+            logger.info(f"Database pool initialized (min={self.POOL_MIN_CONN}, max={self.POOL_MAX_CONN} connections, timeout={self.POOL_TIMEOUT}s)")
             
             # create tables and init IDs
             self._create_tables()
-            self._init_free_ids()
+            self._migrate()
+            self._init_public_id_allocator()
+            self.cities.refresh()
             logger.info("Database is ready")
         except Exception as e:
             logger.error(f"Failed to initialize database: {e}")
@@ -46,13 +117,63 @@ class RepChessDB:
 
     @contextmanager
     def get_connection(self):
-        """Get connection from pool with automatic cleanup"""
+        """
+        Get connection from pool with automatic cleanup.
+        Inside transaction() it is the connection of the transaction.
+        """
+        transaction = getattr(self._local, "transaction", None)
+        if transaction is not None:
+            yield transaction
+            return
         conn = self.pool.getconn()
         try:
             yield conn
         finally:
             self.pool.putconn(conn)
 
+    @contextmanager
+    def transaction(self):
+        """
+        Run several methods on one connection and commit once:
+
+            with rep_chess_db.transaction():
+                rep_chess_db.set_user_subscription(...)
+                rep_chess_db.update_subscription_auto_renew(...)
+
+        If anything fails, nothing is written. Nested transaction() joins the outer one.
+        The transaction belongs to the current thread, so from handlers run the whole
+        block in one call: `await async_rep_chess_db.run(func)`.
+        """
+        if getattr(self._local, "transaction", None) is not None:
+            yield
+            return
+
+        conn = self.pool.getconn()
+        transaction = _TransactionConnection(conn)
+        self._local.transaction = transaction
+        try:
+            yield
+            if transaction.rollback_only:
+                raise RuntimeError("Transaction was rolled back by one of its operations")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            self._local.transaction = None
+            self.pool.putconn(conn)
+
+        for callback, args in transaction.on_commit:
+            callback(*args)
+
+    def _after_commit(self, callback, *args):
+        """Call right now, or after the commit of the current transaction()."""
+        transaction = getattr(self._local, "transaction", None)
+        if transaction is not None:
+            transaction.on_commit.append((callback, args))
+        else:
+            callback(*args)
+
     def _create_tables(self):
         with self.get_connection() as conn:
             with conn.cursor() as cur:
@@ -159,19 +280,71 @@ class RepChessDB:
                     CREATE INDEX IF NOT EXISTS idx_videos_category_lesson 
                     ON videos(category, lesson_number)
                 """)
+                # public ids: new ones come from the sequence, ids which were freed are reused first
+                cur.execute(f"""
+                    CREATE SEQUENCE IF NOT EXISTS public_id_seq
+                    MINVALUE {self.MIN_PUBLIC_ID} MAXVALUE {self.MAX_PUBLIC_ID - 1}
+                """)
+                cur.execute("""
+                    CREATE TABLE IF NOT EXISTS released_public_id (
+                        public_id INTEGER PRIMARY KEY
+                    );
+                """)
             conn.commit()
 
-    def _init_free_ids(self):
+    def _migrate(self):
         with self.get_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute('SELECT public_id FROM "user"')
-                occupied = {row["public_id"] for row in cur.fetchall()}
-        
-        for i in range(101, self.MAX_PUBLIC_ID):
-            if len(self.FREE_PUBLIC_IDS) >= 90000:
-                break
-            if i not in occupied:
-                self.FREE_PUBLIC_IDS.appendleft(i)
+            apply_migrations(conn)
+
+    def _init_public_id_allocator(self):
+        """
+        Runs only once for a database: moves the sequence after the biggest used
+        public id and remembers the gaps below it, so they are given out first.
+        """
+        with self.get_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT pg_advisory_xact_lock(%s)", (self.PUBLIC_ID_LOCK_KEY,))
+                    cur.execute("SELECT is_called FROM public_id_seq")
+                    if not cur.fetchone()["is_called"]:
+                        cur.execute('SELECT MAX(public_id) AS max_id FROM "user"')
+                        max_id = cur.fetchone()["max_id"]
+                        if max_id is not None and max_id >= self.MIN_PUBLIC_ID:
+                            cur.execute("""
+                                INSERT INTO released_public_id (public_id)
+                                SELECT g FROM generate_series(%s, %s) AS g
+                                WHERE NOT EXISTS (SELECT 1 FROM "user" WHERE public_id = g)
+                                ON CONFLICT DO NOTHING
+                            """, (self.MIN_PUBLIC_ID, max_id))
+                            cur.execute("SELECT setval('public_id_seq', %s)", (max_id,))
+                            logger.info(f"public id sequence starts after {max_id}")
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                logger.exception(f"_init_public_id_allocator failed: {e}")
+                raise
+
+    def _allocate_public_id(self, cur) -> int:
+        """Take a free public id. Safe with several bot instances (SKIP LOCKED + sequence)."""
+        while True:
+            cur.execute("""
+                DELETE FROM released_public_id
+                WHERE public_id = (
+                    SELECT public_id FROM released_public_id
+                    ORDER BY public_id LIMIT 1
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING public_id
+            """)
+            row = cur.fetchone()
+            if row is None:
+                cur.execute("SELECT nextval('public_id_seq') AS public_id")
+                row = cur.fetchone()
+            public_id = row["public_id"]
+            # admins can set any public id by hand (update_user_public_id)
+            cur.execute('SELECT 1 FROM "user" WHERE public_id = %s', (public_id,))
+            if not cur.fetchone():
+                return public_id
 
     def __del__(self):
         if hasattr(self, "pool") and self.pool:
@@ -196,11 +369,6 @@ class RepChessDB:
         games_played: int = 0,
         age: int | None = None,
     ):
-        if public_id is None:
-            if not self.FREE_PUBLIC_IDS:
-                raise RuntimeError("No free public IDs available")
-            public_id = self.FREE_PUBLIC_IDS.pop()
-
         now = datetime.datetime.now(MOSCOW_TZ)
         first_contact = first_contact or now
         last_contact = last_contact or now
@@ -208,6 +376,11 @@ class RepChessDB:
         with self.get_connection() as conn:
             try:
                 with conn.cursor() as cur:
+                    if public_id is None:
+                        # don't waste an id on a user who is already registered
+                        cur.execute('SELECT public_id FROM "user" WHERE telegram_id = %s', (telegram_id,))
+                        existing = cur.fetchone()
+                        public_id = existing["public_id"] if existing else self._allocate_public_id(cur)
                     cur.execute("""
                         INSERT INTO "user" (
                             telegram_id, public_id, is_admin, name, surname, nickname,
@@ -226,6 +399,7 @@ class RepChessDB:
                         ON CONFLICT (telegram_id) DO NOTHING
                     """, (telegram_id,))
                 conn.commit()
+                self._after_commit(self.user_cache.invalidate, telegram_id)
                 logger.debug(f"register user {telegram_id}, {public_id}, {is_admin}, {name}, {surname}, {nickname}, {city_id}, {first_contact}, {last_contact}, {lichess_rating}, {chesscom_rating}, {rep_rating} {age}")
             except Exception as e:
                 conn.rollback()
@@ -234,35 +408,62 @@ class RepChessDB:
 
     # ================= SUBSCRIPTION =================
     def check_user_active_subscription(self, telegram_id: int) -> bool:
+        """
+        Answered from entitlement_cache until subscription_valid_until, no writes here:
+        lapsed subscriptions are switched off by expire_subscriptions().
+        """
+        entitlement = self.entitlement_cache.get(telegram_id)
+        if entitlement is None:
+            version = self.entitlement_cache.version()
+            with self.get_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        SELECT active_subscription, subscription_valid_until
+                        FROM subscription WHERE telegram_id = %s
+                    """, (telegram_id,))
+                    row = cur.fetchone()
+            entitlement = (row["active_subscription"], row["subscription_valid_until"]) if row else (False, None)
+            self.entitlement_cache.set(telegram_id, entitlement, version=version)
+
+        active, valid_until = entitlement
+        if not active:
+            return False
+        if valid_until is None:
+            return True
+        if valid_until.tzinfo is None:
+            valid_until = valid_until.replace(tzinfo=MOSCOW_TZ)
+        return valid_until >= datetime.datetime.now(MOSCOW_TZ)
+
+    def expire_subscriptions(self) -> int:
+        """
+        Switch off all lapsed subscriptions with one UPDATE. Subscriptions with
+        auto renew get SUBSCRIPTION_RENEWAL_GRACE for the renewal to happen.
+        Returns number of expired subscriptions.
+        """
+        now = datetime.datetime.now(MOSCOW_TZ)
         with self.get_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute("""
-                    SELECT active_subscription, subscription_valid_until
-                    FROM subscription WHERE telegram_id = %s
-                """, (telegram_id,))
-                row = cur.fetchone()
-                if not row:
-                    return False
-                active = row["active_subscription"]
-                valid_until = row["subscription_valid_until"]
-                if not active:
-                    return False
-                if valid_until is None:
-                    return True
-                now = datetime.datetime.now(MOSCOW_TZ)
-                if valid_until.tzinfo is None:
-                    valid_until = valid_until.replace(tzinfo=MOSCOW_TZ)
-                else:
-                    valid_until = valid_until.astimezone(MOSCOW_TZ)
-                if valid_until < now:
-                    with conn.cursor() as c2:
-                        c2.execute("""
-                            UPDATE subscription SET active_subscription = FALSE
-                            WHERE telegram_id = %s
-                        """, (telegram_id,))
-                    conn.commit()
-                    return False
-                return True
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        UPDATE subscription
+                        SET active_subscription = FALSE
+                        WHERE active_subscription = TRUE
+                            AND subscription_valid_until IS NOT NULL
+                            AND subscription_valid_until < %s
+                            AND (subscription_auto_renew = FALSE OR subscription_valid_until < %s)
+                        RETURNING telegram_id
+                    """, (now, now - SUBSCRIPTION_RENEWAL_GRACE))
+                    expired = [row["telegram_id"] for row in cur.fetchall()]
+                conn.commit()
+                for telegram_id in expired:
+                    self._after_commit(self.entitlement_cache.invalidate, telegram_id)
+                if expired:
+                    logger.info(f"expired {len(expired)} subscriptions")
+                return len(expired)
+            except Exception as e:
+                conn.rollback()
+                logger.exception(f"expire_subscriptions failed: {e}")
+                raise
 
     def ensure_subscription_row(self, telegram_id: int) -> None:
         with self.get_connection() as conn:
@@ -294,6 +495,7 @@ class RepChessDB:
                         WHERE telegram_id = %s
                     """, (is_active, valid_until, telegram_id))
                 conn.commit()
+                self._after_commit(self.entitlement_cache.invalidate, telegram_id)
             except Exception as e:
                 conn.rollback()
                 logger.exception(f"set_user_subscription failed: {e}")
@@ -401,36 +603,32 @@ class RepChessDB:
 
     # ================= USER GETTERS / UPDATERS =================
     def update_user_public_id(self, old_public_id: int, public_id: int) -> bool | None:
-        with self.get_connection() as conn:
-            try:
+        try:
+            with self.transaction(), self.get_connection() as conn:
                 with conn.cursor() as cur:
+                    # lock the user, so nobody changes him between the checks and the update
+                    cur.execute("SELECT telegram_id FROM \"user\" WHERE public_id = %s FOR UPDATE", (old_public_id,))
+                    user = cur.fetchone()
+                    if not user:
+                        return None
                     cur.execute("SELECT 1 FROM \"user\" WHERE public_id = %s", (public_id,))
                     if cur.fetchone():
                         return False
-                    cur.execute("SELECT 1 FROM \"user\" WHERE public_id = %s", (old_public_id,))
-                    if not cur.fetchone():
-                        return None
+                    cur.execute("UPDATE \"user\" SET public_id = %s WHERE public_id = %s", (public_id, old_public_id))
+                    cur.execute("DELETE FROM released_public_id WHERE public_id = %s", (public_id,))
                     cur.execute("""
-                        UPDATE "user" SET public_id = %s WHERE public_id = %s
-                    """, (public_id, old_public_id))
-                conn.commit()
-                self.FREE_PUBLIC_IDS.append(old_public_id)
-                try:
-                    self.FREE_PUBLIC_IDS.remove(public_id)
-                except ValueError:
-                    pass
+                        INSERT INTO released_public_id (public_id) VALUES (%s)
+                        ON CONFLICT DO NOTHING
+                    """, (old_public_id,))
+                self._after_commit(self.user_cache.invalidate, user["telegram_id"])
                 return True
-            except Exception as e:
-                conn.rollback()
-                logger.exception(f"update_user_public_id failed: {e}")
-                return None
+        except Exception as e:
+            logger.exception(f"update_user_public_id failed: {e}")
+            return None
 
     def check_for_user_in_db_return_nickname(self, telegram_id: int) -> str | None:
-        with self.get_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute("SELECT nickname FROM \"user\" WHERE telegram_id = %s", (telegram_id,))
-                row = cur.fetchone()
-                return row["nickname"] if row else None
+        cached = self._get_cached_user(telegram_id)
+        return cached.row["nickname"] if cached else None
 
     def _update_user_field(self, telegram_id: int, field: str, value):
         now = datetime.datetime.now(MOSCOW_TZ)
@@ -440,6 +638,7 @@ class RepChessDB:
                 with conn.cursor() as cur:
                     cur.execute(query, (value, now, telegram_id))
                 conn.commit()
+                self._after_commit(self.user_cache.invalidate, telegram_id)
             except Exception as e:
                 conn.rollback()
                 logger.exception(f"_update_user_field failed for {field}: {e}")
@@ -471,11 +670,13 @@ class RepChessDB:
             try:
                 with conn.cursor() as cur:
                     cur.execute("""
-                        UPDATE "user" SET rep_rating = %s, last_contact = %s WHERE public_id = %s
+                        UPDATE "user" SET rep_rating = %s, last_contact = %s WHERE public_id = %s RETURNING telegram_id
                     """, (rep_rating, now, public_id))
                     if cur.rowcount == 0:
                         raise ValueError(f"User with public_id {public_id} not found")
+                    telegram_id = cur.fetchone()["telegram_id"]
                 conn.commit()
+                self._after_commit(self.user_cache.invalidate, telegram_id)
                 logger.debug(f"update rep rating {public_id=}, {rep_rating=}")
             except Exception as e:
                 conn.rollback()
@@ -488,9 +689,12 @@ class RepChessDB:
             try:
                 with conn.cursor() as cur:
                     cur.execute("""
-                        UPDATE "user" SET rep_rating = %s, last_contact = %s WHERE user_id = %s
+                        UPDATE "user" SET rep_rating = %s, last_contact = %s WHERE user_id = %s RETURNING telegram_id
                     """, (rep_rating, now, user_id))
+                    updated = cur.fetchone()
                 conn.commit()
+                if updated:
+                    self._after_commit(self.user_cache.invalidate, updated["telegram_id"])
                 logger.debug(f"update rep rating {user_id=}, {rep_rating=}")
             except Exception as e:
                 conn.rollback()
@@ -498,16 +702,46 @@ class RepChessDB:
                 raise
 
     def update_user_last_contact(self, telegram_id: int):
+        """
+        Called on every menu tap, so it doesn't touch the db: the time is kept
+        in memory and written by flush_last_contacts().
+        """
         now = datetime.datetime.now(MOSCOW_TZ)
+        with self._pending_last_contacts_lock:
+            self._pending_last_contacts[telegram_id] = now
+        cached = self.user_cache.peek(telegram_id)
+        if cached:
+            cached.row["last_contact"] = now
+
+    def flush_last_contacts(self) -> int:
+        """Write all buffered last_contact values with one UPDATE. Returns number of users."""
+        with self._pending_last_contacts_lock:
+            pending, self._pending_last_contacts = self._pending_last_contacts, {}
+        if not pending:
+            return 0
+
         with self.get_connection() as conn:
             try:
                 with conn.cursor() as cur:
-                    cur.execute('UPDATE "user" SET last_contact = %s WHERE telegram_id = %s', (now, telegram_id))
+                    # GREATEST: never move last_contact back if someone wrote a newer one directly.
+                    execute_values(cur, """
+                        UPDATE "user" AS u
+                        SET last_contact = GREATEST(u.last_contact, v.last_contact)
+                        FROM (VALUES %s) AS v(telegram_id, last_contact)
+                        WHERE u.telegram_id = v.telegram_id
+                    """, list(pending.items()), template="(%s::bigint, %s::timestamptz)", page_size=1000)
                 conn.commit()
-                logger.debug(f"update user last contact {telegram_id=}")
+                logger.debug(f"flush last contacts of {len(pending)} users")
+                return len(pending)
             except Exception as e:
                 conn.rollback()
-                logger.exception(f"update_user_last_contact failed: {e}")
+                # put values back, so they are written on the next flush
+                with self._pending_last_contacts_lock:
+                    for telegram_id, last_contact in pending.items():
+                        newer = self._pending_last_contacts.get(telegram_id)
+                        if newer is None or newer < last_contact:
+                            self._pending_last_contacts[telegram_id] = last_contact
+                logger.exception(f"flush_last_contacts failed: {e}")
                 raise
 
     def update_user_games_played(self, user_id: int, games_played: int):
@@ -515,9 +749,12 @@ class RepChessDB:
             try:
                 with conn.cursor() as cur:
                     cur.execute("""
-                        UPDATE "user" SET games_played = games_played + %s WHERE user_id = %s
+                        UPDATE "user" SET games_played = games_played + %s WHERE user_id = %s RETURNING telegram_id
                     """, (games_played, user_id))
+                    updated = cur.fetchone()
                 conn.commit()
+                if updated:
+                    self._after_commit(self.user_cache.invalidate, updated["telegram_id"])
             except Exception as e:
                 conn.rollback()
                 logger.exception(f"update_user_games_played failed: {e}")
@@ -531,14 +768,32 @@ class RepChessDB:
         self._update_user_field(telegram_id, "city_id", city_id)
         logger.debug(f"update user city id {telegram_id=}, {city_id=}")
 
-    def get_user_on_telegram_id(self, telegram_id: int) -> dict:
+    def _get_cached_user(self, telegram_id: int) -> _CachedUser | None:
+        cached = self.user_cache.get(telegram_id)
+        if cached is not None:
+            return cached
+        version = self.user_cache.version()
         with self.get_connection() as conn:
             with conn.cursor() as cur:
                 cur.execute('SELECT * FROM "user" WHERE telegram_id = %s', (telegram_id,))
                 row = cur.fetchone()
-                if not row:
-                    raise ValueError(f"User with telegram_id {telegram_id} not found")
-                return dict(row)
+        if not row:
+            return None
+        row = dict(row)
+        with self._pending_last_contacts_lock:
+            pending = self._pending_last_contacts.get(telegram_id)
+        if pending is not None:
+            row["last_contact"] = pending
+        cached = _CachedUser(row)
+        self.user_cache.set(telegram_id, cached, version=version)
+        return cached
+
+    def get_user_on_telegram_id(self, telegram_id: int) -> dict:
+        cached = self._get_cached_user(telegram_id)
+        if not cached:
+            raise ValueError(f"User with telegram_id {telegram_id} not found")
+        # Handlers modify this dict (context.user_data["user_db_data"]), so never give away the cached one.
+        return dict(cached.row)
 
     def get_user_on_user_id(self, user_id: int) -> dict:
         with self.get_connection() as conn:
@@ -550,11 +805,8 @@ class RepChessDB:
                 return dict(row)
 
     def is_admin(self, telegram_id: int) -> bool:
-        with self.get_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute('SELECT is_admin FROM "user" WHERE telegram_id = %s', (telegram_id,))
-                row = cur.fetchone()
-                return bool(row["is_admin"]) if row else False
+        cached = self._get_cached_user(telegram_id)
+        return bool(cached.row["is_admin"]) if cached else False
 
     def set_user_as_admin(self, public_id: int) -> str | None:
         with self.get_connection() as conn:
@@ -568,6 +820,7 @@ class RepChessDB:
                         return ""
                     cur.execute('UPDATE "user" SET is_admin = TRUE WHERE public_id = %s', (public_id,))
                 conn.commit()
+                self._after_commit(self.user_cache.invalidate, user["telegram_id"])
                 logger.debug(f"update user {public_id=} is_admin to True")
                 name = user["name"] or ""
                 surname = user["surname"] or ""
@@ -590,6 +843,7 @@ class RepChessDB:
                         return ""
                     cur.execute('UPDATE "user" SET is_admin = FALSE WHERE public_id = %s', (public_id,))
                 conn.commit()
+                self._after_commit(self.user_cache.invalidate, user["telegram_id"])
                 logger.debug(f"update user {public_id=} is_admin to False")
                 name = user["name"] or ""
                 surname = user["surname"] or ""
@@ -612,21 +866,29 @@ class RepChessDB:
         original_file_id: str = None,
         original_path: str = None,
         processing_status: str = "pending",
-    ):
+        notify_chat_id: int = None,
+        notify_message_id: int = None,
+    ) -> int:
         with self.get_connection() as conn:
             try:
                 with conn.cursor() as cur:
                     cur.execute("""
                         INSERT INTO videos (
                             file_id_480p, file_id_1080p, title, description, category,
-                            lesson_number, original_file_id, original_path, processing_status
-                        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                            lesson_number, original_file_id, original_path, processing_status,
+                            notify_chat_id, notify_message_id
+                        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                        RETURNING id
                     """, (
                         file_id_480p, file_id_1080p, title, description, category,
-                        lesson_number, original_file_id, original_path, processing_status
+                        lesson_number, original_file_id, original_path, processing_status,
+                        notify_chat_id, notify_message_id
                     ))
+                    video_id = cur.fetchone()["id"]
                 conn.commit()
-                logger.debug(f"add video {file_id_480p=}, {file_id_1080p=}, {title=}, {category=}, {lesson_number=}, {processing_status=}")
+                self._after_commit(self.video_catalog.invalidate)
+                logger.debug(f"add video {video_id=}, {file_id_480p=}, {file_id_1080p=}, {title=}, {category=}, {lesson_number=}, {processing_status=}")
+                return video_id
             except Exception as e:
                 conn.rollback()
                 logger.exception(f"add_video failed: {e}")
@@ -653,6 +915,7 @@ class RepChessDB:
                 with conn.cursor() as cur:
                     cur.execute(f"UPDATE videos SET {', '.join(updates)} WHERE id = %s", values)
                 conn.commit()
+                self._after_commit(self.video_catalog.invalidate)
                 logger.debug(f"update video quality {video_id=}, {file_id_480p=}, {file_id_1080p=}, {processing_status=}")
                 return True
             except Exception as e:
@@ -702,6 +965,7 @@ class RepChessDB:
                         logger.warning(f"Attempted to delete non-existent video {video_id=}")
                         return False
                 conn.commit()
+                self._after_commit(self.video_catalog.invalidate)
                 logger.debug(f"delete video {video_id=}")
                 from video_processor import VideoProcessor
                 VideoProcessor.delete_video_files_static(video_id)
@@ -720,6 +984,7 @@ class RepChessDB:
                         logger.warning(f"Attempted to update non-existent video {video_id=}")
                         return False
                 conn.commit()
+                self._after_commit(self.video_catalog.invalidate)
                 logger.debug(f"update video metadata {video_id=}, {title=}")
                 return True
             except Exception as e:
@@ -758,6 +1023,7 @@ class RepChessDB:
                     cur.execute("DELETE FROM videos WHERE category = %s", (category_name,))
                     deleted = cur.rowcount
                 conn.commit()
+                self._after_commit(self.video_catalog.invalidate)
                 logger.debug(f"delete category {category_name=}, deleted {deleted} videos")
                 return True
             except Exception as e:
@@ -786,6 +1052,95 @@ class RepChessDB:
                 cur.execute("SELECT * FROM videos WHERE processing_status = 'pending'")
                 return [dict(row) for row in cur.fetchall()]
 
+    # video transcoding jobs, see video_jobs.py
+
+    def claim_video_job(self) -> dict | None:
+        """
+        Take the oldest pending video which is due and mark it 'processing'.
+        SKIP LOCKED: concurrent workers never claim the same video and don't wait for each other.
+        """
+        with self.get_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        UPDATE videos
+                        SET processing_status = 'processing', attempts = attempts + 1, next_attempt_at = NULL
+                        WHERE id = (
+                            SELECT id FROM videos
+                            WHERE processing_status = 'pending'
+                                AND (next_attempt_at IS NULL OR next_attempt_at <= NOW())
+                            ORDER BY id
+                            LIMIT 1
+                            FOR UPDATE SKIP LOCKED
+                        )
+                        RETURNING *
+                    """)
+                    row = cur.fetchone()
+                conn.commit()
+                if row:
+                    self._after_commit(self.video_catalog.invalidate)
+                    logger.debug(f"claim video job {row['id']=}, {row['attempts']=}")
+                return dict(row) if row else None
+            except Exception as e:
+                conn.rollback()
+                logger.exception(f"claim_video_job failed: {e}")
+                raise
+
+    def retry_video_job(self, video_id: int, error: str, delay_seconds: float) -> None:
+        with self.get_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        UPDATE videos
+                        SET processing_status = 'pending',
+                            next_attempt_at = NOW() + %s * INTERVAL '1 second',
+                            last_error = %s
+                        WHERE id = %s AND processing_status = 'processing'
+                    """, (delay_seconds, error, video_id))
+                conn.commit()
+                self._after_commit(self.video_catalog.invalidate)
+                logger.debug(f"retry video job {video_id=} in {delay_seconds}s, {error=}")
+            except Exception as e:
+                conn.rollback()
+                logger.exception(f"retry_video_job failed: {e}")
+                raise
+
+    def fail_video_job(self, video_id: int, error: str) -> None:
+        with self.get_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        UPDATE videos SET processing_status = 'failed', last_error = %s
+                        WHERE id = %s AND processing_status = 'processing'
+                    """, (error, video_id))
+                conn.commit()
+                self._after_commit(self.video_catalog.invalidate)
+                logger.debug(f"fail video job {video_id=}, {error=}")
+            except Exception as e:
+                conn.rollback()
+                logger.exception(f"fail_video_job failed: {e}")
+                raise
+
+    def requeue_interrupted_video_jobs(self) -> int:
+        """Return videos left 'processing' by a stopped bot to the queue. Only for startup."""
+        with self.get_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("""
+                        UPDATE videos SET processing_status = 'pending', next_attempt_at = NULL
+                        WHERE processing_status = 'processing'
+                    """)
+                    requeued = cur.rowcount
+                conn.commit()
+                if requeued:
+                    self._after_commit(self.video_catalog.invalidate)
+                    logger.info(f"requeued {requeued} interrupted video jobs")
+                return requeued
+            except Exception as e:
+                conn.rollback()
+                logger.exception(f"requeue_interrupted_video_jobs failed: {e}")
+                raise
+
     def get_video_file_id(self, video_id: int, quality: str) -> str | None:
         field = "file_id_480p" if quality == "480p" else "file_id_1080p" if quality == "1080p" else None
         if not field:
@@ -819,6 +1174,7 @@ class RepChessDB:
                         cur.execute(f"DELETE FROM videos WHERE category = %s AND lesson_number = %s AND processing_status IN ({placeholders})", (category, lesson_number, *statuses))
                         deleted_count = cur.rowcount
                 conn.commit()
+                self._after_commit(self.video_catalog.invalidate)
                 from video_processor import VideoProcessor
                 for vid in video_ids:
                     VideoProcessor.delete_video_files_static(vid)
@@ -976,6 +1332,7 @@ class RepChessDB:
                         VALUES (%s, %s, NULL, NULL)
                     """, (name, tg_channel))
                 conn.commit()
+                self._after_commit(self.cities.refresh)
             except Exception as e:
                 conn.rollback()
                 logger.exception(f"add_city failed: {e}")
@@ -988,50 +1345,48 @@ class RepChessDB:
                 row = cur.fetchone()
                 return row["timetable_photo"] if row else None
 
-    def get_city_on_id(self, city_id: int) -> str | None:
+    def _load_cities(self) -> list[dict]:
         with self.get_connection() as conn:
             with conn.cursor() as cur:
-                cur.execute("SELECT name FROM city WHERE city_id = %s", (city_id,))
-                row = cur.fetchone()
-                return row["name"] if row else None
+                cur.execute("SELECT city_id, name, tg_channel FROM city ORDER BY city_id")
+                return [dict(row) for row in cur.fetchall()]
+
+    def get_city_on_id(self, city_id: int) -> str | None:
+        city = self.cities.by_id(city_id)
+        return city.name if city else None
 
     def get_id_on_city_name(self, city: str) -> int | None:
-        with self.get_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute("SELECT city_id FROM city WHERE name = %s", (city,))
-                row = cur.fetchone()
-                return row["city_id"] if row else None
+        city = self.cities.by_name(city)
+        return city.city_id if city else None
 
     def get_cities_names(self) -> list[str]:
-        with self.get_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute("SELECT name FROM city")
-                return [row["name"] for row in cur.fetchall()]
+        return self.cities.names()
 
     def get_tg_channel_on_tg_id(self, telegram_id: int) -> str | None:
-        user = self.get_user_on_telegram_id(telegram_id)
-        if not user.get("city_id"):
+        cached = self._get_cached_user(telegram_id)
+        if not cached:
+            raise ValueError(f"User with telegram_id {telegram_id} not found")
+        if not cached.row.get("city_id"):
             return None
-        with self.get_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute("SELECT tg_channel FROM city WHERE city_id = %s", (user["city_id"],))
-                row = cur.fetchone()
-                return row["tg_channel"] if row else None
+        city = self.cities.by_id(cached.row["city_id"])
+        return city.tg_channel if city else None
 
     def delete_city(self, city: str):
-        city_id = self.get_id_on_city_name(city)
-        if city_id is None:
-            return
-        with self.get_connection() as conn:
-            try:
+        try:
+            with self.transaction(), self.get_connection() as conn:
                 with conn.cursor() as cur:
-                    cur.execute("UPDATE \"user\" SET city_id = 1 WHERE city_id = %s", (city_id,))
-                    cur.execute("DELETE FROM city WHERE city_id = %s", (city_id,))
-                conn.commit()
-            except Exception as e:
-                conn.rollback()
-                logger.exception(f"delete_city failed: {e}")
-                raise
+                    cur.execute("SELECT city_id FROM city WHERE name = %s FOR UPDATE", (city,))
+                    row = cur.fetchone()
+                    if row is None:
+                        return
+                    cur.execute("UPDATE \"user\" SET city_id = 1 WHERE city_id = %s", (row["city_id"],))
+                    cur.execute("DELETE FROM city WHERE city_id = %s", (row["city_id"],))
+                # Many users could be moved to another city.
+                self._after_commit(self.user_cache.clear)
+                self._after_commit(self.cities.refresh)
+        except Exception as e:
+            logger.exception(f"delete_city failed: {e}")
+            raise
 
     def update_weakly_info(self, channel: str, message_id: str, photo_id: str):
         with self.get_connection() as conn:
@@ -1117,6 +1472,69 @@ class RepChessDB:
                 logger.exception(f"delete_user_on_tournament failed: {e}")
                 raise
 
+    def ingest_tournament_results(self, tournament_id: int, games: list[tuple], players: list[tuple]) -> dict:
+        """
+        Write all results of a tournament in one transaction: either the whole
+        file is applied or nothing.
+        games: (white_user_id, black_user_id, round, result)
+        players: (nickname, user_id, rating_after, place, score, games_played)
+        Returns timings of every step in seconds.
+        """
+        timings = {}
+        now = datetime.datetime.now(MOSCOW_TZ)
+        with self.get_connection() as conn:
+            try:
+                with conn.cursor() as cur:
+                    started = time.perf_counter()
+                    if games:
+                        execute_values(cur, """
+                            INSERT INTO game (tournament_id, white_user_id, black_user_id, round, result)
+                            VALUES %s
+                        """, [(tournament_id, *game) for game in games], page_size=1000)
+                    timings["games"] = time.perf_counter() - started
+
+                    started = time.perf_counter()
+                    execute_values(cur, """
+                        UPDATE user_on_tournament AS uot
+                        SET rating_after = v.rating_after, place = v.place, score = v.score
+                        FROM (VALUES %s) AS v(tournament_id, nickname, rating_after, place, score)
+                        WHERE uot.tournament_id = v.tournament_id AND uot.nickname = v.nickname
+                    """, [
+                        (tournament_id, nickname, rating_after, place, score)
+                        for nickname, _, rating_after, place, score, _ in players
+                    ], template="(%s::int, %s::text, %s::int, %s::int, %s::real)", page_size=1000)
+                    timings["user_on_tournament"] = time.perf_counter() - started
+
+                    started = time.perf_counter()
+                    updated = execute_values(cur, """
+                        UPDATE "user" AS u
+                        SET games_played = u.games_played + v.games_played,
+                            rep_rating = v.rep_rating,
+                            last_contact = v.last_contact
+                        FROM (VALUES %s) AS v(user_id, games_played, rep_rating, last_contact)
+                        WHERE u.user_id = v.user_id
+                        RETURNING u.telegram_id
+                    """, [
+                        (user_id, games_played, rating_after, now)
+                        for _, user_id, rating_after, _, _, games_played in players
+                    ], template="(%s::int, %s::int, %s::int, %s::timestamptz)", page_size=1000, fetch=True)
+                    timings["users"] = time.perf_counter() - started
+
+                started = time.perf_counter()
+                conn.commit()
+                timings["commit"] = time.perf_counter() - started
+                for row in updated:
+                    self._after_commit(self.user_cache.invalidate, row["telegram_id"])
+                logger.info(
+                    f"ingest tournament {tournament_id} results: {len(games)} games, {len(players)} players, "
+                    + ", ".join(f"{step} {seconds * 1000:.1f}ms" for step, seconds in timings.items())
+                )
+                return timings
+            except Exception as e:
+                conn.rollback()
+                logger.exception(f"ingest_tournament_results failed: {e}")
+                raise
+
     # ================= GAME =================
     def add_game(
         self,
@@ -1147,5 +1565,52 @@ class RepChessDB:
                 logger.exception(f"add_game failed: {e}")
                 raise
 
+
+class AsyncRepChessDB:
+    """
+    Awaitable version of RepChessDB for handlers.
+    It has the same method names, so `rep_chess_db.get_user_on_telegram_id(id)`
+    becomes `await async_rep_chess_db.get_user_on_telegram_id(id)`.
+    Every call runs in a thread pool that is not bigger than the connection pool,
+    so a slow query doesn't block the event loop and we never ask the pool
+    for more connections than it has.
+    """
+    def __init__(self, db: RepChessDB):
+        self._db = db
+        self._executor = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self._db.POOL_MAX_CONN,
+                thread_name_prefix="repchess-db",
+            )
+        return self._executor
+
+    async def run(self, func, *args, **kwargs):
+        """Run any blocking function (usually several db calls) in the db thread pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), functools.partial(func, *args, **kwargs))
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        attr = getattr(self._db, name)
+        if not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        async def method(*args, **kwargs):
+            # Resolve the method on every call, so patched methods (tests) are respected.
+            return await self.run(getattr(self._db, name), *args, **kwargs)
+        return method
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
 # our holy db instance
-rep_chess_db = RepChessDB()
\ No newline at end of file
+rep_chess_db = RepChessDB()
+async_rep_chess_db = AsyncRepChessDB(rep_chess_db)
\ No newline at end of file
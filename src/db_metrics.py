@@ -0,0 +1,150 @@
+import bisect
+import functools
+import inspect
+import logging
+import os
+import threading
+import time
+
+from psycopg2.extras import RealDictCursor
+
+# child of the databaseAPI logger, so slow queries end up in database.log
+slow_query_logger = logging.getLogger("databaseAPI.slow_queries")
+
+SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "200"))
+# upper bounds of histogram buckets in ms, the last bucket is "more than 2500ms"
+HISTOGRAM_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+MAX_LOGGED_SQL = 500
+
+# statements executed by the current call of every thread
+_local = threading.local()
+
+
+def params_shape(params) -> str:
+    """Types of query parameters without values: we don't want phones and names in logs."""
+    if params is None:
+        return "-"
+    if isinstance(params, dict):
+        return "{" + ", ".join(f"{key}: {type(value).__name__}" for key, value in params.items()) + "}"
+    if isinstance(params, (list, tuple)) and len(params) > 20:
+        return f"{type(params).__name__}[{len(params)}]"
+    return "(" + ", ".join(type(value).__name__ for value in params) + ")"
+
+
+class InstrumentedCursor(RealDictCursor):
+    """RealDictCursor which remembers executed statements for the slow query log."""
+    def execute(self, query, vars=None):
+        statements = getattr(_local, "statements", None)
+        if statements is not None:
+            if isinstance(query, bytes):
+                text = query.decode(errors="replace")
+            elif isinstance(query, str):
+                text = query
+            else:
+                # psycopg2.sql.Composed
+                text = query.as_string(self.connection)
+            statements.append((" ".join(text.split())[:MAX_LOGGED_SQL], params_shape(vars)))
+        return super().execute(query, vars)
+
+
+class MethodStats:
+    __slots__ = ("count", "errors", "total", "max", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(HISTOGRAM_BUCKETS_MS) + 1)
+
+    def percentile_ms(self, percentile: float) -> float:
+        """Upper bound of the bucket where the percentile is."""
+        needed = self.count * percentile
+        seen = 0
+        for bound, amount in zip(HISTOGRAM_BUCKETS_MS, self.buckets):
+            seen += amount
+            if seen >= needed:
+                return bound
+        return self.max * 1000
+
+
+class QueryMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.methods: dict[str, MethodStats] = {}
+
+    def record(self, name: str, seconds: float, failed: bool):
+        with self._lock:
+            stats = self.methods.get(name)
+            if stats is None:
+                stats = self.methods[name] = MethodStats()
+            stats.count += 1
+            stats.errors += failed
+            stats.total += seconds
+            stats.max = max(stats.max, seconds)
+            stats.buckets[bisect.bisect_left(HISTOGRAM_BUCKETS_MS, seconds * 1000)] += 1
+
+    def top(self, n: int = 10) -> list[dict]:
+        """Slowest methods by average time."""
+        with self._lock:
+            rows = [
+                {
+                    "method": name,
+                    "count": stats.count,
+                    "errors": stats.errors,
+                    "avg_ms": stats.total / stats.count * 1000,
+                    "p95_ms": stats.percentile_ms(0.95),
+                    "max_ms": stats.max * 1000,
+                    "histogram": dict(zip((*HISTOGRAM_BUCKETS_MS, "inf"), stats.buckets)),
+                }
+                for name, stats in self.methods.items()
+            ]
+        rows.sort(key=lambda row: row["avg_ms"], reverse=True)
+        return rows[:n]
+
+    def reset(self):
+        with self._lock:
+            self.methods.clear()
+
+
+query_metrics = QueryMetrics()
+
+
+def _timed(name: str, method):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        outer_statements = getattr(_local, "statements", None)
+        statements = _local.statements = []
+        failed = False
+        started = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            seconds = time.perf_counter() - started
+            _local.statements = outer_statements
+            if outer_statements is not None:
+                # nested public call, the outer one also did these statements
+                outer_statements.extend(statements)
+            query_metrics.record(name, seconds, failed)
+            if seconds * 1000 >= SLOW_QUERY_MS:
+                slow_query_logger.warning(
+                    f"slow call {name} took {seconds * 1000:.1f}ms"
+                    + "".join(f"\n    {query} params={shape}" for query, shape in statements)
+                )
+    return wrapper
+
+
+def timed_methods(cls):
+    """
+    Class decorator: time every public method, count it in query_metrics and
+    log calls slower than DB_SLOW_QUERY_MS. Context managers (get_connection,
+    transaction) are not timed, the methods called inside them are.
+    """
+    for name, method in list(vars(cls).items()):
+        if name.startswith("_") or not inspect.isfunction(method) or hasattr(method, "__wrapped__"):
+            continue
+        setattr(cls, name, _timed(f"{cls.__name__}.{name}", method))
+    return cls
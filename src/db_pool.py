@@ -0,0 +1,176 @@
+import threading
+import time
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+
+
+class PoolTimeoutError(PoolError):
+    pass
+
+
+class InstrumentedConnectionPool:
+    """
+    Thread-safe psycopg2 connection pool.
+
+    Unlike psycopg2.pool.ThreadedConnectionPool it doesn't raise when all
+    connections are taken - getconn() waits up to `timeout` seconds for a free one.
+    Idle connections are kept open (up to maxconn), and a connection which
+    was idle for more than `health_check_after` seconds is pinged before it is
+    given out, so a dropped connection is replaced instead of failing a query.
+    Counters for /db_stats are in stats().
+    """
+    def __init__(
+        self,
+        minconn: int,
+        maxconn: int,
+        timeout: float = 30.0,
+        health_check_after: float = 30.0,
+        **connect_kwargs,
+    ):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.health_check_after = health_check_after
+        self.closed = False
+        self._connect_kwargs = connect_kwargs
+        self._cond = threading.Condition()
+        # (connection, monotonic time when it was returned)
+        self._idle = []
+        # opened connections: idle + in use
+        self._size = 0
+        self._in_use = 0
+
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.max_in_use = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.broken = 0
+
+        for _ in range(minconn):
+            self._idle.append((self._connect(), time.monotonic()))
+            self._size += 1
+
+    def _connect(self):
+        return psycopg2.connect(**self._connect_kwargs)
+
+    def _is_healthy(self, conn, last_used: float) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - last_used < self.health_check_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def getconn(self):
+        started = time.monotonic()
+        deadline = started + self.timeout
+        with self._cond:
+            while True:
+                if self.closed:
+                    raise PoolError("connection pool is closed")
+                if self._idle or self._size < self.maxconn:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise PoolTimeoutError(f"No free db connection in {self.timeout}s, all {self.maxconn} are in use")
+                self._cond.wait(remaining)
+
+            if self._idle:
+                conn, last_used = self._idle.pop()
+            else:
+                conn, last_used = None, None
+                self._size += 1
+            self._in_use += 1
+            self.max_in_use = max(self.max_in_use, self._in_use)
+            self.checkouts += 1
+            waited = time.monotonic() - started
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+            if waited > 0.001:
+                self.waits += 1
+
+        # network io is done without the lock
+        try:
+            if conn is not None and not self._is_healthy(conn, last_used):
+                self._close(conn)
+                conn = None
+                with self._cond:
+                    self.broken += 1
+            if conn is None:
+                conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._in_use -= 1
+                self.errors += 1
+                self._cond.notify()
+            raise
+        return conn
+
+    def putconn(self, conn, close: bool = False):
+        if not close and not conn.closed:
+            status = conn.info.transaction_status
+            if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                # server connection lost
+                close = True
+            elif status != extensions.TRANSACTION_STATUS_IDLE:
+                # connection in error or in transaction
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    close = True
+        close = close or conn.closed or self.closed
+        if close:
+            self._close(conn)
+
+        with self._cond:
+            self._in_use -= 1
+            if close:
+                self._size -= 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def closeall(self):
+        with self._cond:
+            self.closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._close(conn)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "size": self._size,
+                "maxconn": self.maxconn,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "max_in_use": self.max_in_use,
+                "checkouts": self.checkouts,
+                "waits": self.waits,
+                "wait_avg": self.wait_total / self.checkouts if self.checkouts else 0.0,
+                "wait_max": self.wait_max,
+                "timeouts": self.timeouts,
+                "errors": self.errors,
+                "broken": self.broken,
+            }
@@ -0,0 +1,34 @@
+import asyncio
+import logging
+import os
+
+from telegram.ext import Application
+
+from databaseAPI import async_rep_chess_db, LAST_CONTACT_FLUSH_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIPTION_EXPIRY_INTERVAL = float(os.getenv("SUBSCRIPTION_EXPIRY_INTERVAL", "3600"))
+
+
+async def last_contact_flusher(application: Application):
+    """Periodically write buffered last_contact values to db (see RepChessDB.update_user_last_contact)."""
+    logger.info(f"Last contact flusher started (interval {LAST_CONTACT_FLUSH_INTERVAL}s)")
+    while True:
+        await asyncio.sleep(LAST_CONTACT_FLUSH_INTERVAL)
+        try:
+            await async_rep_chess_db.flush_last_contacts()
+        except Exception as e:
+            # values are kept in the buffer, next iteration will try again
+            logger.error(f"Last contact flush failed: {e}")
+
+
+async def subscription_expiry_job(application: Application):
+    """Switch off lapsed subscriptions in one batch (see RepChessDB.expire_subscriptions)."""
+    logger.info(f"Subscription expiry job started (interval {SUBSCRIPTION_EXPIRY_INTERVAL}s)")
+    while True:
+        try:
+            await async_rep_chess_db.expire_subscriptions()
+        except Exception as e:
+            logger.error(f"Subscription expiry failed: {e}")
+        await asyncio.sleep(SUBSCRIPTION_EXPIRY_INTERVAL)
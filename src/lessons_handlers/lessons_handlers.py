@@ -1,8 +1,9 @@
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update, error, KeyboardButton
 from telegram.ext import ContextTypes, MessageHandler, filters, CallbackQueryHandler
 
-from databaseAPI import rep_chess_db
+from databaseAPI import rep_chess_db, async_rep_chess_db
 from start import main_menu_reply_keyboard
+from video_catalog import CatalogSnapshot
 
 lessons_keyboard_main = InlineKeyboardMarkup([
     [InlineKeyboardButton("🎯 Обучение", callback_data="lessons_menu")],
@@ -19,6 +20,10 @@ lessons_keyboard_quality = InlineKeyboardMarkup([
     [InlineKeyboardButton("<< Назад", callback_data="go_level_choosing_menu")],
 ])
 
+async def get_video_catalog() -> CatalogSnapshot:
+    # the db is queried only after videos were changed
+    return rep_chess_db.video_catalog.current() or await async_rep_chess_db.run(rep_chess_db.video_catalog.snapshot)
+
 async def callback_lessons_menu_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -68,10 +73,10 @@ async def show_videos_for_level(update: Update, context: ContextTypes.DEFAULT_TY
     level = "Начинающий"  # For now, we only have this level
     
     try:
-        # Get videos for this level ordered by lesson number
-        videos = rep_chess_db.get_videos_by_category_ordered(level)
+        # Completed lessons of this level ordered by lesson number
+        lessons = (await get_video_catalog()).category_lessons(level)
         
-        if not videos:
+        if not lessons:
             await query.edit_message_text(
                 f"📚 **{level}**\n\nВидео для этого уровня пока не загружены.",
                 reply_markup=InlineKeyboardMarkup([
@@ -81,20 +86,15 @@ async def show_videos_for_level(update: Update, context: ContextTypes.DEFAULT_TY
             )
             return
         
-        # Create keyboard with videos (only show completed videos with lesson numbers)
         keyboard_buttons = []
-        for video in videos:
-            # Only show videos that are completed processing AND have lesson numbers
-            if (video.get('processing_status') == 'completed' and 
-                video.get('lesson_number') and 
-                video['lesson_number'] != ''):
-                lesson_text = f"Урок {video['lesson_number']}: {video['title']}"
-                if len(lesson_text) > 50:
-                    lesson_text = lesson_text[:47] + "..."
-                keyboard_buttons.append([InlineKeyboardButton(
-                    lesson_text,
-                    callback_data=f"video_{video['id']}"
-                )])
+        for video in lessons:
+            lesson_text = f"Урок {video.lesson_number}: {video.title}"
+            if len(lesson_text) > 50:
+                lesson_text = lesson_text[:47] + "..."
+            keyboard_buttons.append([InlineKeyboardButton(
+                lesson_text,
+                callback_data=f"video_{video.id}"
+            )])
         
         keyboard_buttons.append([InlineKeyboardButton("<< Назад", callback_data="select_level")])
         
@@ -125,14 +125,13 @@ async def show_video_quality_selection(update: Update, context: ContextTypes.DEF
         # Extract video ID from callback data
         video_id = int(query.data.split("_")[-1])
         
-        # Get video from database
-        video = rep_chess_db.get_video_by_id(video_id)
+        video = (await get_video_catalog()).videos.get(video_id)
         if not video:
             await query.edit_message_text("❌ Видео не найдено.")
             return
         
         # Check if video is processed
-        if video.get('processing_status') != 'completed':
+        if video.processing_status != 'completed':
             await query.edit_message_text(
                 "⏳ **Видео еще обрабатывается**\n\nПожалуйста, подождите завершения обработки.",
                 reply_markup=InlineKeyboardMarkup([
@@ -145,10 +144,10 @@ async def show_video_quality_selection(update: Update, context: ContextTypes.DEF
         # Create quality selection keyboard
         keyboard_buttons = []
         
-        if video.get('file_id_480p') and video['file_id_480p'] != 'placeholder':
+        if "480p" in video.file_ids:
             keyboard_buttons.append([InlineKeyboardButton("Среднее качество", callback_data=f"quality_480p_{video_id}")])
         
-        if video.get('file_id_1080p') and video['file_id_1080p'] != 'placeholder':
+        if "1080p" in video.file_ids:
             keyboard_buttons.append([InlineKeyboardButton("Высокое качество", callback_data=f"quality_1080p_{video_id}")])
         
         if not keyboard_buttons:
@@ -165,11 +164,11 @@ async def show_video_quality_selection(update: Update, context: ContextTypes.DEF
         quality_keyboard = InlineKeyboardMarkup(keyboard_buttons)
         
         await query.edit_message_text(
-            f"""📚 **{video['title']}**
+            f"""📚 **{video.title}**
 
-🏷️ **Категория**: {video['category']}
-🔢 **Урок**: {video['lesson_number']}
-📄 **Описание**: {video['description'] if video['description'] else 'не указано'}
+🏷️ **Категория**: {video.category}
+🔢 **Урок**: {video.lesson_number}
+📄 **Описание**: {video.description if video.description else 'не указано'}
 
 Выберите качество видео:""",
             reply_markup=quality_keyboard,
@@ -210,13 +209,14 @@ async def send_video_to_user(update: Update, context: ContextTypes.DEFAULT_TYPE)
         video_id = int(parts[2])
         
         # Get video file_id for the selected quality
-        file_id = rep_chess_db.get_video_file_id(video_id, quality)
+        catalog = await get_video_catalog()
+        file_id = catalog.file_id(video_id, quality)
         if not file_id:
             await query.edit_message_text("❌ Видео с выбранным качеством не найдено.")
             return
         
         # Get video info
-        video = rep_chess_db.get_video_by_id(video_id)
+        video = catalog.videos.get(video_id)
         if not video:
             await query.edit_message_text("❌ Видео не найдено.")
             return
@@ -225,12 +225,12 @@ async def send_video_to_user(update: Update, context: ContextTypes.DEFAULT_TYPE)
         await context.bot.send_video(
             chat_id=query.from_user.id,
             video=file_id,
-            caption=f"""📚 **{video['title']}**
+            caption=f"""📚 **{video.title}**
 
-🏷️ **Категория**: {video['category']}
-🔢 **Урок**: {video['lesson_number']}
+🏷️ **Категория**: {video.category}
+🔢 **Урок**: {video.lesson_number}
 📐 **Качество**: {quality}
-📄 **Описание**: {video['description'] if video['description'] else 'не указано'}""",
+📄 **Описание**: {video.description if video.description else 'не указано'}""",
             parse_mode="Markdown"
         )
         
@@ -16,16 +16,19 @@ from telegram.ext import (
     ContextTypes,
     MessageHandler,
     filters,
-    PicklePersistence,
     Application,
 )
-from telegram.request import HTTPXRequest
 
 # Add to python path some directories
 sys.path.insert(0, os.path.abspath("src"))
 
 from start import start_handlers
 from databaseAPI import rep_chess_db
+from persistence import PostgresPersistence
+from persistence_format import MsgpackSerializer
+from rate_limiter import send_limiter
+from bot_request import bot_request
+from update_processor import PerUserUpdateProcessor
 from admin_handlers import admin_callback_handlers
 from profile_handlers import profile_callback_handlers
 from timetable_handlers import timetable_callback_handlers, process_new_post, process_edited_post
@@ -141,28 +144,41 @@ async def global_file_message_handler(update: Update, context: ContextTypes.DEFA
 async def post_init(application: Application):
     from payments import subscription_scheduler
     application.create_task(subscription_scheduler(application))
+    from jobs import last_contact_flusher, subscription_expiry_job
+    application.create_task(last_contact_flusher(application))
+    application.create_task(subscription_expiry_job(application))
+    from video_jobs import video_jobs
+    from admin_handlers.video_management import process_video_job
+    await video_jobs.start(application.bot, process_video_job)
+
+async def post_stop(application: Application):
+    # while the bot can still talk to the Bot API: an interrupted video stays
+    # 'processing' and is requeued at the next start, no attempt is used up
+    from video_jobs import video_jobs
+    await video_jobs.stop()
+
+async def post_shutdown(application: Application):
+    # write what is left in the last_contact buffer
+    rep_chess_db.flush_last_contacts()
 
 api_base = os.getenv("TELEGRAM_API_BASE", "http://telegram-bot-api:8081/bot")
 
 def start_tg_bot(token: str, use_webhook: bool = False, webhook_url: str = None, webhook_port: int = 8443):
-    prs = PicklePersistence(filepath=".bot_data_cache")
-    
-    request = HTTPXRequest(
-        connection_pool_size=8,
-        read_timeout=600,
-        write_timeout=600,
-        connect_timeout=30,
-    )
+    prs = PostgresPersistence(rep_chess_db, serializer=MsgpackSerializer(rep_chess_db))
     
     application = (
         ApplicationBuilder()
         .token(token)
         .persistence(persistence=prs)
         .post_init(post_init)
+        .post_stop(post_stop)
+        .post_shutdown(post_shutdown)
         .base_url(f"{api_base}/bot")
         .base_file_url(f"{api_base}/file/bot")
         .local_mode(True)
-        .request(request)
+        .request(bot_request)
+        .rate_limiter(send_limiter)
+        .concurrent_updates(PerUserUpdateProcessor())
         .build()
     )
 
@@ -178,8 +194,13 @@ def start_tg_bot(token: str, use_webhook: bool = False, webhook_url: str = None,
     application.add_handler(MessageHandler(filters.FORWARDED, global_forwarded_message_handler))
     application.add_handler(MessageHandler(filters.ALL, global_message_handler))
     
-    logger.info("Starting bot with polling")
-    application.run_polling()
+    if use_webhook:
+        from webhook import WEBHOOK_SECRET, run_webhook
+        logger.info(f"Starting bot with webhook {webhook_url}")
+        run_webhook(application, webhook_url, WEBHOOK_SECRET, webhook_port)
+    else:
+        logger.info("Starting bot with polling")
+        application.run_polling()
 
     logger.info("Bot stopped")
 
@@ -192,9 +213,9 @@ def main():
         logger.error("Can't find path to telegram token!")
         print("Please set REPCHESS_TELEGRAM_BOT_TOKEN variable.")
         sys.exit(1)
+    from webhook import WEBHOOK_URL, WEBHOOK_PORT
     try:
-        logger.info("Starting bot with polling mode")
-        start_tg_bot(telegram_token, use_webhook=False)
+        start_tg_bot(telegram_token, use_webhook=bool(WEBHOOK_URL), webhook_url=WEBHOOK_URL, webhook_port=WEBHOOK_PORT)
     except Exception as e:
         logger.error(f"Error in main function: {e}", exc_info=True)
 
@@ -0,0 +1,86 @@
+"""
+Putting files received by the bot into media storage without copying them.
+
+The local Bot API server (--local) keeps every file it downloads from
+Telegram in /bot_data, which is mounted into the bot container too, and
+getFile returns the absolute path of the file there. Instead of copying
+gigabytes of video into VIDEO_UPLOAD_DIR, the file gets a second name
+there (hard link). The server keeps its own file, and no data is written.
+If the file can't be linked, it is renamed instead. When storage is on
+another filesystem (or another mount), or neither is permitted, the file
+is copied, chunk by chunk into a temporary file that is renamed into
+place at the end. The fast path therefore needs VIDEO_UPLOAD_DIR on the
+/bot_data mount, see compose.yml. Renditions stay in VIDEO_STORAGE_DIR.
+"""
+import asyncio
+import errno
+import logging
+import os
+import shutil
+import time
+from pathlib import Path
+
+from telegram import File
+
+logger = logging.getLogger(__name__)
+
+COPY_CHUNK_SIZE = 16 * 1024 * 1024
+
+
+def _copy(source: Path, part: Path, dest: Path) -> None:
+    try:
+        with open(source, "rb") as src, open(part, "wb") as dst:
+            shutil.copyfileobj(src, dst, COPY_CHUNK_SIZE)
+        os.replace(part, dest)
+    except BaseException:
+        part.unlink(missing_ok=True)
+        raise
+
+
+def ingest_file(source: str | Path, dest: str | Path) -> str:
+    """
+    Make `source` available at `dest` as cheaply as possible.
+    Returns how it was done: "link", "rename" or "copy".
+    """
+    source, dest = Path(source), Path(dest)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    # every way ends with a rename, an existing dest is replaced atomically
+    part = dest.with_name(dest.name + ".part")
+    part.unlink(missing_ok=True)
+    try:
+        os.link(source, part)
+        os.replace(part, dest)
+        return "link"
+    except OSError as e:
+        if e.errno == errno.EXDEV:
+            logger.info(f"{source} and {dest} are on different filesystems, copying")
+        else:
+            # same filesystem, but no hard links on it (EMLINK, ...) or not for us:
+            # fs.protected_hardlinks forbids linking a file of the Bot API server's uid
+            logger.info(f"can't link {source} to {dest} ({e}), renaming")
+            try:
+                os.replace(source, dest)
+                return "rename"
+            except OSError as rename_error:
+                # reading may still be allowed
+                logger.info(f"can't rename {source} to {dest} ({rename_error}), copying")
+    _copy(source, part, dest)
+    return "copy"
+
+
+async def ingest_telegram_file(file: File, dest: str | Path) -> Path:
+    """
+    Put a file from get_file at `dest`. Files of the local Bot API server are
+    linked (see ingest_file), others are downloaded.
+    """
+    dest = Path(dest)
+    started = time.perf_counter()
+    if file.file_path and Path(file.file_path).is_file():
+        method = await asyncio.to_thread(ingest_file, file.file_path, dest)
+    else:
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        await file.download_to_drive(dest)
+        method = "download"
+    size_mb = dest.stat().st_size / (1024 * 1024)
+    logger.info(f"📥 Ingested {size_mb:.1f} MB to {dest} by {method} in {time.perf_counter() - started:.2f}s")
+    return dest
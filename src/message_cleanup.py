@@ -0,0 +1,64 @@
+"""
+Deleting the bot's old messages (context.user_data["messages_to_delete"]).
+
+Before every managed reply the tracked messages of the user are deleted.
+This used to be one delete_message call per message, all awaited before
+the reply. Now the ids are taken from user_data at once and deleted in the
+background, up to 100 per delete_messages call (the Bot API limit).
+Chunks which failed because of the network are put back and deleted with
+the next cleanup. Chunks which Telegram rejected are dropped.
+"""
+import logging
+
+from telegram.error import BadRequest, Forbidden, TelegramError
+from telegram.ext import ContextTypes
+
+logger = logging.getLogger(__name__)
+
+# telegram doesn't let bots delete messages older than 48 hours, old ids are useless
+MAX_TRACKED_MESSAGES = 100
+DELETE_MESSAGES_LIMIT = 100
+
+
+def track_message(user_data: dict, message_id: int) -> None:
+    messages = user_data.setdefault("messages_to_delete", [])
+    messages.append(message_id)
+    if len(messages) > MAX_TRACKED_MESSAGES:
+        del messages[:-MAX_TRACKED_MESSAGES]
+
+
+async def delete_messages(bot, chat_id: int, message_ids: list[int]) -> list[int]:
+    """Delete messages in batches. Returns ids which should be tried again later."""
+    retry = []
+    for start in range(0, len(message_ids), DELETE_MESSAGES_LIMIT):
+        chunk = message_ids[start:start + DELETE_MESSAGES_LIMIT]
+        try:
+            await bot.delete_messages(chat_id=chat_id, message_ids=chunk)
+        except (BadRequest, Forbidden) as e:
+            # won't get better: too old, already deleted, bot blocked
+            logger.info(f"can't delete {len(chunk)} messages in chat {chat_id}: {e}")
+        except TelegramError as e:
+            logger.warning(f"deleting {len(chunk)} messages in chat {chat_id} failed: {e}")
+            retry.extend(chunk)
+    return retry
+
+
+async def _delete_in_background(bot, chat_id: int, message_ids: list[int], user_data: dict) -> None:
+    retry = await delete_messages(bot, chat_id, message_ids)
+    if retry:
+        messages = user_data.setdefault("messages_to_delete", [])
+        messages[:0] = retry
+        if len(messages) > MAX_TRACKED_MESSAGES:
+            del messages[:-MAX_TRACKED_MESSAGES]
+
+
+def schedule_cleanup(context: ContextTypes.DEFAULT_TYPE, chat_id: int) -> None:
+    """Take the tracked messages of the user and delete them without waiting."""
+    message_ids = context.user_data.get("messages_to_delete")
+    if not message_ids:
+        return
+    context.user_data["messages_to_delete"] = []
+    context.application.create_task(
+        _delete_in_background(context.bot, chat_id, message_ids[-MAX_TRACKED_MESSAGES:], context.user_data),
+        name=f"cleanup:{chat_id}",
+    )
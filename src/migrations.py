@@ -0,0 +1,122 @@
+"""
+Numbered schema migrations.
+
+`_create_tables` creates the base schema, everything that changes it later
+goes here as a new migration with the next number. Applied versions are kept
+in the schema_version table, so every migration runs once per database.
+Never edit a migration which is already applied somewhere - add a new one.
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+# any constant, lets only one bot instance migrate at a time
+MIGRATIONS_LOCK_KEY = 715002
+
+# (version, description, statements)
+MIGRATIONS = [
+    (1, "indexes for hot queries", [
+        # get_user_on_tournament_on_nickname, update_user_on_tournament, delete_user_on_tournament
+        """
+        CREATE INDEX IF NOT EXISTS idx_user_on_tournament_tournament_nickname
+        ON user_on_tournament(tournament_id, nickname)
+        """,
+        # get_tournaments: timetable of a city
+        """
+        CREATE INDEX IF NOT EXISTS idx_tournament_channel_date
+        ON tournament(tg_channel, date_time)
+        """,
+        """
+        CREATE INDEX IF NOT EXISTS idx_game_tournament
+        ON game(tournament_id)
+        """,
+        # get_due_subscriptions: only subscriptions which can be renewed
+        """
+        CREATE INDEX IF NOT EXISTS idx_subscription_due
+        ON subscription(subscription_next_charge)
+        WHERE
+            active_subscription = TRUE
+            AND subscription_auto_renew = TRUE
+            AND subscription_payment_method_id IS NOT NULL
+            AND user_phone IS NOT NULL
+            AND subscription_next_charge IS NOT NULL
+        """,
+    ]),
+    (2, "index for subscription expiry", [
+        # expire_subscriptions
+        """
+        CREATE INDEX IF NOT EXISTS idx_subscription_active_valid_until
+        ON subscription(subscription_valid_until)
+        WHERE active_subscription = TRUE
+        """,
+    ]),
+    (3, "tables for PostgresPersistence", [
+        """
+        CREATE TABLE IF NOT EXISTS persistence_user_data (
+            id BIGINT PRIMARY KEY,
+            data BYTEA NOT NULL,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS persistence_chat_data (
+            id BIGINT PRIMARY KEY,
+            data BYTEA NOT NULL,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        )
+        """,
+        # bot_data, callback_data, conversations:<name>
+        """
+        CREATE TABLE IF NOT EXISTS persistence_state (
+            key TEXT PRIMARY KEY,
+            data BYTEA NOT NULL,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        )
+        """,
+    ]),
+    (4, "video transcoding job queue", [
+        # see video_jobs.py
+        """
+        ALTER TABLE videos
+            ADD COLUMN IF NOT EXISTS attempts INTEGER NOT NULL DEFAULT 0,
+            ADD COLUMN IF NOT EXISTS next_attempt_at TIMESTAMPTZ,
+            ADD COLUMN IF NOT EXISTS last_error TEXT,
+            ADD COLUMN IF NOT EXISTS notify_chat_id BIGINT,
+            ADD COLUMN IF NOT EXISTS notify_message_id BIGINT
+        """,
+    ]),
+]
+
+
+def apply_migrations(conn) -> list[int]:
+    """Apply all migrations which are not applied yet. Returns their versions."""
+    applied = []
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATIONS_LOCK_KEY,))
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INTEGER PRIMARY KEY,
+                    description TEXT,
+                    applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+                );
+            """)
+            cur.execute("SELECT COALESCE(MAX(version), 0) AS version FROM schema_version")
+            current = cur.fetchone()["version"]
+            for version, description, statements in MIGRATIONS:
+                if version <= current:
+                    continue
+                for statement in statements:
+                    cur.execute(statement)
+                cur.execute(
+                    "INSERT INTO schema_version (version, description) VALUES (%s, %s)",
+                    (version, description)
+                )
+                applied.append(version)
+                logger.info(f"applied migration {version}: {description}")
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        logger.exception(f"apply_migrations failed: {e}")
+        raise
+    return applied
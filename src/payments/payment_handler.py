@@ -19,6 +19,7 @@ from telegram import (
 from telegram.ext import CallbackQueryHandler, CommandHandler, ContextTypes, MessageHandler, filters, Application
 from telegram.error import TelegramError
 from payments.yookassa_client import YooKassaClient, _money_str
+from rate_limiter import PAYMENT
 from util import BACK_TO_MENU_KEYBOARD, MOSCOW_TZ, UTC, _coerce_datetime, _now_tz, _reply_managed, _send_managed_message
 
 logger = logging.getLogger(__name__)
@@ -66,18 +67,19 @@ def add_auth(
     auto_renew: bool = True,
 ) -> dt.datetime:
     valid_until = _now_tz(UTC) + dt.timedelta(days=SUBSCRIPTION_PERIOD_DAYS * months)
-    rep_chess_db.set_user_subscription(telegram_id, True, valid_until.isoformat())
-
-    if payment_method_id:
-        rep_chess_db.update_subscription_payment_method(telegram_id, payment_method_id)
-    elif auto_renew is False:
-        rep_chess_db.update_subscription_payment_method(telegram_id, None)
-
-    rep_chess_db.update_subscription_auto_renew(telegram_id, auto_renew and bool(payment_method_id))
-    next_charge = valid_until if (auto_renew and payment_method_id) else None
-    rep_chess_db.update_subscription_next_charge(
-        telegram_id, next_charge.isoformat() if next_charge else None
-    )
+    with rep_chess_db.transaction():
+        rep_chess_db.set_user_subscription(telegram_id, True, valid_until.isoformat())
+
+        if payment_method_id:
+            rep_chess_db.update_subscription_payment_method(telegram_id, payment_method_id)
+        elif auto_renew is False:
+            rep_chess_db.update_subscription_payment_method(telegram_id, None)
+
+        rep_chess_db.update_subscription_auto_renew(telegram_id, auto_renew and bool(payment_method_id))
+        next_charge = valid_until if (auto_renew and payment_method_id) else None
+        rep_chess_db.update_subscription_next_charge(
+            telegram_id, next_charge.isoformat() if next_charge else None
+        )
     return valid_until.astimezone(MOSCOW_TZ)
 
 async def _request_phone_number(
@@ -247,7 +249,9 @@ async def poll_payment_status(
             return
 
         if status in {"canceled", "expired", "refunded"}:
-            await application.bot.send_message(chat_id=chat_id, text="❌ Платеж не прошёл. Попробуйте ещё раз.")
+            await application.bot.send_message(
+                chat_id=chat_id, text="❌ Платеж не прошёл. Попробуйте ещё раз.", rate_limit_args=PAYMENT
+            )
             logger.error("Payment %s failed with status %s", payment_id, status)
             entry = application.bot_data.get(PAYMENT_PROMPTS_KEY, {}).pop(telegram_id, None)
             if entry:
@@ -267,6 +271,7 @@ async def poll_payment_status(
             "пожалуйста, обратитесь в @RepChess_helper."
         ),
         reply_markup=BACK_TO_MENU_KEYBOARD,
+        rate_limit_args=PAYMENT,
     )
 
 async def finalize_successful_payment(
@@ -310,7 +315,8 @@ async def finalize_successful_payment(
     await application.bot.send_message(
         chat_id=chat_id,
         text=text,
-        reply_markup=BACK_TO_MENU_KEYBOARD
+        reply_markup=BACK_TO_MENU_KEYBOARD,
+        rate_limit_args=PAYMENT,
     )
 
 # scheduler (move to jobs)
@@ -402,6 +408,7 @@ async def process_single_renewal(
         await application.bot.send_message(
             chat_id=chat_id,
             text=f"✅ Подписка успешно продлена!\nСледующий платёж: {valid_until_moscow:%d.%m.%Y}",
+            rate_limit_args=PAYMENT,
         )
         logger.info("Renewal succeeded for user %s", telegram_id)
 
@@ -426,6 +433,7 @@ def _disable_auto_renew_due_to_error(
                 "Подписка останется активной до конца текущего периода.\n"
                 "Чтобы возобновить — обновите способ оплаты в разделе профиля."
             ),
+            rate_limit_args=PAYMENT,
         )
     )
     
@@ -0,0 +1,282 @@
+import asyncio
+import hashlib
+import logging
+import os
+import pickle
+
+from psycopg2.extras import execute_values
+from telegram.ext import BasePersistence, PersistenceInput
+
+from databaseAPI import async_rep_chess_db
+
+logger = logging.getLogger(__name__)
+
+PERSISTENCE_UPDATE_INTERVAL = float(os.getenv("PERSISTENCE_UPDATE_INTERVAL", "60"))
+
+
+class PickleSerializer:
+    """Default serializer of PostgresPersistence. Any object with dumps/loads works."""
+    def dumps(self, obj) -> bytes:
+        return pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def loads(self, data: bytes):
+        return pickle.loads(data)
+
+
+def _digest(data: bytes) -> bytes:
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+class _RowStore:
+    """
+    user_data or chat_data: one row per id in `table`.
+    Rows are loaded on first use of an id and written only if they changed.
+    """
+    def __init__(self, table: str):
+        self.table = table
+        # id -> digest of the data which is in the db
+        self.digests = {}
+        # id -> serialized data waiting for write
+        self.pending = {}
+        self.dropped = set()
+        # ids which are loaded into the application
+        self.loaded = set()
+        # id -> future of loading which is in progress
+        self.loading = {}
+
+    def load(self, db, key: int) -> bytes | None:
+        with db.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(f"SELECT data FROM {self.table} WHERE id = %s", (key,))
+                row = cur.fetchone()
+        return bytes(row["data"]) if row else None
+
+    def write(self, cur, pending: dict, dropped: set):
+        if pending:
+            execute_values(cur, f"""
+                INSERT INTO {self.table} (id, data) VALUES %s
+                ON CONFLICT (id) DO UPDATE SET data = EXCLUDED.data, updated_at = NOW()
+            """, list(pending.items()), page_size=500)
+        if dropped:
+            cur.execute(f"DELETE FROM {self.table} WHERE id = ANY(%s)", (list(dropped),))
+
+
+class PostgresPersistence(BasePersistence):
+    """
+    Keeps user_data, chat_data and bot_data in postgres instead of one pickle file.
+
+    - user_data / chat_data: one row per user / chat. Nothing is read at startup,
+      a row is loaded when the user sends the first update (refresh_user_data).
+    - On every persistence update only rows whose serialized data changed are
+      written, all of them in one transaction.
+    - bot_data, callback data and conversations are single pickled rows in persistence_state.
+
+    Serialization of user_data / chat_data is pluggable: `serializer` is any object
+    with dumps(dict) -> bytes and loads(bytes) -> dict, pickle by default
+    (main.py uses persistence_format.MsgpackSerializer). loads() runs in a db thread.
+    Tables are created by migration 3 (see migrations.py).
+    """
+    def __init__(
+        self,
+        db,
+        serializer=None,
+        store_data: PersistenceInput | None = None,
+        update_interval: float = PERSISTENCE_UPDATE_INTERVAL,
+    ):
+        super().__init__(store_data=store_data, update_interval=update_interval)
+        self.db = db
+        self.serializer = serializer or PickleSerializer()
+        self._state_serializer = PickleSerializer()
+        self._users = _RowStore("persistence_user_data")
+        self._chats = _RowStore("persistence_chat_data")
+        # key -> digest of the data in db / serialized data waiting for write
+        self._state_digests = {}
+        self._state_pending = {}
+        self._conversations = {}
+        self._write_task = None
+
+    async def _run(self, func, *args):
+        return await async_rep_chess_db.run(func, *args)
+
+    # ================= LOADING =================
+    def _load_state(self, key: str):
+        with self.db.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT data FROM persistence_state WHERE key = %s", (key,))
+                row = cur.fetchone()
+        if not row:
+            return None
+        data = bytes(row["data"])
+        self._state_digests[key] = _digest(data)
+        return self._state_serializer.loads(data)
+
+    def _load_row(self, store: _RowStore, key: int) -> tuple:
+        raw = store.load(self.db, key)
+        return raw, self.serializer.loads(raw) if raw is not None else None
+
+    async def get_user_data(self) -> dict:
+        # loaded lazily, see refresh_user_data
+        return {}
+
+    async def get_chat_data(self) -> dict:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return await self._run(self._load_state, "bot_data") or {}
+
+    async def get_callback_data(self):
+        return await self._run(self._load_state, "callback_data")
+
+    async def get_conversations(self, name: str) -> dict:
+        conversations = await self._run(self._load_state, f"conversations:{name}") or {}
+        self._conversations[name] = conversations
+        return conversations
+
+    async def _refresh(self, store: _RowStore, key: int, data: dict):
+        if key in store.loaded:
+            return
+        loading = store.loading.get(key)
+        if loading is None:
+            # two updates of the same user at once must not load (and overwrite) the data twice
+            loading = store.loading[key] = asyncio.ensure_future(self._run(self._load_row, store, key))
+            try:
+                raw, stored = await loading
+            finally:
+                del store.loading[key]
+            if raw is not None:
+                store.digests[key] = _digest(raw)
+                # keep what was already put in memory, it is newer
+                stored.update(data)
+                data.clear()
+                data.update(stored)
+            store.loaded.add(key)
+        else:
+            await loading
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        await self._refresh(self._users, user_id, user_data)
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        await self._refresh(self._chats, chat_id, chat_data)
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        # bot_data is loaded once at startup
+        pass
+
+    # ================= WRITING =================
+    def _mark(self, store: _RowStore, key: int, data: dict) -> bool:
+        raw = self.serializer.dumps(data)
+        store.dropped.discard(key)
+        if store.digests.get(key) == _digest(raw):
+            store.pending.pop(key, None)
+            return False
+        store.pending[key] = raw
+        return True
+
+    def _mark_state(self, key: str, data) -> bool:
+        raw = self._state_serializer.dumps(data)
+        if self._state_digests.get(key) == _digest(raw):
+            self._state_pending.pop(key, None)
+            return False
+        self._state_pending[key] = raw
+        return True
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        if user_id not in self._users.loaded:
+            # changed without an update from the user: don't overwrite his stored data
+            await self.refresh_user_data(user_id, data)
+        if self._mark(self._users, user_id, data):
+            await self._write_soon()
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        if chat_id not in self._chats.loaded:
+            await self.refresh_chat_data(chat_id, data)
+        if self._mark(self._chats, chat_id, data):
+            await self._write_soon()
+
+    async def update_bot_data(self, data: dict) -> None:
+        if self._mark_state("bot_data", data):
+            await self._write_soon()
+
+    async def update_callback_data(self, data) -> None:
+        if self._mark_state("callback_data", data):
+            await self._write_soon()
+
+    async def update_conversation(self, name: str, key, new_state) -> None:
+        conversations = self._conversations.setdefault(name, {})
+        if new_state is None:
+            conversations.pop(key, None)
+        else:
+            conversations[key] = new_state
+        if self._mark_state(f"conversations:{name}", conversations):
+            await self._write_soon()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._users.pending.pop(user_id, None)
+        self._users.digests.pop(user_id, None)
+        self._users.dropped.add(user_id)
+        await self._write_soon()
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        self._chats.pending.pop(chat_id, None)
+        self._chats.digests.pop(chat_id, None)
+        self._chats.dropped.add(chat_id)
+        await self._write_soon()
+
+    async def _write_soon(self):
+        """
+        The application calls update_* for all changed entries at once (asyncio.gather),
+        so the first call starts one write task and all of them wait for it.
+        """
+        if self._write_task is None:
+            self._write_task = asyncio.ensure_future(self._write_batch())
+        await asyncio.shield(self._write_task)
+
+    async def _write_batch(self):
+        # let the other update_* calls of this run add their entries
+        await asyncio.sleep(0)
+        self._write_task = None
+        await self.flush()
+
+    def _take_pending(self) -> tuple:
+        batch = []
+        for store in (self._users, self._chats):
+            batch.append((store, store.pending, store.dropped))
+            store.pending, store.dropped = {}, set()
+        state, self._state_pending = self._state_pending, {}
+        return batch, state
+
+    def _write(self, batch: list, state: dict):
+        with self.db.transaction(), self.db.get_connection() as conn:
+            with conn.cursor() as cur:
+                for store, pending, dropped in batch:
+                    store.write(cur, pending, dropped)
+                if state:
+                    execute_values(cur, """
+                        INSERT INTO persistence_state (key, data) VALUES %s
+                        ON CONFLICT (key) DO UPDATE SET data = EXCLUDED.data, updated_at = NOW()
+                    """, list(state.items()))
+
+    async def flush(self) -> None:
+        batch, state = self._take_pending()
+        if not state and not any(pending or dropped for _, pending, dropped in batch):
+            return
+        try:
+            await self._run(self._write, batch, state)
+        except Exception as e:
+            # put everything back (newer data wins), next run will try again
+            for store, pending, dropped in batch:
+                store.pending = {**pending, **store.pending}
+                store.dropped |= dropped - store.pending.keys()
+            self._state_pending = {**state, **self._state_pending}
+            logger.exception(f"Persistence write failed: {e}")
+            raise
+
+        for store, pending, dropped in batch:
+            for key, raw in pending.items():
+                store.digests[key] = _digest(raw)
+        for key, raw in state.items():
+            self._state_digests[key] = _digest(raw)
+        logger.debug(
+            f"persistence written: {len(batch[0][1])} users, {len(batch[1][1])} chats, {len(state)} state rows"
+        )
@@ -0,0 +1,156 @@
+"""
+Compact msgpack format of user_data / chat_data for PostgresPersistence.
+
+Pickle stored full copies of everything the handlers put into user_data:
+the whole "user" row, the tournament row, InlineKeyboardButton objects
+and an ever-growing messages_to_delete list. This format knows those keys:
+
+- user_db_data / active_tournament are stored as references (telegram_id,
+  tournament_id) and read again from the db when the user comes back;
+- messages_to_delete keeps only the last MAX_TRACKED_MESSAGES ids;
+- *_state handlers are stored as "module:qualname";
+- buttons are stored as [text, callback_data, url].
+
+Anything else msgpack can't encode falls back to pickle inside an ext type.
+Rows written by the pickle format are still read.
+"""
+import datetime
+import functools
+import importlib
+import logging
+import pickle
+import types
+
+import msgpack
+from telegram import InlineKeyboardButton
+
+from message_cleanup import MAX_TRACKED_MESSAGES
+
+logger = logging.getLogger(__name__)
+
+# 0xc1 is never used by msgpack and pickle starts with 0x80, so the formats are easy to tell apart
+MAGIC = b"\xc1\x01"
+
+EXT_FUNCTION = 1
+EXT_USER_ROW = 2
+EXT_TOURNAMENT_ROW = 3
+EXT_BUTTON = 4
+EXT_DATETIME = 5
+EXT_DATE = 6
+EXT_PICKLE = 127
+
+# msgpack>=1.0 doesn't allow int keys by default, 0.5 doesn't know the argument
+_UNPACK_KWARGS = {"raw": False}
+if msgpack.version >= (1, 0, 0):
+    _UNPACK_KWARGS["strict_map_key"] = False
+
+
+class _RowRef:
+    __slots__ = ("kind", "key")
+
+    def __init__(self, kind: int, key: int):
+        self.kind = kind
+        self.key = key
+
+
+def _pack(obj) -> bytes:
+    return msgpack.packb(obj, use_bin_type=True, default=_default)
+
+
+def _unpack(data: bytes):
+    return msgpack.unpackb(data, ext_hook=_ext_hook, **_UNPACK_KWARGS)
+
+
+def _default(obj):
+    if isinstance(obj, _RowRef):
+        return msgpack.ExtType(obj.kind, _pack(obj.key))
+    if isinstance(obj, types.FunctionType) and "<" not in obj.__qualname__:
+        return msgpack.ExtType(EXT_FUNCTION, f"{obj.__module__}:{obj.__qualname__}".encode())
+    if isinstance(obj, InlineKeyboardButton):
+        return msgpack.ExtType(EXT_BUTTON, _pack([obj.text, obj.callback_data, obj.url]))
+    if isinstance(obj, datetime.datetime):
+        return msgpack.ExtType(EXT_DATETIME, obj.isoformat().encode())
+    if isinstance(obj, datetime.date):
+        return msgpack.ExtType(EXT_DATE, obj.isoformat().encode())
+    logger.debug(f"{type(obj).__name__} is stored with pickle")
+    return msgpack.ExtType(EXT_PICKLE, pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def _resolve_function(ref: str):
+    module_name, qualname = ref.split(":", 1)
+    try:
+        obj = importlib.import_module(module_name)
+        for name in qualname.split("."):
+            obj = getattr(obj, name)
+        return obj
+    except (ImportError, AttributeError):
+        # the handler was renamed or removed: the state is lost, like after a restart
+        logger.warning(f"can't resolve stored handler {ref}")
+        return None
+
+
+@functools.lru_cache(maxsize=4096)
+def _button(text: str, callback_data: str | None, url: str | None) -> InlineKeyboardButton:
+    # buttons are immutable and most users keep the same timetable buttons, so share them
+    return InlineKeyboardButton(text, callback_data=callback_data, url=url)
+
+
+def _ext_hook(code: int, data: bytes):
+    if code == EXT_FUNCTION:
+        return _resolve_function(data.decode())
+    if code in (EXT_USER_ROW, EXT_TOURNAMENT_ROW):
+        return _RowRef(code, _unpack(data))
+    if code == EXT_BUTTON:
+        return _button(*_unpack(data))
+    if code == EXT_DATETIME:
+        return datetime.datetime.fromisoformat(data.decode())
+    if code == EXT_DATE:
+        return datetime.date.fromisoformat(data.decode())
+    if code == EXT_PICKLE:
+        return pickle.loads(data)
+    return msgpack.ExtType(code, data)
+
+
+class MsgpackSerializer:
+    """
+    Serializer for PostgresPersistence (dumps/loads like PickleSerializer).
+    `db` is used to read referenced rows back: db.get_user_on_telegram_id and
+    db.get_tournament_on_id. loads() may query the db, so call it from a db thread.
+    """
+    def __init__(self, db):
+        self.db = db
+
+    def dumps(self, data: dict) -> bytes:
+        data = dict(data)
+        user = data.get("user_db_data")
+        if isinstance(user, dict) and user.get("telegram_id") is not None:
+            data["user_db_data"] = _RowRef(EXT_USER_ROW, user["telegram_id"])
+        tournament = data.get("active_tournament")
+        if isinstance(tournament, dict) and tournament.get("tournament_id") is not None:
+            data["active_tournament"] = _RowRef(EXT_TOURNAMENT_ROW, tournament["tournament_id"])
+        messages = data.get("messages_to_delete")
+        if isinstance(messages, list) and len(messages) > MAX_TRACKED_MESSAGES:
+            data["messages_to_delete"] = messages[-MAX_TRACKED_MESSAGES:]
+        return MAGIC + _pack(data)
+
+    def loads(self, raw: bytes) -> dict:
+        if not raw.startswith(MAGIC):
+            return pickle.loads(raw)
+        data = _unpack(raw[len(MAGIC):])
+        for key, value in list(data.items()):
+            if isinstance(value, _RowRef):
+                row = self._load_row(value)
+                if row is None:
+                    del data[key]
+                else:
+                    data[key] = row
+        return data
+
+    def _load_row(self, ref: _RowRef) -> dict | None:
+        try:
+            if ref.kind == EXT_USER_ROW:
+                return self.db.get_user_on_telegram_id(ref.key)
+            return self.db.get_tournament_on_id(ref.key)
+        except ValueError:
+            # the row was deleted, handlers read it again when it is needed
+            return None
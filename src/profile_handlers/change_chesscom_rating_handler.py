@@ -2,13 +2,15 @@ from telegram import Update
 from telegram.ext import ContextTypes, CallbackQueryHandler
 
 from databaseAPI import rep_chess_db
+from message_cleanup import track_message
 from .main_menu_handler import main_menu_handler
 
 
 async def process_input_chesscom_rating(update: Update, context: ContextTypes.DEFAULT_TYPE):
     async def send_error_and_resume(update: Update, context: ContextTypes.DEFAULT_TYPE, err_msg: str):
         message = await context.bot.send_message(update.effective_chat.id, err_msg, parse_mode="markdown")
-        context.user_data["messages_to_delete"].extend([update.message.message_id, message.message_id])
+        track_message(context.user_data, update.message.message_id)
+        track_message(context.user_data, message.message_id)
         await profile_chesscom_rating_handler(update, context)
 
     chesscom_rating = update.message.text
@@ -34,7 +36,7 @@ async def process_input_chesscom_rating(update: Update, context: ContextTypes.DE
     context.user_data["text_state"] = None
     rep_chess_db.update_user_chesscom_rating(update.message.from_user.id, chesscom_rating)
 
-    context.user_data["messages_to_delete"].append(update.message.message_id)
+    track_message(context.user_data, update.message.message_id)
     # Output updated profile
     await main_menu_handler(update, context)
 
@@ -48,7 +50,7 @@ async def profile_chesscom_rating_handler(update: Update, context: ContextTypes.
     context.user_data["text_state"] = process_input_chesscom_rating
 
     message = await context.bot.send_message(update.effective_chat.id, "*Введите новый рейтинг [chess\.com](https://chess.com/):*", parse_mode="MarkdownV2", disable_web_page_preview=True)
-    context.user_data["messages_to_delete"].append(message.message_id)
+    track_message(context.user_data, message.message_id)
 
 
 profile_change_chesscom_rating_handlers = [
@@ -4,6 +4,7 @@ from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ContextTypes, CallbackQueryHandler
 
 from databaseAPI import rep_chess_db
+from message_cleanup import track_message
 from .main_menu_handler import main_menu_handler
 
 
@@ -45,7 +46,7 @@ async def profile_city_handler(update: Update, context: ContextTypes.DEFAULT_TYP
         parse_mode="markdown"
     )
 
-    context.user_data["messages_to_delete"].append(message.message_id)
+    track_message(context.user_data, message.message_id)
 
 
 profile_change_city_handlers = [
@@ -2,6 +2,7 @@ from telegram import Update
 from telegram.ext import ContextTypes, CallbackQueryHandler
 
 from databaseAPI import rep_chess_db
+from message_cleanup import track_message
 from .main_menu_handler import main_menu_handler
 from util import check_string
 
@@ -10,7 +11,8 @@ async def process_input_nickname(update: Update, context: ContextTypes.DEFAULT_T
     async def send_error_and_retry(err_msg: str):
         message = await context.bot.send_message(update.effective_chat.id, err_msg, parse_mode="markdown")
         if "messages_to_delete" in context.user_data:
-            context.user_data["messages_to_delete"].extend([update.message.message_id, message.message_id])
+            track_message(context.user_data, update.message.message_id)
+            track_message(context.user_data, message.message_id)
 
     nickname = update.message.text.strip() if update.message and update.message.text else ""
 
@@ -31,7 +33,7 @@ async def process_input_nickname(update: Update, context: ContextTypes.DEFAULT_T
     context.user_data["text_state"] = None
 
     if "messages_to_delete" in context.user_data:
-        context.user_data["messages_to_delete"].append(update.message.message_id)
+        track_message(context.user_data, update.message.message_id)
 
     await update.message.reply_text(
         f"Отлично! Теперь вы известны как *{nickname}*! 🎉",
@@ -50,7 +52,7 @@ async def profile_nickname_handler(update: Update, context: ContextTypes.DEFAULT
     context.user_data["text_state"] = process_input_nickname
 
     message = await context.bot.send_message(update.effective_chat.id, "*Введите ник:*", parse_mode="markdown")
-    context.user_data["messages_to_delete"].append(message.message_id)
+    track_message(context.user_data, message.message_id)
 
 profile_change_nickname_handlers = [
     CallbackQueryHandler(profile_nickname_handler, pattern="^profile_nickname$"),
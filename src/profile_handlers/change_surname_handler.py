@@ -2,6 +2,7 @@ from telegram import Update
 from telegram.ext import ContextTypes, CallbackQueryHandler
 
 from databaseAPI import rep_chess_db
+from message_cleanup import track_message
 from .main_menu_handler import main_menu_handler
 from util import check_string
 
@@ -9,7 +10,8 @@ from util import check_string
 async def process_input_surname(update: Update, context: ContextTypes.DEFAULT_TYPE):
     async def send_error_and_resume(update: Update, context: ContextTypes.DEFAULT_TYPE, err_msg: str):
         message = await context.bot.send_message(update.effective_chat.id, err_msg, parse_mode="markdown")
-        context.user_data["messages_to_delete"].extend([update.message.message_id, message.message_id])
+        track_message(context.user_data, update.message.message_id)
+        track_message(context.user_data, message.message_id)
         await profile_surname_handler(update, context)
 
     surname = update.message.text
@@ -29,7 +31,7 @@ async def process_input_surname(update: Update, context: ContextTypes.DEFAULT_TY
     context.user_data["text_state"] = None
     rep_chess_db.update_user_surname(update.message.from_user.id, surname)
 
-    context.user_data["messages_to_delete"].append(update.message.message_id)
+    track_message(context.user_data, update.message.message_id)
     # Output updated profile
     await main_menu_handler(update, context)
 
@@ -43,7 +45,7 @@ async def profile_surname_handler(update: Update, context: ContextTypes.DEFAULT_
     context.user_data["text_state"] = process_input_surname
 
     message = await context.bot.send_message(update.effective_chat.id, "*Введите фамилию:*", parse_mode="markdown")
-    context.user_data["messages_to_delete"].append(message.message_id)
+    track_message(context.user_data, message.message_id)
 
 
 profile_change_surname_handlers = [
@@ -1,10 +1,11 @@
 import logging
 
-from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update, error
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.ext import ContextTypes, MessageHandler, filters, CallbackQueryHandler
 
-from databaseAPI import rep_chess_db
+from databaseAPI import rep_chess_db, async_rep_chess_db
 from util import escape_special_symbols
+from message_cleanup import schedule_cleanup, track_message
 
 
 logger = logging.getLogger(__name__)
@@ -46,7 +47,7 @@ async def change_profile_data(update: Update, context: ContextTypes.DEFAULT_TYPE
         parse_mode="markdown",
         reply_markup=change_profile_keyboard
     )
-    context.user_data["messages_to_delete"].append(message.message_id)
+    track_message(context.user_data, message.message_id)
 
 
 def construct_profile_message(user_db_data: dict) -> str:
@@ -93,8 +94,8 @@ async def main_menu_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         telegram_id = update.message.from_user.id
     else:
         telegram_id = update.callback_query.from_user.id
-    user_db_data = rep_chess_db.get_user_on_telegram_id(telegram_id)
-    rep_chess_db.update_user_last_contact(telegram_id)
+    user_db_data = await async_rep_chess_db.get_user_on_telegram_id(telegram_id)
+    await async_rep_chess_db.update_user_last_contact(telegram_id)
 
     # Add user data in cache to not make database query every time
     context.user_data["user_db_data"] = user_db_data
@@ -103,12 +104,7 @@ async def main_menu_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data["text_state"] = None
 
     # Delete useless messages about correcting some data
-    if "messages_to_delete" in context.user_data and context.user_data["messages_to_delete"]:
-        try:
-            await context.bot.delete_messages(update.effective_chat.id, context.user_data["messages_to_delete"])
-        except error.BadRequest as e:
-            logger.error(e)
-    context.user_data["messages_to_delete"] = []
+    schedule_cleanup(context, update.effective_chat.id)
 
     profile_str = construct_profile_message(user_db_data)
     message = await context.bot.send_message(
@@ -118,7 +114,7 @@ async def main_menu_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         disable_web_page_preview=True,
         reply_markup=profile_keyboard
     )
-    context.user_data["messages_to_delete"].append(message.message_id)
+    track_message(context.user_data, message.message_id)
 
 
 profile_main_menu_handlers = [
@@ -0,0 +1,254 @@
+"""
+Outbound send scheduler for the bot (ApplicationBuilder().rate_limiter(send_limiter)).
+
+Every request to the Bot API goes through PriorityRateLimiter.process_request.
+Messages (send*/forward*/copy*/edit*) take a token from the global bucket and
+from the bucket of their chat, and they are granted in priority order:
+
+    await context.bot.send_message(chat_id, text)                                  # INTERACTIVE
+    await application.bot.send_message(chat_id, text, rate_limit_args=PAYMENT)     # payment notices
+    await application.bot.send_message(chat_id, text, rate_limit_args=BULK)        # mass notifications
+
+A chat that has used its tokens doesn't block messages to other chats.
+On RetryAfter all sending stops for the time Telegram asked, then the request is repeated.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from enum import IntEnum
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+logger = logging.getLogger(__name__)
+
+# https://core.telegram.org/bots/faq#my-bot-is-hitting-limits-how-do-i-avoid-this
+GLOBAL_RATE = float(os.getenv("SEND_GLOBAL_RATE", "30"))
+PRIVATE_CHAT_RATE = float(os.getenv("SEND_PRIVATE_CHAT_RATE", "1"))
+GROUP_CHAT_RATE = float(os.getenv("SEND_GROUP_CHAT_RATE", str(20 / 60)))
+CHAT_BURST = 3
+# global tokens bulk messages leave to interactive replies and payment notices
+BULK_RESERVED_TOKENS = 5
+MAX_RETRIES = 3
+MAX_CHAT_BUCKETS = 10000
+
+LIMITED_ENDPOINT_PREFIXES = ("send", "forward", "copy", "edit")
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    PAYMENT = 1
+    BULK = 2
+
+
+INTERACTIVE = Priority.INTERACTIVE
+PAYMENT = Priority.PAYMENT
+BULK = Priority.BULK
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def ready_at(self, now: float, need: float = 1) -> float:
+        """Monotonic time when `need` tokens are available."""
+        self._refill(now)
+        if self.tokens >= need:
+            return now
+        return now + (need - self.tokens) / self.rate
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class _PriorityStats:
+    __slots__ = ("sent", "wait_total", "wait_max", "retry_after")
+
+    def __init__(self):
+        self.sent = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.retry_after = 0
+
+
+class _Waiter:
+    __slots__ = ("chat_key", "future", "enqueued_at")
+
+    def __init__(self, chat_key, future: asyncio.Future):
+        self.chat_key = chat_key
+        self.future = future
+        self.enqueued_at = time.monotonic()
+
+
+class PriorityRateLimiter(BaseRateLimiter[Priority]):
+    """rate_limit_args of a bot method is the Priority of the request (INTERACTIVE by default)."""
+    def __init__(
+        self,
+        global_rate: float = GLOBAL_RATE,
+        private_chat_rate: float = PRIVATE_CHAT_RATE,
+        group_chat_rate: float = GROUP_CHAT_RATE,
+        max_retries: int = MAX_RETRIES,
+    ):
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.private_chat_rate = private_chat_rate
+        self.group_chat_rate = group_chat_rate
+        self.max_retries = max_retries
+        self._chat_buckets = {}
+        self._queues = {priority: deque() for priority in Priority}
+        self._stats = {priority: _PriorityStats() for priority in Priority}
+        self._paused_until = 0.0
+        self._wakeup = None
+        self._dispatcher = None
+
+    async def initialize(self) -> None:
+        if self._dispatcher is None:
+            self._wakeup = asyncio.Event()
+            self._dispatcher = asyncio.create_task(self._dispatch_loop(), name="send-rate-limiter")
+
+    async def shutdown(self) -> None:
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+        for queue in self._queues.values():
+            while queue:
+                queue.popleft().future.cancel()
+
+    # ================= SCHEDULING =================
+    def _chat_bucket(self, chat_key) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_key)
+        if bucket is None:
+            if len(self._chat_buckets) >= MAX_CHAT_BUCKETS:
+                # a full bucket is the same as a new one
+                now = time.monotonic()
+                self._chat_buckets = {k: b for k, b in self._chat_buckets.items() if not b.is_full(now)}
+            is_private = isinstance(chat_key, int) and chat_key > 0
+            rate = self.private_chat_rate if is_private else self.group_chat_rate
+            bucket = self._chat_buckets[chat_key] = TokenBucket(rate, CHAT_BURST)
+        return bucket
+
+    def _grant(self, now: float) -> float | None:
+        """
+        Let through everything allowed right now.
+        Returns seconds until something else can be granted, None if nobody waits.
+        """
+        if now < self._paused_until:
+            return self._paused_until - now if any(self._queues.values()) else None
+
+        next_at = None
+        for priority, queue in self._queues.items():
+            need = 1 + (BULK_RESERVED_TOKENS if priority == BULK else 0)
+            blocked = []
+            while queue:
+                waiter = queue.popleft()
+                if waiter.future.done():
+                    # the handler was cancelled
+                    continue
+                if waiter.chat_key is not None:
+                    global_at = self.global_bucket.ready_at(now, need)
+                    if global_at > now:
+                        blocked.append(waiter)
+                        blocked.extend(queue)
+                        queue.clear()
+                        next_at = global_at if next_at is None else min(next_at, global_at)
+                        break
+                    chat_bucket = self._chat_bucket(waiter.chat_key)
+                    chat_at = chat_bucket.ready_at(now)
+                    if chat_at > now:
+                        # other chats go on
+                        blocked.append(waiter)
+                        next_at = chat_at if next_at is None else min(next_at, chat_at)
+                        continue
+                    self.global_bucket.take(now)
+                    chat_bucket.take(now)
+                waiter.future.set_result(None)
+                stats = self._stats[priority]
+                waited = now - waiter.enqueued_at
+                stats.sent += 1
+                stats.wait_total += waited
+                stats.wait_max = max(stats.wait_max, waited)
+            queue.extend(blocked)
+        return None if next_at is None else next_at - now
+
+    async def _dispatch_loop(self):
+        while True:
+            self._wakeup.clear()
+            delay = self._grant(time.monotonic())
+            if delay is None:
+                await self._wakeup.wait()
+            else:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _acquire(self, priority: Priority, chat_key):
+        if self._dispatcher is None:
+            await self.initialize()
+        future = asyncio.get_running_loop().create_future()
+        self._queues[priority].append(_Waiter(chat_key, future))
+        self._wakeup.set()
+        await future
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        priority = Priority(rate_limit_args) if rate_limit_args is not None else INTERACTIVE
+        chat_key = None
+        if endpoint.startswith(LIMITED_ENDPOINT_PREFIXES) and data.get("chat_id") is not None:
+            chat_key = data["chat_id"]
+            try:
+                chat_key = int(chat_key)
+            except (TypeError, ValueError):
+                # @channel_username
+                pass
+
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(priority, chat_key)
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                self._stats[priority].retry_after += 1
+                if attempt == self.max_retries:
+                    logger.error(f"{endpoint}: flood control after {self.max_retries} retries")
+                    raise
+                # like telegram.ext.AIORateLimiter: the public attribute warns about int/timedelta
+                seconds = e._retry_after.total_seconds()
+                logger.warning(f"{endpoint}: flood control, sending is paused for {seconds}s")
+                self._paused_until = max(self._paused_until, time.monotonic() + seconds + 0.1)
+                self._wakeup.set()
+
+    # ================= METRICS =================
+    def stats(self) -> dict:
+        result = {
+            "paused_for": max(0.0, self._paused_until - time.monotonic()),
+            "chats": len(self._chat_buckets),
+        }
+        for priority in Priority:
+            stats = self._stats[priority]
+            result[priority.name.lower()] = {
+                "queued": sum(1 for waiter in self._queues[priority] if not waiter.future.done()),
+                "sent": stats.sent,
+                "wait_avg": stats.wait_total / stats.sent if stats.sent else 0.0,
+                "wait_max": stats.wait_max,
+                "retry_after": stats.retry_after,
+            }
+        return result
+
+
+send_limiter = PriorityRateLimiter()
@@ -2,7 +2,7 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import MessageHandler, CallbackQueryHandler, filters, ContextTypes
 
 from start import main_menu_reply_keyboard
-from databaseAPI import rep_chess_db
+from databaseAPI import async_rep_chess_db
 from util import check_string, construct_timetable_buttons
 
 
@@ -40,7 +40,7 @@ async def update_and_save_nickname(update: Update, context: ContextTypes.DEFAULT
         k_factor = 90 - games_played * 3
     else:
         k_factor = 30
-    rep_chess_db.add_user_on_tournament(
+    await async_rep_chess_db.add_user_on_tournament(
         user_id,
         context.user_data["active_tournament"]["tournament_id"],
         nickname,
@@ -132,8 +132,8 @@ async def ask_about_registration(update: Update, context: ContextTypes.DEFAULT_T
         telegram_id = update.message.from_user.id
     else:
         telegram_id = update.callback_query.from_user.id
-    context.user_data["user_db_data"] = rep_chess_db.get_user_on_telegram_id(telegram_id)
-    rep_chess_db.update_user_last_contact(telegram_id)
+    context.user_data["user_db_data"] = await async_rep_chess_db.get_user_on_telegram_id(telegram_id)
+    await async_rep_chess_db.update_user_last_contact(telegram_id)
     if "tournaments" not in context.bot_data or len(context.bot_data["tournaments"]) < 1:
         await context.bot.send_message(
             update.effective_chat.id,
@@ -145,7 +145,7 @@ async def ask_about_registration(update: Update, context: ContextTypes.DEFAULT_T
         return
 
     if "user_db_data" not in context.user_data:
-        context.user_data["user_db_data"] = rep_chess_db.get_user_on_telegram_id(telegram_id)
+        context.user_data["user_db_data"] = await async_rep_chess_db.get_user_on_telegram_id(telegram_id)
 
     if len(context.bot_data["tournaments"]) == 1:
         tournament = next(iter(context.bot_data["tournaments"].values()))
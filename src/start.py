@@ -2,6 +2,7 @@ from telegram import ReplyKeyboardMarkup, Update, KeyboardButton
 from telegram.ext import ContextTypes, CallbackQueryHandler, CommandHandler
 
 from databaseAPI import rep_chess_db
+from message_cleanup import track_message
 from profile_handlers.change_nickname_handler import process_input_nickname
 
 reg_main_menu_reply_keyboard = ReplyKeyboardMarkup([
@@ -49,7 +50,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 Не беспокойся насчет первого выбора, ник всегда можно сменить в профиле.
 """
         )
-        context.user_data["messages_to_delete"].append(message.message_id)
+        track_message(context.user_data, message.message_id)
         context.user_data["text_state"] = process_input_nickname
 
 async def go_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -0,0 +1,83 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from telegram.error import TimedOut
+
+from bot_request import RoutingRequest, is_media_request
+
+BASE = "http://telegram-bot-api:8081/bot123:abc"
+
+
+class FakeRequest:
+    """Records calls; `block` keeps the request open until it is set."""
+    def __init__(self):
+        self.urls = []
+        self.block = None
+        self.error = None
+
+    async def do_request(self, url, method, request_data=None, **timeouts):
+        self.urls.append(url)
+        if self.block is not None:
+            await self.block.wait()
+        if self.error is not None:
+            raise self.error
+        return 200, b'{"ok": true, "result": true}'
+
+
+def data(contains_files=False, **parameters):
+    """Stands for telegram.request.RequestData: only what the routing looks at."""
+    return SimpleNamespace(contains_files=contains_files, parameters=parameters)
+
+
+def test_media_requests_are_recognized():
+    upload = data(contains_files=True, chat_id=1)
+    assert is_media_request(f"{BASE}/sendVideo", upload)
+    assert is_media_request(f"{BASE}/sendVideo", data(chat_id=1, video="file:///bot_data/v.mp4"))
+    assert is_media_request(f"{BASE}/getFile", data(file_id="abc"))
+    assert is_media_request("http://telegram-bot-api:8081/file/bot123:abc/videos/v.mp4", None)
+    # sending by file_id is a quick interactive call
+    assert not is_media_request(f"{BASE}/sendVideo", data(chat_id=1, video="BAACAgIAAxkB"))
+    assert not is_media_request(f"{BASE}/sendMessage", data(chat_id=1, text="hi"))
+
+
+def test_upload_does_not_block_interactive_pool():
+    async def scenario():
+        interactive, media = FakeRequest(), FakeRequest()
+        media.block = asyncio.Event()
+        request = RoutingRequest(interactive, media, 8, 1)
+        upload = asyncio.create_task(request.do_request(
+            f"{BASE}/sendVideo", "POST", data(contains_files=True, chat_id=1)
+        ))
+        await asyncio.sleep(0)
+        assert request.stats()["media"]["in_flight"] == 1
+
+        await asyncio.wait_for(request.do_request(f"{BASE}/sendMessage", "POST", data(chat_id=1, text="hi")), 1)
+        assert interactive.urls == [f"{BASE}/sendMessage"]
+
+        media.block.set()
+        await upload
+        return request.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["media"]["requests"] == 1
+    assert stats["media"]["max_in_flight"] == 1 and stats["media"]["in_flight"] == 0
+    assert stats["interactive"]["requests"] == 1
+
+
+def test_pool_timeouts_are_counted():
+    async def scenario():
+        interactive = FakeRequest()
+        try:
+            raise TimedOut("Pool timeout") from httpx.PoolTimeout("all connections are busy")
+        except TimedOut as e:
+            interactive.error = e
+        request = RoutingRequest(interactive, FakeRequest(), 8, 1)
+        with pytest.raises(TimedOut):
+            await request.do_request(f"{BASE}/sendMessage", "POST", data(chat_id=1, text="hi"))
+        return request.stats()["interactive"]
+
+    stats = asyncio.run(scenario())
+    assert stats["errors"] == 1
+    assert stats["pool_timeouts"] == 1
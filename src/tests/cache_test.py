@@ -0,0 +1,55 @@
+import time
+
+from cache import LRUCache
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.set(1, "a")
+    cache.set(2, "b")
+    assert cache.get(1) == "a"
+    cache.set(3, "c")
+
+    assert cache.get(2) is None
+    assert cache.get(1) == "a"
+    assert cache.get(3) == "c"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl_expires_entries(mocker):
+    now = time.monotonic()
+    monotonic = mocker.patch("cache.time.monotonic", return_value=now)
+    cache = LRUCache(maxsize=10, ttl=5)
+    cache.set("key", "value")
+
+    monotonic.return_value = now + 4
+    assert cache.get("key") == "value"
+    monotonic.return_value = now + 6
+    assert cache.get("key") is None
+
+
+def test_hit_and_miss_counters():
+    cache = LRUCache(maxsize=10)
+    cache.get("missing")
+    cache.set("key", "value")
+    cache.get("key")
+    cache.get("key")
+
+    stats = cache.stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 1
+    assert stats["hit_rate"] == 2 / 3
+
+
+def test_stale_value_is_not_stored_after_invalidation():
+    """
+    Reader takes a version, writer invalidates the key,
+    reader must not put its (old) value back.
+    """
+    cache = LRUCache(maxsize=10)
+    version = cache.version()
+    cache.invalidate("key")
+
+    assert not cache.set("key", "old row", version=version)
+    assert cache.get("key") is None
+    assert cache.set("key", "new row", version=cache.version())
@@ -0,0 +1,45 @@
+from unittest.mock import MagicMock
+
+from city_directory import CityDirectory
+from databaseAPI import RepChessDB
+
+
+CITIES = [
+    {"city_id": 1, "name": "Москва", "tg_channel": "repchess_msk"},
+    {"city_id": 2, "name": "Казань", "tg_channel": "repchess_kzn"},
+]
+
+
+def test_lookups_in_both_directions():
+    load_rows = MagicMock(return_value=CITIES)
+    cities = CityDirectory(load_rows)
+
+    assert cities.by_id(2).name == "Казань"
+    assert cities.by_name("Москва").tg_channel == "repchess_msk"
+    assert cities.by_id(3) is None
+    assert cities.names() == ["Москва", "Казань"]
+    load_rows.assert_called_once()
+
+
+def test_city_lookups_dont_query_db(mocker):
+    db = RepChessDB()
+    db.pool = MagicMock()
+    mocker.patch.object(db.cities, "_load_rows", return_value=CITIES)
+    db.cities.refresh()
+    db.user_cache.set(10, MagicMock(row={"telegram_id": 10, "city_id": 2}))
+
+    assert db.get_city_on_id(1) == "Москва"
+    assert db.get_id_on_city_name("Казань") == 2
+    assert db.get_tg_channel_on_tg_id(10) == "repchess_kzn"
+    db.pool.getconn.assert_not_called()
+
+
+def test_add_city_refreshes_directory(mocker):
+    db = RepChessDB()
+    db.pool = MagicMock()
+    load_cities = mocker.patch.object(db.cities, "_load_rows", return_value=CITIES[:1])
+    assert db.get_cities_names() == ["Москва"]
+
+    load_cities.return_value = CITIES
+    db.add_city("repchess_kzn", "Казань")
+    assert db.get_cities_names() == ["Москва", "Казань"]
@@ -0,0 +1,67 @@
+import logging
+
+import pytest
+
+from db_metrics import QueryMetrics, params_shape, timed_methods, query_metrics, _local
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    query_metrics.reset()
+    yield
+    query_metrics.reset()
+
+
+@timed_methods
+class FakeDB:
+    def get_user(self, telegram_id):
+        # what InstrumentedCursor does on execute
+        _local.statements.append(("SELECT * FROM \"user\" WHERE telegram_id = %s", params_shape((telegram_id,))))
+        return {"telegram_id": telegram_id}
+
+    def broken(self):
+        raise RuntimeError("boom")
+
+    def _private(self):
+        pass
+
+
+def test_public_methods_are_counted():
+    db = FakeDB()
+    db.get_user(1)
+    db.get_user(2)
+    with pytest.raises(RuntimeError):
+        db.broken()
+    db._private()
+
+    rows = {row["method"]: row for row in query_metrics.top()}
+    assert set(rows) == {"FakeDB.get_user", "FakeDB.broken"}
+    assert rows["FakeDB.get_user"]["count"] == 2
+    assert rows["FakeDB.broken"]["errors"] == 1
+    assert sum(rows["FakeDB.get_user"]["histogram"].values()) == 2
+
+
+def test_slow_call_is_logged_with_sql(mocker, caplog):
+    mocker.patch("db_metrics.SLOW_QUERY_MS", 0)
+    with caplog.at_level(logging.WARNING, logger="databaseAPI.slow_queries"):
+        FakeDB().get_user(1)
+    assert "FakeDB.get_user" in caplog.text
+    assert 'SELECT * FROM "user" WHERE telegram_id = %s params=(int)' in caplog.text
+
+
+def test_top_is_sorted_by_average():
+    metrics = QueryMetrics()
+    metrics.record("fast", 0.001, False)
+    metrics.record("slow", 0.3, False)
+    metrics.record("slow", 0.1, False)
+
+    top = metrics.top(1)
+    assert [row["method"] for row in top] == ["slow"]
+    assert top[0]["p95_ms"] == 500
+    assert top[0]["max_ms"] == pytest.approx(300)
+
+
+def test_params_shape_hides_values():
+    assert params_shape(("+79990000000", 5, None)) == "(str, int, NoneType)"
+    assert params_shape({"phone": "+7999"}) == "{phone: str}"
+    assert params_shape([(1, 2)] * 100) == "list[100]"
@@ -0,0 +1,72 @@
+import threading
+from unittest.mock import MagicMock
+
+import pytest
+import psycopg2
+from psycopg2 import extensions
+
+from db_pool import InstrumentedConnectionPool, PoolTimeoutError
+
+
+def make_connection(*args, **kwargs):
+    conn = MagicMock()
+    conn.closed = 0
+    conn.info.transaction_status = extensions.TRANSACTION_STATUS_IDLE
+    return conn
+
+
+@pytest.fixture
+def connect(mocker):
+    return mocker.patch("db_pool.psycopg2.connect", side_effect=make_connection)
+
+
+def test_connections_are_reused(connect):
+    pool = InstrumentedConnectionPool(1, 2, dsn="fake")
+    conn = pool.getconn()
+    pool.putconn(conn)
+    assert pool.getconn() is conn
+    assert connect.call_count == 1
+
+
+def test_exhausted_pool_waits_for_connection(connect):
+    pool = InstrumentedConnectionPool(0, 1, timeout=5, dsn="fake")
+    conn = pool.getconn()
+    threading.Timer(0.05, pool.putconn, args=(conn,)).start()
+
+    assert pool.getconn() is conn
+    stats = pool.stats()
+    assert stats["waits"] == 1
+    assert stats["wait_max"] >= 0.04
+    assert stats["max_in_use"] == 1
+
+
+def test_exhausted_pool_times_out(connect):
+    pool = InstrumentedConnectionPool(0, 1, timeout=0.01, dsn="fake")
+    pool.getconn()
+    with pytest.raises(PoolTimeoutError):
+        pool.getconn()
+    assert pool.stats()["timeouts"] == 1
+
+
+def test_broken_connection_is_replaced(connect):
+    pool = InstrumentedConnectionPool(1, 1, health_check_after=0, dsn="fake")
+    conn = pool.getconn()
+    pool.putconn(conn)
+    conn.cursor.side_effect = psycopg2.OperationalError("server closed the connection")
+
+    new_conn = pool.getconn()
+    assert new_conn is not conn
+    conn.close.assert_called_once()
+    assert pool.stats()["broken"] == 1
+    assert pool.stats()["size"] == 1
+
+
+def test_connect_error_frees_slot(connect):
+    pool = InstrumentedConnectionPool(0, 1, timeout=0.01, dsn="fake")
+    connect.side_effect = psycopg2.OperationalError("db is down")
+    with pytest.raises(psycopg2.OperationalError):
+        pool.getconn()
+
+    connect.side_effect = make_connection
+    pool.getconn()
+    assert pool.stats()["errors"] == 1
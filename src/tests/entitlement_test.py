@@ -0,0 +1,59 @@
+import datetime
+from unittest.mock import MagicMock
+
+import pytest
+
+from databaseAPI import RepChessDB, MOSCOW_TZ
+
+
+@pytest.fixture
+def db():
+    db = RepChessDB()
+    db.pool = MagicMock()
+    db.cursor = db.pool.getconn.return_value.cursor.return_value.__enter__.return_value
+    return db
+
+
+def subscription_row(active: bool, valid_until: datetime.datetime | None):
+    return {"active_subscription": active, "subscription_valid_until": valid_until}
+
+
+def test_active_subscription_is_answered_from_cache(db):
+    valid_until = datetime.datetime.now(MOSCOW_TZ) + datetime.timedelta(days=1)
+    db.cursor.fetchone.return_value = subscription_row(True, valid_until)
+
+    assert db.check_user_active_subscription(1)
+    assert db.check_user_active_subscription(1)
+    db.cursor.execute.assert_called_once()
+
+
+def test_lapsed_subscription_is_not_written_on_read(db, mocker):
+    valid_until = datetime.datetime.now(MOSCOW_TZ) + datetime.timedelta(minutes=1)
+    db.cursor.fetchone.return_value = subscription_row(True, valid_until)
+    assert db.check_user_active_subscription(1)
+
+    # time passes, the cached entry is still there
+    later = valid_until + datetime.timedelta(seconds=1)
+    mocker.patch("databaseAPI.datetime.datetime", wraps=datetime.datetime, now=lambda tz=None: later)
+    assert not db.check_user_active_subscription(1)
+    db.cursor.execute.assert_called_once()
+    db.pool.getconn.return_value.commit.assert_not_called()
+
+
+def test_set_user_subscription_invalidates_cache(db):
+    db.cursor.fetchone.return_value = None
+    assert not db.check_user_active_subscription(1)
+
+    db.set_user_subscription(1, True, None)
+    db.cursor.fetchone.return_value = subscription_row(True, None)
+    assert db.check_user_active_subscription(1)
+
+
+def test_expire_subscriptions_invalidates_expired(db):
+    db.entitlement_cache.set(1, (True, None))
+    db.entitlement_cache.set(2, (True, None))
+    db.cursor.fetchall.return_value = [{"telegram_id": 1}]
+
+    assert db.expire_subscriptions() == 1
+    assert db.entitlement_cache.get(1) is None
+    assert db.entitlement_cache.get(2) == (True, None)
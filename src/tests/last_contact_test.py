@@ -0,0 +1,51 @@
+from contextlib import contextmanager
+from unittest.mock import MagicMock
+
+import pytest
+
+from databaseAPI import RepChessDB
+
+
+@pytest.fixture
+def db(mocker):
+    db = RepChessDB()
+    conn = MagicMock()
+    db.conn = conn
+
+    @contextmanager
+    def get_connection():
+        yield conn
+
+    mocker.patch.object(db, "get_connection", get_connection)
+    return db
+
+
+def test_last_contacts_are_coalesced(db, mocker):
+    execute_values = mocker.patch("databaseAPI.execute_values")
+    for _ in range(5):
+        db.update_user_last_contact(1)
+    db.update_user_last_contact(2)
+
+    assert db.conn.cursor.call_count == 0
+    assert db.flush_last_contacts() == 2
+    execute_values.assert_called_once()
+    rows = execute_values.call_args.args[2]
+    assert sorted(telegram_id for telegram_id, _ in rows) == [1, 2]
+    db.conn.commit.assert_called_once()
+
+    # buffer is empty now
+    assert db.flush_last_contacts() == 0
+    execute_values.assert_called_once()
+
+
+def test_failed_flush_keeps_values(db, mocker):
+    mocker.patch("databaseAPI.execute_values", side_effect=RuntimeError("db is down"))
+    db.update_user_last_contact(1)
+
+    with pytest.raises(RuntimeError):
+        db.flush_last_contacts()
+    db.conn.rollback.assert_called_once()
+
+    execute_values = mocker.patch("databaseAPI.execute_values")
+    assert db.flush_last_contacts() == 1
+    execute_values.assert_called_once()
@@ -0,0 +1,99 @@
+import asyncio
+import errno
+import os
+from types import SimpleNamespace
+
+import pytest
+
+import media_ingest
+from media_ingest import ingest_file, ingest_telegram_file
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "bot_data" / "videos" / "file_0.mp4"
+    path.parent.mkdir(parents=True)
+    path.write_bytes(b"video" * 1000)
+    return path
+
+
+def fail(error_number):
+    def raise_error(*args):
+        raise OSError(error_number, os.strerror(error_number))
+    return raise_error
+
+
+def test_same_filesystem_is_a_hard_link(source, tmp_path):
+    dest = tmp_path / "media" / "video.mp4"
+    assert ingest_file(source, dest) == "link"
+    assert dest.stat().st_ino == source.stat().st_ino
+    # the server keeps its file
+    assert source.exists()
+
+
+def test_existing_dest_is_replaced(source, tmp_path):
+    dest = tmp_path / "video.mp4"
+    dest.write_bytes(b"old")
+    assert ingest_file(source, dest) == "link"
+    assert dest.read_bytes() == source.read_bytes()
+
+
+def test_no_hard_links_means_rename(source, tmp_path, monkeypatch):
+    monkeypatch.setattr(media_ingest.os, "link", fail(errno.EPERM))
+    dest = tmp_path / "media" / "video.mp4"
+    data = source.read_bytes()
+    assert ingest_file(source, dest) == "rename"
+    assert dest.read_bytes() == data and not source.exists()
+
+
+def test_other_filesystem_is_copied_in_chunks(source, tmp_path, monkeypatch):
+    monkeypatch.setattr(media_ingest.os, "link", fail(errno.EXDEV))
+    monkeypatch.setattr(media_ingest, "COPY_CHUNK_SIZE", 1024)
+    dest = tmp_path / "media" / "video.mp4"
+    assert ingest_file(source, dest) == "copy"
+    assert dest.read_bytes() == source.read_bytes()
+    assert sorted(os.listdir(dest.parent)) == ["video.mp4"]
+
+
+def test_failed_copy_leaves_no_partial_file(source, tmp_path, monkeypatch):
+    monkeypatch.setattr(media_ingest.os, "link", fail(errno.EXDEV))
+    monkeypatch.setattr(media_ingest.shutil, "copyfileobj", fail(errno.ENOSPC))
+    dest = tmp_path / "media" / "video.mp4"
+    with pytest.raises(OSError):
+        ingest_file(source, dest)
+    assert os.listdir(dest.parent) == []
+
+
+def test_remote_files_are_downloaded(tmp_path):
+    downloaded = []
+
+    async def download_to_drive(path):
+        downloaded.append(path)
+        path.write_bytes(b"video")
+
+    file = SimpleNamespace(file_path="https://api.telegram.org/file/bot123/videos/file_0.mp4", download_to_drive=download_to_drive)
+    dest = asyncio.run(ingest_telegram_file(file, tmp_path / "media" / "video.mp4"))
+    assert downloaded == [dest] and dest.read_bytes() == b"video"
+
+
+def test_local_server_files_are_linked(source, tmp_path):
+    file = SimpleNamespace(file_path=str(source), download_to_drive=None)
+    dest = asyncio.run(ingest_telegram_file(file, tmp_path / "media" / "video.mp4"))
+    assert dest.stat().st_ino == source.stat().st_ino
+
+
+def test_link_and_rename_not_permitted_means_copy(source, tmp_path, monkeypatch):
+    # the Bot API server runs as another uid: fs.protected_hardlinks, no write access to its dir
+    replace = os.replace
+
+    def replace_not_permitted(src, dst):
+        if src == source:
+            raise PermissionError(errno.EACCES, os.strerror(errno.EACCES))
+        return replace(src, dst)
+
+    monkeypatch.setattr(media_ingest.os, "link", fail(errno.EPERM))
+    monkeypatch.setattr(media_ingest.os, "replace", replace_not_permitted)
+    dest = tmp_path / "media" / "video.mp4"
+    assert ingest_file(source, dest) == "copy"
+    assert dest.read_bytes() == source.read_bytes()
+    assert sorted(os.listdir(dest.parent)) == ["video.mp4"]
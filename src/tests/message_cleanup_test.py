@@ -0,0 +1,52 @@
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+from telegram.error import BadRequest, NetworkError
+
+from message_cleanup import MAX_TRACKED_MESSAGES, delete_messages, schedule_cleanup, track_message
+
+
+def test_track_message_is_capped():
+    user_data = {}
+    for message_id in range(MAX_TRACKED_MESSAGES + 20):
+        track_message(user_data, message_id)
+    assert user_data["messages_to_delete"] == list(range(20, MAX_TRACKED_MESSAGES + 20))
+
+
+def test_messages_are_deleted_in_batches_of_100():
+    bot = AsyncMock()
+    retry = asyncio.run(delete_messages(bot, 1, list(range(250))))
+    assert retry == []
+    chunks = [call.kwargs["message_ids"] for call in bot.delete_messages.call_args_list]
+    assert [len(chunk) for chunk in chunks] == [100, 100, 50]
+
+
+def test_only_failed_network_chunks_are_retried():
+    bot = AsyncMock()
+    bot.delete_messages.side_effect = [None, NetworkError("timeout"), BadRequest("message can't be deleted")]
+    retry = asyncio.run(delete_messages(bot, 1, list(range(300))))
+    assert retry == list(range(100, 200))
+
+
+def test_cleanup_runs_in_background_and_keeps_new_messages():
+    async def scenario():
+        bot = AsyncMock()
+        bot.delete_messages.side_effect = NetworkError("timeout")
+        tasks = []
+        context = SimpleNamespace(
+            bot=bot,
+            user_data={"messages_to_delete": [1, 2, 3]},
+            application=SimpleNamespace(create_task=lambda coro, name=None: tasks.append(asyncio.create_task(coro))),
+        )
+        schedule_cleanup(context, 10)
+        # the reply goes on at once, its message is tracked for the next cleanup
+        assert context.user_data["messages_to_delete"] == []
+        track_message(context.user_data, 4)
+        await asyncio.gather(*tasks)
+        return bot, context.user_data
+
+    bot, user_data = asyncio.run(scenario())
+    bot.delete_messages.assert_awaited_once_with(chat_id=10, message_ids=[1, 2, 3])
+    # failed ids come back before the new one
+    assert user_data["messages_to_delete"] == [1, 2, 3, 4]
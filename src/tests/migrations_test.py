@@ -0,0 +1,115 @@
+"""
+EXPLAIN tests need a postgres: DATABASE_URL=... python -m pytest tests/migrations_test.py
+Everything is done in a scratch schema which is dropped at the end.
+"""
+import datetime
+import os
+
+import psycopg2
+import pytest
+from psycopg2.extras import RealDictCursor
+from psycopg2.pool import ThreadedConnectionPool
+
+from databaseAPI import RepChessDB
+from migrations import MIGRATIONS, apply_migrations
+
+SCHEMA = "migrations_test"
+DATABASE_URL = os.getenv("DATABASE_URL")
+
+needs_db = pytest.mark.skipif(not DATABASE_URL, reason="needs DATABASE_URL")
+
+
+def test_migration_versions_are_increasing():
+    versions = [version for version, _, _ in MIGRATIONS]
+    assert versions == list(range(1, len(versions) + 1))
+
+
+@pytest.fixture(scope="module")
+def db():
+    with psycopg2.connect(DATABASE_URL) as conn, conn.cursor() as cur:
+        cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE; CREATE SCHEMA {SCHEMA}")
+    db = RepChessDB()
+    db.pool = ThreadedConnectionPool(
+        1, 2, dsn=DATABASE_URL, cursor_factory=RealDictCursor, options=f"-c search_path={SCHEMA}"
+    )
+    db._create_tables()
+    db._migrate()
+    yield db
+    with db.get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+        conn.commit()
+    db.pool.closeall()
+    db.pool = None
+
+
+def explain(db, query: str, params: tuple) -> str:
+    with db.get_connection() as conn:
+        try:
+            with conn.cursor() as cur:
+                # tables are tiny, don't let the planner prefer seq scan because of that
+                cur.execute("SET LOCAL enable_seqscan = off")
+                cur.execute("EXPLAIN " + query, params)
+                return "\n".join(row["QUERY PLAN"] for row in cur.fetchall())
+        finally:
+            conn.rollback()
+
+
+@needs_db
+def test_migrations_are_applied_once(db):
+    with db.get_connection() as conn:
+        assert apply_migrations(conn) == []
+        with conn.cursor() as cur:
+            cur.execute("SELECT MAX(version) AS version FROM schema_version")
+            assert cur.fetchone()["version"] == MIGRATIONS[-1][0]
+
+
+@needs_db
+def test_user_on_tournament_nickname_index(db):
+    plan = explain(db, "SELECT * FROM user_on_tournament WHERE tournament_id = %s AND nickname = %s", (1, "magnus"))
+    assert "idx_user_on_tournament_tournament_nickname" in plan
+
+
+@needs_db
+def test_tournament_channel_date_index(db):
+    plan = explain(
+        db,
+        "SELECT * FROM tournament WHERE date_time >= %s AND tg_channel = %s ORDER BY date_time",
+        (datetime.datetime.now(datetime.timezone.utc), "@repchess"),
+    )
+    assert "idx_tournament_channel_date" in plan
+
+
+@needs_db
+def test_game_tournament_index(db):
+    plan = explain(db, "SELECT * FROM game WHERE tournament_id = %s", (1,))
+    assert "idx_game_tournament" in plan
+
+
+@needs_db
+def test_due_subscriptions_index(db):
+    plan = explain(db, """
+        SELECT telegram_id, user_phone AS phone, subscription_payment_method_id
+        FROM subscription
+        WHERE
+            active_subscription = TRUE
+            AND subscription_auto_renew = TRUE
+            AND subscription_payment_method_id IS NOT NULL
+            AND user_phone IS NOT NULL
+            AND subscription_next_charge IS NOT NULL
+            AND subscription_next_charge <= %s
+    """, (datetime.datetime.now(datetime.timezone.utc),))
+    assert "idx_subscription_due" in plan
+
+
+@needs_db
+def test_subscription_expiry_index(db):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    plan = explain(db, """
+        SELECT telegram_id FROM subscription
+        WHERE active_subscription = TRUE
+            AND subscription_valid_until IS NOT NULL
+            AND subscription_valid_until < %s
+            AND (subscription_auto_renew = FALSE OR subscription_valid_until < %s)
+    """, (now, now))
+    assert "idx_subscription_active_valid_until" in plan
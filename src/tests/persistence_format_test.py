@@ -0,0 +1,60 @@
+import datetime
+import pickle
+from unittest.mock import MagicMock
+
+from telegram import InlineKeyboardButton
+
+from persistence_format import MAX_TRACKED_MESSAGES, MsgpackSerializer
+
+
+def some_state(update, context):
+    pass
+
+
+def make_serializer():
+    db = MagicMock()
+    db.get_user_on_telegram_id.side_effect = lambda telegram_id: {"telegram_id": telegram_id, "nickname": "fresh"}
+    db.get_tournament_on_id.side_effect = ValueError("deleted")
+    return MsgpackSerializer(db)
+
+
+def test_round_trip_of_known_keys():
+    serializer = make_serializer()
+    data = {
+        "user_db_data": {"telegram_id": 7, "nickname": "stale", "name": "x" * 100},
+        "active_tournament": {"tournament_id": 3, "date_time": datetime.datetime(2025, 1, 1, 18, 0)},
+        "text_state": some_state,
+        "file_state": None,
+        "timetable_buttons": [[InlineKeyboardButton("1", callback_data="t:1")]],
+        "messages_to_delete": list(range(MAX_TRACKED_MESSAGES + 50)),
+        "video_metadata": {"duration": 12.5, "date": datetime.date(2025, 1, 2)},
+    }
+    raw = serializer.dumps(data)
+    assert len(raw) < len(pickle.dumps(data))
+
+    loaded = serializer.loads(raw)
+    # rows are read again, a deleted one is dropped
+    assert loaded["user_db_data"] == {"telegram_id": 7, "nickname": "fresh"}
+    assert "active_tournament" not in loaded
+    assert loaded["text_state"] is some_state
+    assert loaded["file_state"] is None
+    assert loaded["timetable_buttons"] == [[InlineKeyboardButton("1", callback_data="t:1")]]
+    assert loaded["messages_to_delete"] == list(range(50, MAX_TRACKED_MESSAGES + 50))
+    assert loaded["video_metadata"] == {"duration": 12.5, "date": datetime.date(2025, 1, 2)}
+    # the dict of the application is not changed
+    assert len(data["messages_to_delete"]) == MAX_TRACKED_MESSAGES + 50
+
+
+def test_unknown_objects_and_pickle_rows():
+    serializer = make_serializer()
+    data = {"nicknames": {"a", "b"}, 5: "int key"}
+    assert serializer.loads(serializer.dumps(data)) == data
+    # rows written before msgpack
+    assert serializer.loads(pickle.dumps(data)) == data
+
+
+def test_removed_handler_resets_state():
+    serializer = make_serializer()
+    raw = serializer.dumps({"text_state": some_state})
+    raw = raw.replace(b"some_state", b"gone_state")
+    assert serializer.loads(raw) == {"text_state": None}
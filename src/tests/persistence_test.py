@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+
+from persistence import PostgresPersistence, PickleSerializer
+
+
+@pytest.fixture
+def persistence(mocker):
+    persistence = PostgresPersistence(db=None)
+    persistence.stored_users = {}
+    persistence.loads = []
+    persistence.writes = []
+
+    def load(db, user_id):
+        persistence.loads.append(user_id)
+        data = persistence.stored_users.get(user_id)
+        return PickleSerializer().dumps(data) if data is not None else None
+
+    def write(batch, state):
+        (_, users, dropped_users), _ = batch
+        persistence.writes.append((dict(users), set(dropped_users), dict(state)))
+
+    async def run(func, *args):
+        return func(*args)
+
+    mocker.patch.object(persistence._users, "load", load)
+    mocker.patch.object(persistence, "_write", write)
+    mocker.patch.object(persistence, "_run", run)
+    return persistence
+
+
+def test_user_data_is_loaded_once_on_first_update(persistence):
+    persistence.stored_users[1] = {"lang": "ru"}
+
+    async def scenario():
+        assert await persistence.get_user_data() == {}
+        user_data = {}
+        await persistence.refresh_user_data(1, user_data)
+        await persistence.refresh_user_data(1, user_data)
+        return user_data
+
+    assert asyncio.run(scenario()) == {"lang": "ru"}
+    assert persistence.loads == [1]
+
+
+def test_only_changed_users_are_written_in_one_batch(persistence):
+    persistence.stored_users[1] = {"a": 1}
+
+    async def scenario():
+        users = {1: {}, 2: {}, 3: {}}
+        for user_id, data in users.items():
+            await persistence.refresh_user_data(user_id, data)
+        users[2]["b"] = 2
+        users[3]["c"] = 3
+        # like Application.update_persistence
+        await asyncio.gather(*(persistence.update_user_data(i, d) for i, d in users.items()))
+        # nothing changed since the last write
+        await asyncio.gather(*(persistence.update_user_data(i, d) for i, d in users.items()))
+
+    asyncio.run(scenario())
+    assert len(persistence.writes) == 1
+    users, dropped, state = persistence.writes[0]
+    assert sorted(users) == [2, 3]
+    assert not dropped and not state
+
+
+def test_update_of_not_loaded_user_keeps_stored_data(persistence):
+    persistence.stored_users[1] = {"a": 1}
+
+    async def scenario():
+        data = {"b": 2}
+        await persistence.update_user_data(1, data)
+        return data
+
+    assert asyncio.run(scenario()) == {"a": 1, "b": 2}
+    users, _, _ = persistence.writes[0]
+    assert PickleSerializer().loads(users[1]) == {"a": 1, "b": 2}
+
+
+def test_failed_write_is_retried(persistence, mocker):
+    writes = persistence.writes
+    mocker.patch.object(persistence, "_write", side_effect=RuntimeError("db is down"))
+
+    async def scenario():
+        await persistence.refresh_user_data(1, {})
+        with pytest.raises(RuntimeError):
+            await persistence.update_user_data(1, {"a": 1})
+        persistence._write = lambda batch, state: writes.append(batch[0][1])
+        await persistence.flush()
+
+    asyncio.run(scenario())
+    assert list(writes[0]) == [1]
+
+
+def test_drop_user_data(persistence):
+    async def scenario():
+        await persistence.refresh_user_data(1, {})
+        await persistence.drop_user_data(1)
+
+    asyncio.run(scenario())
+    users, dropped, _ = persistence.writes[0]
+    assert users == {} and dropped == {1}
@@ -0,0 +1,22 @@
+from unittest.mock import MagicMock
+
+from databaseAPI import RepChessDB
+
+
+def make_cursor(results):
+    cur = MagicMock()
+    cur.fetchone.side_effect = results
+    return cur
+
+
+def test_released_id_is_reused_first():
+    # released 105, nobody has it
+    cur = make_cursor([{"public_id": 105}, None])
+    assert RepChessDB()._allocate_public_id(cur) == 105
+    assert not any("nextval" in call.args[0] for call in cur.execute.call_args_list)
+
+
+def test_sequence_skips_ids_taken_by_hand():
+    # nothing released; 200 was set by an admin, 201 is free
+    cur = make_cursor([None, {"public_id": 200}, {"?column?": 1}, None, {"public_id": 201}, None])
+    assert RepChessDB()._allocate_public_id(cur) == 201
@@ -0,0 +1,103 @@
+import asyncio
+import time
+
+import pytest
+from telegram.error import RetryAfter
+
+from rate_limiter import BULK, INTERACTIVE, PAYMENT, PriorityRateLimiter
+
+
+def run(scenario, **kwargs):
+    async def main():
+        limiter = PriorityRateLimiter(**kwargs)
+        await limiter.initialize()
+        try:
+            return await scenario(limiter)
+        finally:
+            await limiter.shutdown()
+    return asyncio.run(main())
+
+
+def send(limiter, sent: list, chat_id, name, priority=None):
+    async def callback():
+        sent.append(name)
+        return True
+    return limiter.process_request(callback, (), {}, "sendMessage", {"chat_id": chat_id}, priority)
+
+
+def test_interactive_goes_before_payment_and_bulk():
+    async def scenario(limiter):
+        sent = []
+        # the global bucket is empty, everything waits
+        limiter.global_bucket.tokens = 0
+        await asyncio.gather(
+            send(limiter, sent, 1, "bulk", BULK),
+            send(limiter, sent, 2, "payment", PAYMENT),
+            send(limiter, sent, 3, "reply", INTERACTIVE),
+        )
+        return sent
+
+    assert run(scenario, global_rate=20) == ["reply", "payment", "bulk"]
+
+
+def test_busy_chat_does_not_block_other_chats():
+    async def scenario(limiter):
+        sent = []
+        tasks = [asyncio.create_task(send(limiter, sent, 1, f"chat1-{i}")) for i in range(5)]
+        await asyncio.sleep(0.05)
+        # burst of 3 for chat 1, the rest waits for its bucket
+        assert sent == ["chat1-0", "chat1-1", "chat1-2"]
+        await send(limiter, sent, 2, "chat2")
+        assert sent[-1] == "chat2"
+        assert limiter.stats()["interactive"]["queued"] == 2
+        for task in tasks:
+            task.cancel()
+        return sent
+
+    run(scenario, private_chat_rate=0.1)
+
+
+def test_retry_after_pauses_and_repeats():
+    async def scenario(limiter):
+        calls = []
+
+        async def callback():
+            calls.append(time.monotonic())
+            if len(calls) == 1:
+                raise RetryAfter(0)
+            return "ok"
+
+        result = await limiter.process_request(callback, (), {}, "sendMessage", {"chat_id": 1}, None)
+        return result, calls, limiter.stats()
+
+    result, calls, stats = run(scenario)
+    assert result == "ok"
+    assert len(calls) == 2
+    assert stats["interactive"]["retry_after"] == 1
+    assert stats["interactive"]["sent"] == 2
+
+
+def test_retry_after_gives_up():
+    async def scenario(limiter):
+        async def callback():
+            raise RetryAfter(0)
+        await limiter.process_request(callback, (), {}, "sendMessage", {"chat_id": 1}, None)
+
+    with pytest.raises(RetryAfter):
+        run(scenario, max_retries=1)
+
+
+def test_not_message_requests_are_not_limited():
+    async def scenario(limiter):
+        limiter.global_bucket.tokens = 0
+        limiter.global_bucket.rate = 0.001
+
+        async def callback():
+            return True
+
+        await asyncio.wait_for(
+            limiter.process_request(callback, (), {}, "answerCallbackQuery", {"callback_query_id": "1"}, None),
+            1,
+        )
+
+    run(scenario)
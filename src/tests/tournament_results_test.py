@@ -0,0 +1,48 @@
+from tournament_results import build_tournament_results
+
+
+def row(place, nickname, rating, score, *tours):
+    data = {"#": str(place), "Имя": f" {nickname} ", "Новый рейтинг": str(rating), "Очки": score}
+    data.update({f"Тур #{n}": result for n, result in enumerate(tours, start=1)})
+    return data
+
+
+REGISTERED = {
+    "magnus": {"user_id": 1},
+    "hikaru": {"user_id": 2},
+    "alireza": {"user_id": 3},
+}
+
+
+def test_games_and_players_are_built_from_the_file():
+    results = (
+        row(1, "magnus", 1510, "2", "+W2", "+BYE3"),
+        row(2, "hikaru", 1490, "1", "-B1", "+W3"),
+        row(3, "alireza", 1500, "0,5", "", "=B2"),
+        row(4, "stranger", 1400, "0", "-", "-"),
+    )
+    games, players = build_tournament_results(results, REGISTERED)
+
+    assert games == [(1, 2, 1, 1), (1, 3, 2, 1), (2, 3, 2, 1)]
+    assert players == [
+        ("magnus", 1, 1510, 1, 2.0, 2),
+        ("hikaru", 2, 1490, 2, 1.0, 2),
+        ("alireza", 3, 1500, 3, 0.5, 1),
+    ]
+
+
+def test_repeated_player_gets_one_row():
+    results = (
+        row(1, "magnus", 1510, "1", "+W2"),
+        row(2, "hikaru", 1490, "0", "-B1"),
+        row(3, "magnus", 1520, "1,5", "="),
+    )
+    games, players = build_tournament_results(results, REGISTERED)
+
+    assert games == [(1, 2, 1, 1)]
+    # games add up, the last row's rating, place and score are kept
+    assert sorted(players) == [
+        ("hikaru", 2, 1490, 2, 0.0, 1),
+        ("magnus", 1, 1520, 3, 1.5, 2),
+    ]
+    assert len({user_id for _, user_id, *_ in players}) == len(players)
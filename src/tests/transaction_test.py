@@ -0,0 +1,68 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from databaseAPI import RepChessDB
+
+
+@pytest.fixture
+def db():
+    db = RepChessDB()
+    db.pool = MagicMock()
+    db.conn = db.pool.getconn.return_value
+    return db
+
+
+def test_transaction_commits_once(db):
+    with db.transaction():
+        db.set_user_subscription(1, True)
+        db.update_subscription_auto_renew(1, False)
+        db.update_subscription_next_charge(1, None)
+
+    db.pool.getconn.assert_called_once()
+    db.pool.putconn.assert_called_once_with(db.conn)
+    db.conn.commit.assert_called_once()
+    db.conn.rollback.assert_not_called()
+
+
+def test_transaction_rolls_back_everything(db):
+    with pytest.raises(RuntimeError):
+        with db.transaction():
+            db.set_user_subscription(1, True)
+            raise RuntimeError("payment failed")
+
+    db.conn.commit.assert_not_called()
+    db.conn.rollback.assert_called_once()
+    db.pool.putconn.assert_called_once_with(db.conn)
+
+
+def test_failed_operation_fails_transaction(db):
+    db.conn.cursor.return_value.__enter__.return_value.execute.side_effect = [None, RuntimeError("boom")]
+    with pytest.raises(RuntimeError):
+        with db.transaction():
+            db.set_user_subscription(1, True)
+            try:
+                db.update_subscription_auto_renew(1, False)
+            except RuntimeError:
+                pass
+
+    db.conn.commit.assert_not_called()
+    db.conn.rollback.assert_called_once()
+
+
+def test_nested_transaction_joins_outer(db):
+    with db.transaction():
+        with db.transaction():
+            db.set_user_subscription(1, True)
+        db.conn.commit.assert_not_called()
+
+    db.pool.getconn.assert_called_once()
+    db.conn.commit.assert_called_once()
+
+
+def test_cache_is_invalidated_after_commit(db):
+    db.user_cache.set(1, "row")
+    with db.transaction():
+        db._after_commit(db.user_cache.invalidate, 1)
+        assert db.user_cache.get(1) == "row"
+    assert db.user_cache.get(1) is None
@@ -0,0 +1,88 @@
+import asyncio
+import random
+
+from telegram import Bot, Update
+
+from update_processor import PerUserUpdateProcessor, update_key
+
+BOT = Bot("123:abc")
+
+
+def make_update(update_id: int, user_id: int) -> Update:
+    return Update.de_json({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 1700000000,
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Test"},
+            "text": str(update_id),
+        },
+    }, BOT)
+
+
+async def feed(processor, updates, handler):
+    # like Application: a task per update, created in the order of arrival
+    tasks = [asyncio.create_task(processor.process_update(update, handler(update))) for update in updates]
+    await asyncio.gather(*tasks)
+
+
+def test_updates_of_one_user_keep_order_and_others_run_in_parallel():
+    processor = PerUserUpdateProcessor(max_concurrent_updates=8)
+    handled = {}
+    running = {}
+    rnd = random.Random(1)
+
+    async def handler(update):
+        user_id = update.effective_user.id
+        assert not running.get(user_id), "two updates of one user at once"
+        running[user_id] = True
+        await asyncio.sleep(rnd.random() / 100)
+        handled.setdefault(user_id, []).append(update.update_id)
+        running[user_id] = False
+
+    updates = [make_update(i, user_id=i % 5) for i in range(50)]
+    asyncio.run(feed(processor, updates, handler))
+
+    for user_id, update_ids in handled.items():
+        assert update_ids == sorted(update_ids)
+    assert sum(len(ids) for ids in handled.values()) == 50
+    stats = processor.stats()
+    assert stats["max_running"] == 5
+    assert stats["pending"] == 0 and stats["users_waiting"] == 0
+
+
+def test_busy_user_does_not_take_all_slots():
+    processor = PerUserUpdateProcessor(max_concurrent_updates=2)
+    done = []
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def slow(update):
+            await release.wait()
+            done.append(update.update_id)
+
+        async def fast(update):
+            done.append(update.update_id)
+
+        busy = []
+        for i in range(10):
+            update = make_update(i, 1)
+            busy.append(asyncio.create_task(processor.process_update(update, slow(update))))
+        await asyncio.sleep(0)
+        # user 1 has 10 updates waiting, but only one of them holds a slot
+        update = make_update(100, 2)
+        await asyncio.wait_for(processor.process_update(update, fast(update)), 1)
+        assert done == [100]
+        assert processor.stats()["pending"] == 10
+        release.set()
+        await asyncio.gather(*busy)
+
+    asyncio.run(scenario())
+    assert done == [100] + list(range(10))
+
+
+def test_update_key():
+    assert update_key(make_update(1, 42)) == 42
+    assert update_key("not an update") is None
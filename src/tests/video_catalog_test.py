@@ -0,0 +1,62 @@
+from unittest.mock import MagicMock
+
+from video_catalog import VideoCatalog, build_snapshot
+
+
+def video_row(id, lesson_number, status="completed", file_id_480p="f480", file_id_1080p="f1080", category="Начинающий"):
+    return {
+        "id": id,
+        "category": category,
+        "lesson_number": lesson_number,
+        "title": f"Урок {id}",
+        "description": None,
+        "processing_status": status,
+        "file_id_480p": file_id_480p,
+        "file_id_1080p": file_id_1080p,
+    }
+
+
+def test_snapshot_has_only_completed_lessons():
+    snapshot = build_snapshot([
+        video_row(1, 0, file_id_480p="placeholder", file_id_1080p="placeholder"),
+        video_row(2, 1),
+        video_row(3, 2, status="processing", file_id_480p=None, file_id_1080p=None),
+        video_row(4, 3, file_id_1080p=None),
+    ])
+
+    assert [video.id for video in snapshot.category_lessons("Начинающий")] == [2, 4]
+    assert snapshot.category_lessons("Продвинутый") == ()
+    assert snapshot.videos[3].processing_status == "processing"
+    assert snapshot.file_id(2, "1080p") == "f1080"
+    assert snapshot.file_id(4, "1080p") is None
+    assert snapshot.file_id(3, "480p") is None
+    assert snapshot.file_id(1, "480p") is None
+
+
+def test_catalog_is_loaded_once_until_invalidated():
+    load_rows = MagicMock(return_value=[video_row(1, 1)])
+    catalog = VideoCatalog(load_rows)
+    assert catalog.current() is None
+
+    first = catalog.snapshot()
+    assert catalog.snapshot() is first
+    assert catalog.current() is first
+    load_rows.assert_called_once()
+
+    catalog.invalidate()
+    assert catalog.current() is None
+    assert catalog.snapshot() is not first
+    assert load_rows.call_count == 2
+
+
+def test_snapshot_loaded_before_invalidation_is_not_published():
+    catalog = VideoCatalog(None)
+
+    def load_rows():
+        # an admin changes videos while the snapshot is being built
+        catalog.invalidate()
+        return [video_row(1, 1)]
+
+    catalog._load_rows = load_rows
+    assert catalog.snapshot().videos[1].id == 1
+    assert catalog.current() is None
@@ -0,0 +1,198 @@
+"""
+The queue is tested with an in-memory stand-in of the videos table.
+The claim query needs a postgres: DATABASE_URL=... python -m pytest tests/video_jobs_test.py
+"""
+import asyncio
+import os
+import threading
+
+import psycopg2
+import pytest
+from psycopg2.extras import RealDictCursor
+from psycopg2.pool import ThreadedConnectionPool
+
+from databaseAPI import RepChessDB
+from video_jobs import VideoJobQueue, retry_delay
+
+SCHEMA = "video_jobs_test"
+DATABASE_URL = os.getenv("DATABASE_URL")
+
+needs_db = pytest.mark.skipif(not DATABASE_URL, reason="needs DATABASE_URL")
+
+
+class FakeVideos:
+    """Awaitable job methods of RepChessDB over a dict."""
+    def __init__(self, statuses):
+        self.videos = {
+            video_id: {"id": video_id, "processing_status": status, "attempts": 0, "last_error": None}
+            for video_id, status in statuses.items()
+        }
+        self.delays = []
+
+    async def requeue_interrupted_video_jobs(self):
+        for video in self.videos.values():
+            if video["processing_status"] == "processing":
+                video["processing_status"] = "pending"
+
+    async def claim_video_job(self):
+        for video in sorted(self.videos.values(), key=lambda v: v["id"]):
+            if video["processing_status"] == "pending":
+                video["processing_status"] = "processing"
+                video["attempts"] += 1
+                return dict(video)
+        return None
+
+    async def retry_video_job(self, video_id, error, delay_seconds):
+        self.delays.append(delay_seconds)
+        self.videos[video_id].update(processing_status="pending", last_error=error)
+
+    async def fail_video_job(self, video_id, error):
+        self.videos[video_id].update(processing_status="failed", last_error=error)
+
+
+async def wait_until(condition):
+    while not condition():
+        await asyncio.sleep(0.001)
+
+
+def test_workers_limit_concurrent_jobs_and_restart_picks_up_interrupted_ones():
+    db = FakeVideos({1: "processing", 2: "pending", 3: "pending", 4: "completed"})
+    running = set()
+    max_running = 0
+
+    async def handler(bot, video, last_attempt):
+        nonlocal max_running
+        running.add(video["id"])
+        max_running = max(max_running, len(running))
+        await asyncio.sleep(0.01)
+        running.discard(video["id"])
+        db.videos[video["id"]]["processing_status"] = "completed"
+        return True
+
+    async def scenario():
+        queue = VideoJobQueue(db, workers=2, poll_interval=10)
+        await queue.start(None, handler)
+        await asyncio.wait_for(
+            wait_until(lambda: all(v["processing_status"] == "completed" for v in db.videos.values())), 1
+        )
+        await queue.stop()
+
+    asyncio.run(scenario())
+    assert max_running == 2
+    assert db.videos[1]["attempts"] == 1
+
+
+def test_failed_job_is_retried_with_backoff_then_marked_failed():
+    db = FakeVideos({1: "pending"})
+    calls = []
+
+    async def handler(bot, video, last_attempt):
+        calls.append((video["attempts"], last_attempt))
+        if video["attempts"] == 2:
+            raise RuntimeError("ffmpeg died")
+        return False
+
+    async def scenario():
+        queue = VideoJobQueue(db, workers=1, max_attempts=3, retry_delay=5, poll_interval=10)
+        await queue.start(None, handler)
+        await asyncio.wait_for(wait_until(lambda: db.videos[1]["processing_status"] == "failed"), 1)
+        await queue.stop()
+
+    asyncio.run(scenario())
+    assert calls == [(1, False), (2, False), (3, True)]
+    assert db.delays == [5, 10]
+    assert db.videos[1]["last_error"] == "processing failed"
+
+
+def test_notify_wakes_idle_workers():
+    db = FakeVideos({})
+    done = []
+
+    async def handler(bot, video, last_attempt):
+        done.append(video["id"])
+        db.videos[video["id"]]["processing_status"] = "completed"
+        return True
+
+    async def scenario():
+        queue = VideoJobQueue(db, workers=1, poll_interval=60)
+        await queue.start(None, handler)
+        await asyncio.sleep(0.01)
+        db.videos[7] = {"id": 7, "processing_status": "pending", "attempts": 0}
+        queue.notify()
+        await asyncio.wait_for(wait_until(lambda: done), 1)
+        await queue.stop()
+
+    asyncio.run(scenario())
+    assert done == [7]
+
+
+def test_retry_delay_doubles():
+    assert [retry_delay(attempt, 60) for attempt in (1, 2, 3)] == [60, 120, 240]
+
+
+@pytest.fixture(scope="module")
+def db():
+    with psycopg2.connect(DATABASE_URL) as conn, conn.cursor() as cur:
+        cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE; CREATE SCHEMA {SCHEMA}")
+    db = RepChessDB()
+    db.pool = ThreadedConnectionPool(
+        1, 4, dsn=DATABASE_URL, cursor_factory=RealDictCursor, options=f"-c search_path={SCHEMA}"
+    )
+    db._create_tables()
+    db._migrate()
+    yield db
+    with db.get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+        conn.commit()
+    db.pool.closeall()
+    db.pool = None
+
+
+@needs_db
+def test_concurrent_claims_get_different_videos(db):
+    ids = [db.add_video(title=f"lesson {n}", category="jobs", lesson_number=n) for n in range(8)]
+    claimed = []
+    barrier = threading.Barrier(4)
+
+    def claim():
+        barrier.wait()
+        while (video := db.claim_video_job()) is not None:
+            claimed.append(video["id"])
+
+    threads = [threading.Thread(target=claim) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(claimed) == ids
+
+    db.retry_video_job(ids[0], "boom", 3600)
+    db.fail_video_job(ids[1], "boom")
+    assert db.requeue_interrupted_video_jobs() == len(ids) - 2
+    video = db.get_video_by_id(ids[0])
+    assert (video["processing_status"], video["attempts"], video["last_error"]) == ("pending", 1, "boom")
+    # not due yet
+    assert db.claim_video_job()["id"] == ids[2]
+
+
+def test_worker_cancelled_mid_job_leaves_video_processing():
+    db = FakeVideos({1: "pending"})
+
+    async def scenario():
+        started = asyncio.Event()
+
+        async def handler(bot, video, last_attempt):
+            started.set()
+            await asyncio.sleep(10)
+            return True
+
+        queue = VideoJobQueue(db, workers=1, max_attempts=1, poll_interval=10)
+        await queue.start(None, handler)
+        await asyncio.wait_for(started.wait(), 1)
+        await queue.stop()
+
+    asyncio.run(scenario())
+    # not failed although it was the last attempt, requeued at the next start
+    assert db.videos[1]["processing_status"] == "processing"
+    assert db.delays == []
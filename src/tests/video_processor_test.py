@@ -0,0 +1,200 @@
+import asyncio
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+from video_processor import (
+    AUDIO,
+    COPY,
+    ENCODE,
+    ENCODE_UNSCALED,
+    PROGRESS_UPDATE_INTERVAL,
+    RENDITION_SIZES,
+    RENDITIONS,
+    SKIP,
+    STDERR_TAIL_LINES,
+    VideoProcessor,
+    build_rendition_command,
+    build_single_pass_command,
+    parse_probe,
+    parse_progress_line,
+    plan_renditions,
+    run_ffmpeg,
+)
+
+
+def test_single_pass_command_decodes_once_and_writes_every_rendition():
+    cmd = build_single_pass_command("in.mp4", {"480p": "out_480.mp4", "1080p": "out_1080.mp4"})
+
+    assert cmd.count("-i") == 1
+    assert cmd[2:5] == ["-progress", "pipe:1", "-nostats"]
+    graph = cmd[cmd.index("-filter_complex") + 1]
+    assert graph == "[0:v]split=2[v0_in][v1_in];[v0_in]scale=854:480[v0];[v1_in]scale=1920:1080[v1]"
+    # each output gets its own stream map and the same options as the two-pass commands
+    first, second = cmd.index("out_480.mp4"), cmd.index("out_1080.mp4")
+    assert cmd[cmd.index("-map"):first] == ["-map", "[v0]", "-map", "0:a:0?", *RENDITIONS["480p"][1]]
+    assert cmd[first + 1:second] == ["-map", "[v1]", "-map", "0:a:0?", *RENDITIONS["1080p"][1]]
+
+
+def test_parse_progress_line():
+    assert parse_progress_line("out_time_us=12500000\n") == 12.5
+    assert parse_progress_line("out_time_ms=1000000") == 1.0
+    assert parse_progress_line("out_time_us=N/A") is None
+    assert parse_progress_line("frame=42") is None
+    assert parse_progress_line("progress=continue") is None
+
+
+# stands in for ffmpeg: progress blocks on stdout, a lot of log on stderr
+FAKE_FFMPEG = """
+import sys
+for i in range(5000):
+    print(f"log line {i}", file=sys.stderr)
+for seconds in (0, 5, 10):
+    print(f"frame={seconds * 25}\\nout_time_us={seconds * 1000000}\\nprogress=continue", flush=True)
+print("out_time_us=N/A\\nprogress=end")
+sys.exit(int(sys.argv[1]))
+"""
+
+
+def test_run_ffmpeg_streams_progress_and_keeps_only_stderr_tail():
+    fractions = []
+
+    async def on_progress(fraction):
+        fractions.append(fraction)
+
+    returncode, stderr = asyncio.run(run_ffmpeg([sys.executable, "-c", FAKE_FFMPEG, "3"], 20, on_progress))
+    assert returncode == 3
+    assert fractions == [0, 0.25, 0.5]
+    assert stderr.splitlines() == [f"log line {i}" for i in range(5000 - STDERR_TAIL_LINES, 5000)]
+
+
+def test_progress_inside_a_stage_is_throttled(tmp_path):
+    reports = []
+
+    async def progress_callback(percentage, message):
+        reports.append(percentage)
+
+    async def scenario():
+        processor = VideoProcessor(None, video_storage_dir=str(tmp_path), progress_callback=progress_callback)
+        await processor._update_progress(5, "stage")
+        on_progress = processor._stage_progress(5, 75, "converting")
+        for n in range(100):
+            await on_progress(n / 100)
+        processor._last_progress_at -= PROGRESS_UPDATE_INTERVAL
+        await on_progress(0.5)
+        await processor._update_progress(80, "next stage")
+
+    asyncio.run(scenario())
+    assert reports == [5, 40, 80]
+
+
+def probe(width, height, codec="h264", profile="High", level=40, bitrate=5_000_000, audio="aac", pix_fmt="yuv420p"):
+    return {
+        "duration": 10.0, "width": width, "height": height, "video_codec": codec, "pix_fmt": pix_fmt,
+        "profile": profile, "level": level, "video_bitrate": bitrate, "audio_codec": audio,
+    }
+
+
+@pytest.mark.parametrize("source, plan", [
+    # already a good 1080p: remux it, encode only the 480p
+    (probe(1920, 1080), {"480p": ENCODE, "1080p": COPY}),
+    (probe(1920, 1080, audio=None), {"480p": ENCODE, "1080p": COPY}),
+    (probe(1920, 1080, audio="mp3"), {"480p": ENCODE, "1080p": AUDIO}),
+    (probe(1920, 1080, bitrate=20_000_000), {"480p": ENCODE, "1080p": ENCODE}),
+    (probe(1920, 1080, codec="hevc"), {"480p": ENCODE, "1080p": ENCODE}),
+    (probe(1920, 1080, pix_fmt="yuv444p"), {"480p": ENCODE, "1080p": ENCODE}),
+    # no upscales
+    (probe(1280, 720), {"480p": ENCODE, "1080p": ENCODE_UNSCALED}),
+    (probe(640, 360), {"480p": ENCODE_UNSCALED, "1080p": SKIP}),
+    (probe(854, 480, profile="Constrained Baseline", level=30, bitrate=1_000_000), {"480p": COPY, "1080p": SKIP}),
+    (probe(854, 480, profile="High", level=30, bitrate=1_000_000), {"480p": ENCODE, "1080p": SKIP}),
+    (probe(3840, 2160), {"480p": ENCODE, "1080p": ENCODE}),
+    # ffprobe failed
+    (None, {"480p": ENCODE, "1080p": ENCODE}),
+])
+def test_plan_renditions(source, plan):
+    assert plan_renditions(source, ["1080p", "480p"]) == plan
+
+
+def test_remux_commands_do_not_touch_the_video():
+    copy = build_rendition_command("in.mkv", "1080p", COPY, "out.mp4")
+    assert copy[copy.index("-c") + 1] == "copy" and "-vf" not in copy
+    audio = build_rendition_command("in.mkv", "1080p", AUDIO, "out.mp4")
+    assert audio[audio.index("-c:v") + 1] == "copy" and audio[audio.index("-c:a") + 1] == "aac"
+    unscaled = build_rendition_command("in.mkv", "480p", ENCODE_UNSCALED, "out.mp4")
+    assert unscaled[unscaled.index("-vf") + 1] == "scale=trunc(iw/2)*2:trunc(ih/2)*2"
+
+
+# corpus of short generated clips, probed by the real ffprobe
+CORPUS = {
+    "h264_aac_1080p": (
+        ["-f", "lavfi", "-i", "testsrc2=size=1920x1080:rate=25:duration=1", "-f", "lavfi", "-i", "sine=duration=1",
+         "-c:v", "libx264", "-preset", "ultrafast", "-b:v", "4M", "-pix_fmt", "yuv420p", "-c:a", "aac", "-shortest", "clip.mp4"],
+        {"480p": ENCODE, "1080p": COPY},
+    ),
+    "h264_mp3_1080p": (
+        ["-f", "lavfi", "-i", "testsrc2=size=1920x1080:rate=25:duration=1", "-f", "lavfi", "-i", "sine=duration=1",
+         "-c:v", "libx264", "-preset", "ultrafast", "-b:v", "4M", "-pix_fmt", "yuv420p", "-c:a", "libmp3lame", "-shortest", "clip.mkv"],
+        {"480p": ENCODE, "1080p": AUDIO},
+    ),
+    "mpeg4_1080p": (
+        ["-f", "lavfi", "-i", "testsrc2=size=1920x1080:rate=25:duration=1", "-c:v", "mpeg4", "clip.mp4"],
+        {"480p": ENCODE, "1080p": ENCODE},
+    ),
+    "h264_720p": (
+        ["-f", "lavfi", "-i", "testsrc2=size=1280x720:rate=25:duration=1",
+         "-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p", "clip.mp4"],
+        {"480p": ENCODE, "1080p": ENCODE_UNSCALED},
+    ),
+    "h264_360p": (
+        ["-f", "lavfi", "-i", "testsrc2=size=640x360:rate=25:duration=1",
+         "-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p", "clip.mp4"],
+        {"480p": ENCODE_UNSCALED, "1080p": SKIP},
+    ),
+    "h264_baseline_480p": (
+        ["-f", "lavfi", "-i", "testsrc2=size=854x480:rate=25:duration=1", "-f", "lavfi", "-i", "sine=duration=1",
+         "-c:v", "libx264", "-profile:v", "baseline", "-level", "3.0", "-b:v", "800k", "-pix_fmt", "yuv420p",
+         "-c:a", "aac", "-shortest", "clip.mp4"],
+        {"480p": COPY, "1080p": SKIP},
+    ),
+}
+
+
+@pytest.mark.skipif(not shutil.which("ffmpeg"), reason="needs ffmpeg")
+@pytest.mark.parametrize("name", CORPUS)
+def test_plan_of_generated_clips(name, tmp_path):
+    args, plan = CORPUS[name]
+    clip = tmp_path / args[-1]
+    subprocess.run(["ffmpeg", "-y", "-v", "error", *args[:-1], str(clip)], check=True)
+
+    processor = VideoProcessor(None, video_storage_dir=str(tmp_path))
+    source = asyncio.run(processor._probe_source(str(clip)))
+    assert plan_renditions(source, ["480p", "1080p"]) == plan
+
+    # the planned renditions are produced and have the sizes of the plan
+    paths = asyncio.run(processor._convert_planned(clip, tmp_path, 1, plan, source["duration"]))
+    for quality, action in plan.items():
+        output = asyncio.run(processor._probe_source(paths[quality]))
+        if action in (ENCODE, COPY, AUDIO):
+            assert (output["width"], output["height"]) == RENDITION_SIZES[quality]
+        if action == ENCODE_UNSCALED:
+            assert (output["width"], output["height"]) == (source["width"], source["height"])
+        if action in (COPY, AUDIO):
+            assert output["video_codec"] == "h264" and output["audio_codec"] in (None, "aac")
+
+
+def test_parse_probe_takes_container_bitrate_when_stream_has_none():
+    source = parse_probe({
+        "streams": [
+            {"codec_type": "video", "codec_name": "h264", "width": 1920, "height": 1080,
+             "pix_fmt": "yuv420p", "profile": "High", "level": 40},
+            {"codec_type": "audio", "codec_name": "opus"},
+        ],
+        "format": {"duration": "12.5", "bit_rate": "4000000"},
+    })
+    assert source["duration"] == 12.5
+    assert source["video_bitrate"] == 4_000_000
+    assert source["audio_codec"] == "opus"
+    assert parse_probe({})["height"] == 0
@@ -0,0 +1,99 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+from telegram import Bot, Update
+
+from webhook import WebhookReceiver
+
+SECRET = "test-secret"
+
+
+def make_update(update_id: int) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 1700000000,
+            "chat": {"id": 1, "type": "private"},
+            "from": {"id": 1, "is_bot": False, "first_name": "Test"},
+            "text": "/start",
+        },
+    }
+
+
+async def run_fake_bot_api(scenario, max_queue: int = 100):
+    """Starts the receiver on a free port and lets `scenario` POST to it like the Bot API server."""
+    application = SimpleNamespace(update_queue=asyncio.Queue(), bot=Bot("123:abc"))
+    receiver = WebhookReceiver(application, SECRET, max_queue=max_queue)
+    port = receiver.listen(0, "127.0.0.1")
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}") as client:
+            await scenario(client, application, receiver)
+    finally:
+        await receiver.stop()
+
+
+def post(client, update_id: int, secret: str = SECRET):
+    return client.post(
+        "/telegram-webhook",
+        json=make_update(update_id),
+        headers={"X-Telegram-Bot-Api-Secret-Token": secret},
+    )
+
+
+def test_updates_are_put_into_queue():
+    async def scenario(client, application, receiver):
+        for update_id in range(1, 4):
+            response = await post(client, update_id)
+            assert response.status_code == 200
+        updates = [application.update_queue.get_nowait() for _ in range(3)]
+        assert all(isinstance(update, Update) for update in updates)
+        assert [update.update_id for update in updates] == [1, 2, 3]
+        assert updates[0].message.text == "/start"
+
+    asyncio.run(run_fake_bot_api(scenario))
+
+
+def test_wrong_secret_is_rejected():
+    async def scenario(client, application, receiver):
+        assert (await post(client, 1, secret="wrong")).status_code == 403
+        response = await client.post("/telegram-webhook", json=make_update(2))
+        assert response.status_code == 403
+        assert application.update_queue.empty()
+        assert receiver.stats.rejected_secret == 2
+
+    asyncio.run(run_fake_bot_api(scenario))
+
+
+def test_full_queue_asks_to_retry():
+    async def scenario(client, application, receiver):
+        assert (await post(client, 1)).status_code == 200
+        assert (await post(client, 2)).status_code == 200
+        response = await post(client, 3)
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+
+        health = (await client.get("/healthz")).json()
+        assert health["pending_updates"] == 2
+        assert health["accepted"] == 2
+        assert health["rejected_busy"] == 1
+
+        # the bot caught up, the Bot API server retries
+        application.update_queue.get_nowait()
+        assert (await post(client, 3)).status_code == 200
+
+    asyncio.run(run_fake_bot_api(scenario, max_queue=2))
+
+
+def test_bad_update_is_rejected():
+    async def scenario(client, application, receiver):
+        response = await client.post(
+            "/telegram-webhook",
+            content=b"not json",
+            headers={"X-Telegram-Bot-Api-Secret-Token": SECRET},
+        )
+        assert response.status_code == 400
+        assert application.update_queue.empty()
+
+    asyncio.run(run_fake_bot_api(scenario))
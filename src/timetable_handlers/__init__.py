@@ -4,4 +4,5 @@ from .timetable_handlers import (
     process_edited_post,
     process_forwarded_post,
 )
+from .timetable_cache import timetable_cache
 
@@ -0,0 +1,47 @@
+import datetime
+import os
+from typing import NamedTuple
+
+from telegram import InlineKeyboardMarkup
+
+from cache import LRUCache
+
+TIMETABLE_CACHE_TTL = float(os.getenv("TIMETABLE_CACHE_TTL", "3600"))
+
+
+class RenderedTimetable(NamedTuple):
+    date: datetime.date
+    caption: str
+    markup: InlineKeyboardMarkup
+    photo_id: str | None
+
+
+class TimetableCache:
+    """
+    Rendered timetable of a channel. It is the same for every user of the city
+    on a given day, so it is built once per (tg_channel, date).
+    Call invalidate(tg_channel) after any change of the channel's tournaments or weekly post.
+    """
+    def __init__(self, ttl: float | None = TIMETABLE_CACHE_TTL):
+        self._cache = LRUCache(maxsize=256, ttl=ttl)
+
+    def get(self, tg_channel: str, date: datetime.date) -> RenderedTimetable | None:
+        rendered = self._cache.get(tg_channel)
+        if rendered is None or rendered.date != date:
+            return None
+        return rendered
+
+    def version(self) -> int:
+        return self._cache.version()
+
+    def set(self, tg_channel: str, rendered: RenderedTimetable, version: int | None = None) -> bool:
+        return self._cache.set(tg_channel, rendered, version=version)
+
+    def invalidate(self, tg_channel: str) -> None:
+        self._cache.invalidate(tg_channel)
+
+    def stats(self) -> dict:
+        return self._cache.stats()
+
+
+timetable_cache = TimetableCache()
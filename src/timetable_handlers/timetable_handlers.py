@@ -5,9 +5,10 @@ import logging
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, error
 from telegram.ext import ContextTypes, MessageHandler, filters, CallbackQueryHandler
 
-from databaseAPI import rep_chess_db
+from databaseAPI import rep_chess_db, async_rep_chess_db
 from start import main_menu_reply_keyboard
 from util import escape_special_symbols, construct_timetable_buttons
+from .timetable_cache import timetable_cache, RenderedTimetable
 
 
 logger = logging.getLogger(__name__)
@@ -48,6 +49,7 @@ def parse_tournament_post(post: str, update: Update) -> dict | None:
                 logger.warning(f"Could not extract photo from post: {e}")
         
         rep_chess_db.update_weakly_info(channel, message_id, photo_id)
+        timetable_cache.invalidate(channel)
         return dict()
 
     re_match = re.search(r"\n\d+.\d+.?\n\d+:\d+.?\nАдрес:.*$", post)
@@ -100,6 +102,7 @@ async def process_forwarded_post(update: Update, context: ContextTypes.DEFAULT_T
         tournament["message_id"] = update.message.forward_from_message_id
 
     rep_chess_db.add_tournament(**tournament)
+    timetable_cache.invalidate(tournament["tg_channel"])
 
     context.user_data["forwarded_state"] = None
     await context.bot.send_message(update.effective_chat.id, "Запрос обработан. Проверьте, что все успешно.", reply_markup=main_menu_reply_keyboard(context))
@@ -126,6 +129,7 @@ async def process_new_post(update: Update, context: ContextTypes.DEFAULT_TYPE):
     tournament["tg_channel"] = update.channel_post.chat.username
     tournament["message_id"] = update.channel_post.message_id
     rep_chess_db.add_tournament(**tournament)
+    timetable_cache.invalidate(tournament["tg_channel"])
 
 
 async def process_edited_post(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -145,6 +149,7 @@ async def process_edited_post(update: Update, context: ContextTypes.DEFAULT_TYPE
     tournament["tg_channel"] = update.edited_channel_post.chat.username
     tournament["message_id"] = update.edited_channel_post.message_id
     rep_chess_db.update_tournament(**tournament)
+    timetable_cache.invalidate(tournament["tg_channel"])
 
 
 async def tournament_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -168,50 +173,64 @@ async def callback_main_message_handler(update: Update, context: ContextTypes.DE
     await main_message_handler(update, context)
 
 
+async def get_rendered_timetable(tg_channel: str) -> RenderedTimetable:
+    today = datetime.date.today()
+    rendered = timetable_cache.get(tg_channel, today)
+    if rendered:
+        return rendered
+
+    version = timetable_cache.version()
+    tournaments = await async_rep_chess_db.get_tournaments(tg_channel, datetime.datetime(today.year, today.month, today.day, 0, 0, 0))
+    message, inline_markup_buttons = construct_timetable_buttons(tournaments, "timetable_tournament")
+    message = "🌟  *_Анонсы_*\n" + message
+    inline_markup_buttons.append([InlineKeyboardButton("<< Назад", callback_data="go_main_menu")])
+    photo_file_id = await async_rep_chess_db.get_photo_id(tg_channel)
+
+    rendered = RenderedTimetable(today, message, InlineKeyboardMarkup(inline_markup_buttons), photo_file_id)
+    timetable_cache.set(tg_channel, rendered, version=version)
+    return rendered
+
+
 async def main_message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.message:
         telegram_id = update.message.from_user.id
     else:
         telegram_id = update.callback_query.from_user.id
-    rep_chess_db.update_user_last_contact(telegram_id)
+    await async_rep_chess_db.update_user_last_contact(telegram_id)
 
-    today = datetime.date.today()
-    tg_channel = rep_chess_db.get_tg_channel_on_tg_id(telegram_id)
+    tg_channel = await async_rep_chess_db.get_tg_channel_on_tg_id(telegram_id)
     if not tg_channel:
         logger.error(f"CITIES ARE INCONSISTENT. User with telegram id = {telegram_id} has incorrect city id")
         return
-    tournaments = rep_chess_db.get_tournaments(tg_channel, datetime.datetime(today.year, today.month, today.day, 0, 0, 0))
-    message, inline_markup_buttons = construct_timetable_buttons(tournaments, "timetable_tournament")
-    message = "🌟  *_Анонсы_*\n" + message
-    inline_markup_buttons.append([InlineKeyboardButton("<< Назад", callback_data="go_main_menu")])
-    context.user_data["timetable_buttons"] = inline_markup_buttons
+    rendered = await get_rendered_timetable(tg_channel)
+    context.user_data["timetable_buttons"] = [list(row) for row in rendered.markup.inline_keyboard]
 
-    photo_file_id = rep_chess_db.get_photo_id(tg_channel)
-    if photo_file_id:
+    if rendered.photo_id:
         try:
             await context.bot.send_photo(
                 update.effective_chat.id,
-                photo_file_id,
-                caption=message,
-                reply_markup=InlineKeyboardMarkup(inline_markup_buttons),
+                rendered.photo_id,
+                caption=rendered.caption,
+                reply_markup=rendered.markup,
                 parse_mode="MarkdownV2"
             )
         except error.BadRequest as e:
             # Photo file ID is invalid or expired, fall back to text message
             logger.warning(f"Invalid photo file ID for channel {tg_channel}: {e}")
             # Clear invalid photo from database
-            rep_chess_db.update_weakly_info(tg_channel, None, None)
+            await async_rep_chess_db.update_weakly_info(tg_channel, None, None)
+            timetable_cache.invalidate(tg_channel)
             await context.bot.send_message(
                 update.effective_chat.id,
-                message,
-                reply_markup=InlineKeyboardMarkup(inline_markup_buttons),
+                rendered.caption,
+                reply_markup=rendered.markup,
                 parse_mode="MarkdownV2"
             )
     else:
         await context.bot.send_message(
             update.effective_chat.id,
-            message,
-            reply_markup=InlineKeyboardMarkup(inline_markup_buttons),
+            rendered.caption,
+            reply_markup=rendered.markup,
             parse_mode="MarkdownV2"
         )
 
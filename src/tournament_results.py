@@ -0,0 +1,61 @@
+"""
+Parsing of the tournament results file (see admin_handlers/upload_results.py).
+"""
+
+result_mapping = {
+    "+": 1,
+    "=": 0.5,
+    "-": 0,
+}
+
+
+def build_tournament_results(results: tuple[dict], registered: dict[str, dict]) -> tuple[list[tuple], list[tuple]]:
+    """
+    Turn rows of the results file into rows for RepChessDB.ingest_tournament_results.
+    `registered` maps nickname to user_on_tournament row. Every player gets one row.
+    """
+    number_of_tours = int(max(tour for tour in results[0].keys() if tour.startswith("Тур #")).split("#")[1])
+    games = []
+    # user_id -> row
+    players = {}
+    for row in results:
+        nickname = row["Имя"].strip()
+        user_in_tournament = registered.get(nickname)
+        # Unknown user in tournament, just ignore him.
+        if not user_in_tournament:
+            continue
+        user_id = user_in_tournament["user_id"]
+        games_played = 0
+
+        for tour_number in range(1, number_of_tours + 1):
+            str_res = row[f"Тур #{tour_number}"].strip()
+            if not str_res:
+                continue
+            games_played += 1
+            float_res = result_mapping[str_res[0]]
+            if "W" in str_res:
+                black_user_in_tournament = registered.get(results[int(str_res.split("W")[1]) - 1]["Имя"].strip())
+                if not black_user_in_tournament:
+                    continue
+                games.append((user_id, black_user_in_tournament["user_id"], tour_number, float_res))
+            if str_res.startswith("+BYE"):
+                black_user_in_tournament = registered.get(results[int(str_res.split("E")[1]) - 1]["Имя"].strip())
+                if not black_user_in_tournament:
+                    continue
+                games.append((user_id, black_user_in_tournament["user_id"], tour_number, float_res))
+
+        # A player listed twice is applied as the rows one after another used to be:
+        # games add up, the last row's rating, place and score win.
+        # One row per player also matters for UPDATE ... FROM (VALUES ...),
+        # which applies only one of several rows for a target row.
+        if user_id in players:
+            games_played += players.pop(user_id)[5]
+        players[user_id] = (
+            nickname,
+            user_id,
+            int(row["Новый рейтинг"].strip()),
+            int(row["#"].strip()),
+            float(row["Очки"].strip().replace(",", ".")),
+            games_played,
+        )
+    return games, list(players.values())
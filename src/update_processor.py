@@ -0,0 +1,96 @@
+"""
+Concurrent update processing which keeps every user's updates in order.
+
+Handlers keep a small state machine in user_data (text_state / file_state /
+forwarded_state, see main.global_message_handler), so two updates of one user
+must never run at the same time or out of order. Updates of different users
+are independent and run in parallel, up to REPCHESS_MAX_CONCURRENT_UPDATES.
+
+Application creates a task per update and calls process_update in the order
+updates arrive. asyncio.Lock wakes waiters in FIFO order, so each user's
+updates are handled in the order they came in. The concurrency slot is
+taken only after the user's lock. A user with a long queue waits on their own
+lock and leaves the slots to other users.
+"""
+import asyncio
+import logging
+import os
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+MAX_CONCURRENT_UPDATES = int(os.getenv("REPCHESS_MAX_CONCURRENT_UPDATES", "16"))
+# updates which may wait for their turn at once, the base class semaphore
+MAX_PENDING_UPDATES = 100000
+
+
+def update_key(update: object):
+    """Updates with the same key are processed one by one."""
+    if isinstance(update, Update):
+        if update.effective_user is not None:
+            return update.effective_user.id
+        if update.effective_chat is not None:
+            return update.effective_chat.id
+    return None
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    def __init__(self, max_concurrent_updates: int = MAX_CONCURRENT_UPDATES):
+        super().__init__(MAX_PENDING_UPDATES)
+        self.limit = max_concurrent_updates
+        self._slots = asyncio.BoundedSemaphore(max_concurrent_updates)
+        # key -> [lock, number of updates which hold or wait for it]
+        self._locks = {}
+        self.pending_updates = 0
+        self.running_updates = 0
+        self.max_running_updates = 0
+        self.processed = 0
+
+    async def do_process_update(self, update: object, coroutine) -> None:
+        key = update_key(update)
+        self.pending_updates += 1
+        try:
+            if key is None:
+                await self._run(coroutine)
+                return
+            entry = self._locks.get(key)
+            if entry is None:
+                entry = self._locks[key] = [asyncio.Lock(), 0]
+            entry[1] += 1
+            try:
+                async with entry[0]:
+                    await self._run(coroutine)
+            finally:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._locks[key]
+        finally:
+            self.pending_updates -= 1
+
+    async def _run(self, coroutine):
+        async with self._slots:
+            self.running_updates += 1
+            self.max_running_updates = max(self.max_running_updates, self.running_updates)
+            try:
+                await coroutine
+            finally:
+                self.running_updates -= 1
+                self.processed += 1
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "pending": self.pending_updates,
+            "running": self.running_updates,
+            "max_running": self.max_running_updates,
+            "users_waiting": len(self._locks),
+            "processed": self.processed,
+        }
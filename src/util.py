@@ -3,7 +3,8 @@ from zoneinfo import ZoneInfo
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 import datetime as dt
 from telegram.ext import ContextTypes
-from telegram.error import TelegramError
+
+from message_cleanup import schedule_cleanup, track_message
 
 # Symbols that should be used with "\" in telegram MarkdownV2 parse mode
 SPECIAL_SYMBOLS = [
@@ -62,7 +63,6 @@ def construct_timetable_buttons(tournaments: list[dict], callback_pattern: str)
     """
     result_str = ""
     result_markup = []
-    print(tournaments, "\n\n\n\n")
     for i, tournament in enumerate(tournaments, 1):
         if i % 5 == 1:
             result_markup.append([])
@@ -80,23 +80,14 @@ BACK_TO_MENU_KEYBOARD = InlineKeyboardMarkup([
 ])
 
 def _track_cleanup_message(context: ContextTypes.DEFAULT_TYPE, message_id: int) -> None:
-    context.user_data.setdefault("messages_to_delete", []).append(message_id)
+    track_message(context.user_data, message_id)
 
 async def _cleanup_tracked_messages(
     context: ContextTypes.DEFAULT_TYPE,
     chat_id: int,
 ) -> None:
-    message_ids = context.user_data.get("messages_to_delete") or []
-    if not message_ids:
-        return
-
-    remaining_ids = []
-    for message_id in message_ids[-50:]:
-        try:
-            await context.bot.delete_message(chat_id=chat_id, message_id=message_id)
-        except TelegramError:
-            remaining_ids.append(message_id)
-    context.user_data["messages_to_delete"] = remaining_ids
+    # batched and in background, the reply doesn't wait for it
+    schedule_cleanup(context, chat_id)
 
 async def _send_managed_message(
     context: ContextTypes.DEFAULT_TYPE,
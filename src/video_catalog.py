@@ -0,0 +1,101 @@
+import threading
+from types import MappingProxyType
+from typing import Callable, Mapping, NamedTuple
+
+QUALITIES = ("480p", "1080p")
+
+
+class VideoLesson(NamedTuple):
+    id: int
+    category: str
+    lesson_number: int | None
+    title: str
+    description: str | None
+    processing_status: str
+    # quality -> telegram file id, only qualities which are really uploaded
+    file_ids: Mapping[str, str]
+
+
+class CatalogSnapshot(NamedTuple):
+    # category -> completed lessons ordered by lesson number
+    lessons: Mapping[str, tuple[VideoLesson, ...]]
+    # all videos, also not processed yet
+    videos: Mapping[int, VideoLesson]
+
+    def category_lessons(self, category: str) -> tuple[VideoLesson, ...]:
+        return self.lessons.get(category, ())
+
+    def file_id(self, video_id: int, quality: str) -> str | None:
+        video = self.videos.get(video_id)
+        if video is None or video.processing_status != "completed":
+            return None
+        return video.file_ids.get(quality)
+
+
+def build_snapshot(rows: list[dict]) -> CatalogSnapshot:
+    """rows are `videos` table rows ordered by category and lesson_number."""
+    lessons = {}
+    videos = {}
+    for row in rows:
+        file_ids = {
+            quality: row[f"file_id_{quality}"]
+            for quality in QUALITIES
+            if row.get(f"file_id_{quality}") and row[f"file_id_{quality}"] != "placeholder"
+        }
+        video = VideoLesson(
+            row["id"],
+            row["category"],
+            row["lesson_number"],
+            row["title"],
+            row["description"],
+            row["processing_status"],
+            MappingProxyType(file_ids),
+        )
+        videos[video.id] = video
+        # lesson_number 0 is the placeholder row of an empty category
+        if video.processing_status == "completed" and video.lesson_number:
+            lessons.setdefault(video.category, []).append(video)
+    return CatalogSnapshot(
+        MappingProxyType({category: tuple(items) for category, items in lessons.items()}),
+        MappingProxyType(videos),
+    )
+
+
+class VideoCatalog:
+    """
+    Immutable snapshot of video lessons, so lesson taps don't query the db.
+    invalidate() is called after every change of `videos`; the next snapshot()
+    builds a new snapshot and swaps it in at once, readers never see a half-built one.
+    """
+    def __init__(self, load_rows: Callable[[], list[dict]]):
+        self._load_rows = load_rows
+        self._snapshot = None
+        self._version = 0
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+
+    def current(self) -> CatalogSnapshot | None:
+        """Snapshot if it is up to date, without touching the db."""
+        return self._snapshot
+
+    def snapshot(self) -> CatalogSnapshot:
+        snapshot = self._snapshot
+        if snapshot is not None:
+            return snapshot
+        # only one thread queries the db, others wait for its result
+        with self._rebuild_lock:
+            if self._snapshot is not None:
+                return self._snapshot
+            with self._lock:
+                version = self._version
+            snapshot = build_snapshot(self._load_rows())
+            with self._lock:
+                # don't publish it if videos were changed while we were loading them
+                if version == self._version:
+                    self._snapshot = snapshot
+            return snapshot
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._version += 1
+            self._snapshot = None
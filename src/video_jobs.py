@@ -0,0 +1,129 @@
+"""
+Video transcoding jobs, kept in the videos table.
+
+A video is a job while its processing_status is 'pending' (waiting, maybe
+for a retry at next_attempt_at) or 'processing' (a worker has it). Workers
+claim jobs with FOR UPDATE SKIP LOCKED (RepChessDB.claim_video_job), so one
+video is never processed twice, and at most VIDEO_WORKERS ffmpeg jobs run
+next to the bot. A failed attempt is retried after
+VIDEO_RETRY_DELAY * 2^(attempt - 1) seconds, after VIDEO_MAX_ATTEMPTS
+attempts the video is 'failed'.
+
+The bot runs as a single instance, so at startup every 'processing' video
+was interrupted by a restart and goes back to the queue.
+"""
+import asyncio
+import logging
+import os
+
+from databaseAPI import async_rep_chess_db
+
+logger = logging.getLogger(__name__)
+
+VIDEO_WORKERS = int(os.getenv("VIDEO_WORKERS", "1"))
+VIDEO_MAX_ATTEMPTS = int(os.getenv("VIDEO_MAX_ATTEMPTS", "3"))
+VIDEO_RETRY_DELAY = float(os.getenv("VIDEO_RETRY_DELAY", "60"))
+# due retries are noticed this often, new jobs wake the workers at once
+VIDEO_POLL_INTERVAL = float(os.getenv("VIDEO_POLL_INTERVAL", "30"))
+
+
+def retry_delay(attempt: int, base: float = VIDEO_RETRY_DELAY) -> float:
+    return base * 2 ** (attempt - 1)
+
+
+class VideoJobQueue:
+    """
+    handler(bot, video, last_attempt) processes one claimed video (a row of
+    the videos table) and returns True when it is done. False or an
+    exception means the attempt failed.
+    """
+    def __init__(
+        self,
+        db=async_rep_chess_db,
+        workers: int = VIDEO_WORKERS,
+        max_attempts: int = VIDEO_MAX_ATTEMPTS,
+        retry_delay: float = VIDEO_RETRY_DELAY,
+        poll_interval: float = VIDEO_POLL_INTERVAL,
+    ):
+        self.db = db
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.poll_interval = poll_interval
+        self.bot = None
+        self.handler = None
+        self._wakeup = asyncio.Event()
+        self._tasks = []
+        # worker number -> id of the video it is processing
+        self.running = {}
+
+    async def start(self, bot, handler) -> None:
+        self.bot = bot
+        self.handler = handler
+        await self.db.requeue_interrupted_video_jobs()
+        self._tasks = [asyncio.create_task(self._worker(n), name=f"video-worker-{n}") for n in range(self.workers)]
+        logger.info(f"Video job queue started ({self.workers} workers)")
+
+    async def stop(self) -> None:
+        """Cancel the workers. Interrupted videos stay 'processing' and are requeued at the next start."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self) -> None:
+        """A new job was committed, don't wait for the next poll."""
+        self._wakeup.set()
+
+    async def _worker(self, n: int) -> None:
+        while True:
+            # cleared before the claim: a job committed after it sets the event again
+            self._wakeup.clear()
+            try:
+                video = await self.db.claim_video_job()
+            except Exception as e:
+                logger.error(f"Claiming a video job failed: {e}")
+                video = None
+            if video is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self.running[n] = video["id"]
+            try:
+                await self._process(video)
+            finally:
+                del self.running[n]
+
+    async def _process(self, video: dict) -> None:
+        video_id = video["id"]
+        attempt = video["attempts"]
+        last_attempt = attempt >= self.max_attempts
+        error = "processing failed"
+        try:
+            if await self.handler(self.bot, video, last_attempt):
+                return
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Video job {video_id} failed: {e}", exc_info=True)
+            error = repr(e)
+
+        try:
+            if last_attempt:
+                logger.error(f"Video job {video_id} failed after {attempt} attempts")
+                await self.db.fail_video_job(video_id, error)
+            else:
+                delay = retry_delay(attempt, self.retry_delay)
+                logger.warning(f"Video job {video_id} attempt {attempt} failed, retry in {delay:.0f}s")
+                await self.db.retry_video_job(video_id, error, delay)
+        except Exception as e:
+            # the video stays 'processing' and is requeued at the next start
+            logger.error(f"Can't record the failure of video job {video_id}: {e}")
+
+    def stats(self) -> dict:
+        return {"workers": len(self._tasks), "running": dict(self.running)}
+
+
+video_jobs = VideoJobQueue()
@@ -5,15 +5,231 @@ import subprocess
 import logging
 import time
 import asyncio
+import json
 import shutil
+from collections import deque
 from typing import Tuple, Optional, Callable
 from telegram.error import TelegramError
 
+from media_ingest import ingest_telegram_file
+
 logger = logging.getLogger(__name__)
 
 VIDEO_DOWNLOAD_TIMEOUT = 300
 
 VIDEO_STORAGE_DIR = os.getenv("VIDEO_STORAGE_DIR") or "/app/data/media"
+# uploaded originals; on the Bot API server's mount they are hard-linked, not copied (see media_ingest)
+VIDEO_UPLOAD_DIR = os.getenv("VIDEO_UPLOAD_DIR") or VIDEO_STORAGE_DIR
+
+# "single": one ffmpeg run decodes the source once and encodes all renditions,
+# "two-pass": a separate ffmpeg run per rendition (the old way)
+VIDEO_TRANSCODE_MODE = os.getenv("VIDEO_TRANSCODE_MODE", "single")
+
+# ffmpeg writes key=value progress blocks to stdout, no stats lines to stderr
+FFMPEG_PROGRESS_ARGS = ["-progress", "pipe:1", "-nostats"]
+# ffmpeg's stderr is not kept, only its last lines for the log
+STDERR_TAIL_LINES = 50
+# progress message is edited not more often than this, seconds
+PROGRESS_UPDATE_INTERVAL = float(os.getenv("VIDEO_PROGRESS_INTERVAL", "3"))
+
+# quality -> (scale filter, encoder options of the output)
+RENDITIONS = {
+    "480p": ("scale=854:480", [
+        "-c:v", "libx264",
+        "-crf", "23",
+        "-preset", "medium",
+        "-profile:v", "baseline",
+        "-level", "3.0",
+        "-pix_fmt", "yuv420p",
+        "-c:a", "aac",
+        "-b:a", "128k",
+        "-movflags", "+faststart",
+        "-avoid_negative_ts", "make_zero",
+    ]),
+    "1080p": ("scale=1920:1080", [
+        "-c:v", "libx264",
+        "-crf", "20",
+        "-preset", "medium",
+        "-c:a", "aac",
+        "-b:a", "192k",
+    ]),
+}
+
+
+# output size of every rendition, from the smallest one
+RENDITION_SIZES = {
+    "480p": (854, 480),
+    "1080p": (1920, 1080),
+}
+
+# what a source must be to go into a rendition without re-encoding the video
+COPY_RULES = {
+    # 480p is for old phones: baseline profile, level <= 3.0 like the encoded one
+    "480p": {"max_bitrate": 2_000_000, "profiles": ("Baseline", "Constrained Baseline"), "max_level": 30},
+    "1080p": {"max_bitrate": 8_000_000},
+}
+
+# planned actions of a rendition
+COPY = "copy"                          # remux: video and audio as they are
+AUDIO = "audio"                        # video as it is, audio re-encoded to aac
+ENCODE = "encode"                      # full encode, scaled to the rendition size
+ENCODE_UNSCALED = "encode_unscaled"    # full encode at the source size: the source can't fill the rendition
+SKIP = "skip"                          # the smaller rendition already has the source size, it is used instead
+
+
+def parse_probe(data: dict) -> dict:
+    """The fields planning needs from `ffprobe -show_format -show_streams -print_format json`."""
+    video = next((stream for stream in data.get("streams", []) if stream.get("codec_type") == "video"), {})
+    audio = next((stream for stream in data.get("streams", []) if stream.get("codec_type") == "audio"), None)
+    format_info = data.get("format", {})
+
+    def number(value, cast=int):
+        try:
+            return cast(value)
+        except (TypeError, ValueError):
+            return 0
+
+    return {
+        "duration": number(format_info.get("duration"), float),
+        "width": number(video.get("width")),
+        "height": number(video.get("height")),
+        "video_codec": video.get("codec_name"),
+        "pix_fmt": video.get("pix_fmt"),
+        "profile": video.get("profile"),
+        "level": number(video.get("level")),
+        # mkv/webm streams have no bit_rate, the container's one is an upper bound
+        "video_bitrate": number(video.get("bit_rate")) or number(format_info.get("bit_rate")),
+        "audio_codec": audio.get("codec_name") if audio else None,
+    }
+
+
+def _video_copyable(quality: str, source: dict) -> bool:
+    rules = COPY_RULES[quality]
+    return (
+        source["video_codec"] == "h264"
+        and source["pix_fmt"] == "yuv420p"
+        and 0 < source["video_bitrate"] <= rules["max_bitrate"]
+        and ("profiles" not in rules or source["profile"] in rules["profiles"])
+        and ("max_level" not in rules or 0 < source["level"] <= rules["max_level"])
+    )
+
+
+def plan_renditions(source: Optional[dict], qualities: list[str]) -> dict[str, str]:
+    """
+    Action per quality (see COPY, AUDIO, ...) for a probed source.
+    Without probe results everything is encoded, like before planning existed.
+    """
+    qualities = sorted(qualities, key=lambda quality: RENDITION_SIZES[quality][1])
+    if not source or not source["height"]:
+        return {quality: ENCODE for quality in qualities}
+
+    plan = {}
+    # height of the biggest rendition planned so far
+    produced = 0
+    for quality in qualities:
+        width, height = RENDITION_SIZES[quality]
+        if source["height"] < height:
+            # no upscale, but a 720p source still gives a 720p "1080p" rather than the 480p file
+            plan[quality] = ENCODE_UNSCALED if source["height"] > produced else SKIP
+        elif (source["width"], source["height"]) == (width, height) and _video_copyable(quality, source):
+            plan[quality] = COPY if source["audio_codec"] in (None, "aac") else AUDIO
+        else:
+            plan[quality] = ENCODE
+        produced = min(source["height"], height)
+    return plan
+
+
+def _audio_bitrate(quality: str) -> str:
+    args = RENDITIONS[quality][1]
+    return args[args.index("-b:a") + 1]
+
+
+def encode_filter(quality: str, action: str) -> str:
+    if action == ENCODE_UNSCALED:
+        # source size, made even for yuv420p
+        return "scale=trunc(iw/2)*2:trunc(ih/2)*2"
+    return RENDITIONS[quality][0]
+
+
+def build_rendition_command(input_path: str, quality: str, action: str, output_path: str) -> list[str]:
+    """ffmpeg command for one rendition, action from plan_renditions (not SKIP)."""
+    cmd = ["ffmpeg", "-y", *FFMPEG_PROGRESS_ARGS, "-i", input_path]
+    if action == COPY:
+        return cmd + ["-map", "0:v:0", "-map", "0:a:0?", "-c", "copy", "-movflags", "+faststart", output_path]
+    if action == AUDIO:
+        return cmd + [
+            "-map", "0:v:0", "-map", "0:a:0?",
+            "-c:v", "copy", "-c:a", "aac", "-b:a", _audio_bitrate(quality),
+            "-movflags", "+faststart", output_path,
+        ]
+    return cmd + ["-vf", encode_filter(quality, action), *RENDITIONS[quality][1], output_path]
+
+
+def build_single_pass_command(input_path: str, outputs: dict[str, str], scales: dict[str, str] = None) -> list[str]:
+    """
+    One ffmpeg command for several renditions: the video is decoded once,
+    `split` gives a copy of the frames to every scale filter.
+    outputs: quality -> output path, scales: quality -> filter instead of the rendition's one.
+    """
+    labels = [f"v{i}" for i in range(len(outputs))]
+    filters = [f"[0:v]split={len(outputs)}" + "".join(f"[{label}_in]" for label in labels)]
+    cmd = ["ffmpeg", "-y", *FFMPEG_PROGRESS_ARGS, "-i", input_path]
+    output_args = []
+    for label, (quality, output_path) in zip(labels, outputs.items()):
+        scale, args = RENDITIONS[quality]
+        scale = (scales or {}).get(quality, scale)
+        filters.append(f"[{label}_in]{scale}[{label}]")
+        # "?" - sources without audio are fine
+        output_args += ["-map", f"[{label}]", "-map", "0:a:0?", *args, output_path]
+    return cmd + ["-filter_complex", ";".join(filters)] + output_args
+
+
+def parse_progress_line(line: str) -> Optional[float]:
+    """Seconds of the output encoded so far from a `-progress` line, None for other lines."""
+    key, _, value = line.strip().partition("=")
+    # out_time_ms is in microseconds as well, older ffmpeg has only it
+    if key not in ("out_time_us", "out_time_ms"):
+        return None
+    try:
+        return int(value) / 1_000_000
+    except ValueError:
+        # N/A before the first frame
+        return None
+
+
+async def run_ffmpeg(cmd: list[str], duration: float = 0, on_progress: Callable = None) -> Tuple[int, str]:
+    """
+    Run ffmpeg with FFMPEG_PROGRESS_ARGS, await on_progress(fraction done)
+    for every progress line when the duration is known.
+    Returns the exit code and the last STDERR_TAIL_LINES lines of stderr.
+    """
+    process = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    stderr_tail = deque(maxlen=STDERR_TAIL_LINES)
+
+    async def read_stderr():
+        async for line in process.stderr:
+            stderr_tail.append(line.decode("utf-8", errors="replace").rstrip())
+
+    async def read_progress():
+        async for line in process.stdout:
+            seconds = parse_progress_line(line.decode("utf-8", errors="replace"))
+            if seconds is not None and duration > 0 and on_progress:
+                await on_progress(min(seconds / duration, 1.0))
+
+    try:
+        await asyncio.gather(read_stderr(), read_progress())
+        returncode = await process.wait()
+    except BaseException:
+        # the bot is stopping or progress reporting broke, don't leave ffmpeg running
+        if process.returncode is None:
+            process.kill()
+        raise
+    return returncode, "\n".join(stderr_tail)
+
 
 class VideoProcessor:
     """Handles video processing and conversion using FFmpeg"""
@@ -22,6 +238,7 @@ class VideoProcessor:
         bot,
         video_storage_dir: str = None,
         progress_callback: Callable = None,
+        transcode_mode: str = None,
     ):
         self.bot = bot
         storage_dir = video_storage_dir or VIDEO_STORAGE_DIR
@@ -31,6 +248,9 @@ class VideoProcessor:
 
         self.media_dir = self.video_storage_dir 
         self.progress_callback = progress_callback
+        self.transcode_mode = transcode_mode or VIDEO_TRANSCODE_MODE
+        self._last_progress = None
+        self._last_progress_at = 0.0
 
     async def process_video(
         self, original_path: str, video_id: int, title: str, chat_id: str
@@ -63,18 +283,17 @@ class VideoProcessor:
         file_id_1080p = None
 
         try:
-            # 480p conversion
-            await self._update_progress(20, "🔄 Converting to 480p...")
-            path_480p = await self._convert_video(original_path, video_dir, "480p", video_id)
-            if not path_480p:
-                logger.error("❌ 480p conversion failed")
-                return None, None
-
-            # 1080p conversion
-            await self._update_progress(60, "🔄 Converting to 1080p...")
-            path_1080p = await self._convert_video(original_path, video_dir, "1080p", video_id)
-            if not path_1080p:
-                logger.error("❌ 1080p conversion failed")
+            source = await self._probe_source(str(original_path))
+            duration = source["duration"] if source else 0
+            if duration <= 0:
+                logger.warning(f"Could not determine video duration, no conversion progress for video {video_id}")
+            plan = plan_renditions(source, ["480p", "1080p"])
+            logger.info(f"📋 Plan for video {video_id}: {plan} (source: {source})")
+
+            paths = await self._convert_planned(original_path, video_dir, video_id, plan, duration)
+            path_480p, path_1080p = paths.get("480p"), paths.get("1080p")
+            if not path_480p or not path_1080p:
+                logger.error("❌ Conversion failed")
                 return None, None
 
             # UPLOAD 480p
@@ -84,9 +303,12 @@ class VideoProcessor:
                 logger.error("❌ 480p upload failed")
                 return None, None
 
-            # UPLOAD 1080p
-            await self._update_progress(90, "📤 Uploading 1080p...")
-            file_id_1080p = await self._upload_video(str(path_1080p), title, "1080p", chat_id)
+            # UPLOAD 1080p, unless it is the 480p file (small source)
+            if path_1080p == path_480p:
+                file_id_1080p = file_id_480p
+            else:
+                await self._update_progress(90, "📤 Uploading 1080p...")
+                file_id_1080p = await self._upload_video(str(path_1080p), title, "1080p", chat_id)
             if not file_id_1080p:
                 logger.error("❌ 1080p upload failed")
                 return None, None
@@ -98,10 +320,62 @@ class VideoProcessor:
             logger.exception(f"❌ Unexpected error processing video {video_id}: {e}")
             return None, None
 
+    async def _convert_planned(
+        self, original_path, video_dir, video_id: int, plan: dict[str, str], duration: float = 0
+    ) -> dict[str, str]:
+        """
+        Produce the renditions of `plan` (see plan_renditions), returns quality -> path,
+        {} if something failed. Remuxes come first, they take seconds. Encodes
+        share one ffmpeg run in the "single" mode.
+        """
+        paths = {}
+        for quality, action in plan.items():
+            if action in (COPY, AUDIO):
+                await self._update_progress(5, f"🔄 Preparing {quality}...")
+                paths[quality] = await self._convert_video(original_path, video_dir, quality, video_id, duration, action=action)
+                if not paths[quality]:
+                    return {}
+
+        encodes = [quality for quality, action in plan.items() if action in (ENCODE, ENCODE_UNSCALED)]
+        if len(encodes) > 1 and self.transcode_mode != "two-pass":
+            message = f"🔄 Converting to {' and '.join(encodes)}..."
+            await self._update_progress(5, message)
+            encoded = await self._transcode_renditions(
+                original_path, video_dir, encodes, video_id, duration,
+                on_progress=self._stage_progress(5, 75, message),
+                scales={quality: encode_filter(quality, plan[quality]) for quality in encodes},
+            )
+            if not encoded:
+                return {}
+            paths.update(encoded)
+        else:
+            # every encode gets an equal part of 5..75%
+            step = 70 // max(len(encodes), 1)
+            for n, quality in enumerate(encodes):
+                message = f"🔄 Converting to {quality}..."
+                await self._update_progress(5 + n * step, message)
+                paths[quality] = await self._convert_video(
+                    original_path, video_dir, quality, video_id, duration,
+                    on_progress=self._stage_progress(5 + n * step, 5 + (n + 1) * step, message),
+                    action=plan[quality],
+                )
+                if not paths[quality]:
+                    logger.error(f"❌ {quality} conversion failed")
+                    return {}
+
+        # plan is ordered from the smallest rendition, a skipped one takes the previous file
+        previous = None
+        for quality, action in plan.items():
+            if action == SKIP:
+                logger.info(f"⏭️ {quality} would be the same as {previous}, using it")
+                paths[quality] = paths[previous]
+            previous = quality
+        return paths
+
     async def _download_video(self, file_id: str, target_dir: Path) -> Optional[Path]:
         """
         Download video and place it in `target_dir`.
-        In local mode, this is fast (no HTTP). Always copies to persistent dir.
+        In local mode the Bot API server's file is linked there, nothing is copied.
         """
         try:
             file = await self.bot.get_file(file_id)
@@ -109,22 +383,9 @@ class VideoProcessor:
                 logger.error("❌ file.file_path is None — check local_mode or Bot API server")
                 return None
 
-            temp_path = Path(await file.download_to_drive())
-
-            logger.info(f"📥 Got file at: {temp_path} (size: {temp_path.stat().st_size} B)")
-
-            orig_name = temp_path.name or "video.mp4"
+            orig_name = Path(file.file_path).name or "video.mp4"
             safe_name = re.sub(r"[^a-zA-Z0-9._-]", "_", f"{file_id}_{orig_name}")[:128]
-            dest_path = target_dir / safe_name
-
-            shutil.copy2(temp_path, dest_path)
-            logger.info(f"💾 Copied to: {dest_path}")
-
-            try:
-                if temp_path != dest_path and temp_path.exists():
-                    temp_path.unlink()
-            except Exception as e:
-                logger.warning(f"Could not remove temp file {temp_path}: {e}")
+            dest_path = await ingest_telegram_file(file, target_dir / safe_name)
 
             if not dest_path.exists() or dest_path.stat().st_size == 0:
                 raise ValueError("Downloaded file is missing or empty")
@@ -138,13 +399,31 @@ class VideoProcessor:
             logger.exception(f"Failed to download video {file_id}")
             return None
 
-    async def _update_progress(self, percentage: int, message: str):
+    async def _update_progress(self, percentage: int, message: str, force: bool = True):
+        """
+        Stage changes are always reported (force). Progress inside a stage is
+        reported when the percentage changed, at most every PROGRESS_UPDATE_INTERVAL
+        seconds: each report edits the admin's message.
+        """
+        now = time.monotonic()
+        if not force and (
+            percentage == self._last_progress or now - self._last_progress_at < PROGRESS_UPDATE_INTERVAL
+        ):
+            return
+        self._last_progress = percentage
+        self._last_progress_at = now
         if self.progress_callback:
             await self.progress_callback(percentage, message)
         else:
             bar = self._create_progress_bar(percentage)
             logger.info(f"{bar} {message}")
 
+    def _stage_progress(self, start: int, end: int, message: str) -> Callable:
+        """on_progress for run_ffmpeg: maps the fraction done to start..end percent."""
+        async def on_progress(fraction: float):
+            await self._update_progress(start + int((end - start) * fraction), f"{message} {int(fraction * 100)}%", force=False)
+        return on_progress
+
     def _create_progress_bar(self, percentage: int, width: int = 20) -> str:
         filled = int(width * percentage / 100)
         bar = "█" * filled + "░" * (width - filled)
@@ -244,7 +523,10 @@ class VideoProcessor:
 
 # ffmpeg helpers
 
-    async def _convert_video(self, input_path: str, temp_dir: str, quality: str, video_id: int) -> Optional[str]:
+    async def _convert_video(
+        self, input_path: str, temp_dir: str, quality: str, video_id: int,
+        duration: float = None, on_progress: Callable = None, action: str = ENCODE,
+    ) -> Optional[str]:
         try:
             # Ensure input is string
             input_path = str(input_path)
@@ -254,57 +536,20 @@ class VideoProcessor:
 
             output_path = os.path.join(temp_dir, f"{quality}_{video_id}.mp4")
 
-            # Get duration
-            duration = await self._get_video_duration(input_path)
-            if duration <= 0:
-                logger.warning(f"Could not determine video duration for {quality} conversion")
-                duration = 60
-
-            # Build command with STRINGS only
-            if quality == "480p":
-                cmd = [
-                        "ffmpeg", "-y", "-i", input_path,
-                        "-vf", "scale=854:480",
-                        "-c:v", "libx264",
-                        "-crf", "23",
-                        "-preset", "medium",
-                        "-profile:v", "baseline",
-                        "-level", "3.0",
-                        "-pix_fmt", "yuv420p",
-                        "-c:a", "aac",
-                        "-b:a", "128k",
-                        "-movflags", "+faststart",
-                        "-avoid_negative_ts", "make_zero",
-                        output_path
-                    ]
-            elif quality == "1080p":
-                cmd = [
-                    "ffmpeg", "-y", "-i", input_path,
-                    "-vf", "scale=1920:1080",
-                    "-c:v", "libx264",
-                    "-crf", "20",
-                    "-preset", "medium",
-                    "-c:a", "aac",
-                    "-b:a", "192k",
-                    output_path
-                ]
-            else:
+            if duration is None:
+                duration = await self._get_video_duration(input_path)
+
+            if quality not in RENDITIONS:
                 logger.error(f"Unsupported quality: {quality}")
                 return None
+            cmd = build_rendition_command(input_path, quality, action, output_path)
 
-            logger.info(f"▶️ Starting FFmpeg for {quality}: {' '.join(cmd)}")
-
-            process = await asyncio.create_subprocess_exec(
-                *cmd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-
-            stdout, stderr = await process.communicate()
+            logger.info(f"▶️ Starting FFmpeg for {quality} ({action}): {' '.join(cmd)}")
+            returncode, stderr = await run_ffmpeg(cmd, duration, on_progress)
 
-            if process.returncode != 0:
-                logger.error(f"💥 FFmpeg failed for {quality} (exit {process.returncode})")
-                logger.error(f"STDERR:\n{stderr.decode('utf-8', errors='replace')}")
+            if returncode != 0:
+                logger.error(f"💥 FFmpeg failed for {quality} (exit {returncode})")
+                logger.error(f"STDERR:\n{stderr}")
                 return None
 
             if not os.path.exists(output_path):
@@ -319,6 +564,42 @@ class VideoProcessor:
             logger.exception(f"🔥 Exception during {quality} conversion: {e}")
             return None
 
+    async def _transcode_renditions(
+        self, input_path, temp_dir, qualities: list[str], video_id: int,
+        duration: float = 0, on_progress: Callable = None, scales: dict[str, str] = None,
+    ) -> dict[str, str]:
+        """
+        Encode all `qualities` with one ffmpeg run, the source is decoded once.
+        Returns quality -> output path, {} if ffmpeg failed.
+        """
+        try:
+            input_path = str(input_path)
+            if not os.path.exists(input_path) or os.path.getsize(input_path) == 0:
+                logger.error(f"Input file missing or empty: {input_path}")
+                return {}
+
+            outputs = {quality: os.path.join(temp_dir, f"{quality}_{video_id}.mp4") for quality in qualities}
+            cmd = build_single_pass_command(input_path, outputs, scales)
+            logger.info(f"▶️ Starting FFmpeg for {', '.join(qualities)}: {' '.join(cmd)}")
+            returncode, stderr = await run_ffmpeg(cmd, duration, on_progress)
+
+            if returncode != 0:
+                logger.error(f"💥 FFmpeg failed for {', '.join(qualities)} (exit {returncode})")
+                logger.error(f"STDERR:\n{stderr}")
+                return {}
+
+            for quality, output_path in outputs.items():
+                if not os.path.exists(output_path):
+                    logger.error(f"⚠️ Output file not found: {output_path}")
+                    return {}
+                size_mb = os.path.getsize(output_path) / (1024 * 1024)
+                logger.info(f"✅ {quality} conversion succeeded ({size_mb:.2f} MB)")
+            return outputs
+
+        except Exception as e:
+            logger.exception(f"🔥 Exception during {', '.join(qualities)} conversion: {e}")
+            return {}
+
     def _check_ffmpeg_available(self) -> bool:
         """Check if FFmpeg is available on the system"""
         try:
@@ -327,6 +608,22 @@ class VideoProcessor:
         except FileNotFoundError:
             return False
     
+    async def _probe_source(self, file_path: str) -> Optional[dict]:
+        """parse_probe of the file, None if ffprobe failed"""
+        try:
+            process = await asyncio.create_subprocess_exec(
+                "ffprobe", "-v", "quiet", "-print_format", "json", "-show_format", "-show_streams", file_path,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL
+            )
+            stdout, _ = await process.communicate()
+            if process.returncode != 0:
+                return None
+            return parse_probe(json.loads(stdout))
+        except Exception as e:
+            logger.warning(f"Could not probe video {file_path}: {e}")
+            return None
+
     def _get_video_info(self, file_path: str) -> dict:
         """Get video information using FFmpeg"""
         try:
@@ -338,7 +635,6 @@ class VideoProcessor:
             if result.returncode != 0:
                 return {"duration": 0, "width": 0, "height": 0}
             
-            import json
             data = json.loads(result.stdout)
 
             video_stream = None
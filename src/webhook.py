@@ -0,0 +1,197 @@
+"""
+Webhook mode: the Bot API server POSTs updates to our own small HTTP server
+instead of the bot asking for them with getUpdates.
+
+Behind Caddy the public url is https://<domain>/telegram-webhook/, the local
+Bot API server can also use the container address directly, e.g.
+http://chessbot_bot:8443/telegram-webhook/.
+
+- every request must have the X-Telegram-Bot-Api-Secret-Token header set in setWebhook;
+- if the bot is behind (too many updates wait in application.update_queue
+  or in the update processor) the update is rejected with 503, and the Bot API server delivers it again later;
+- GET /healthz reports the queue depth and counters.
+"""
+import asyncio
+import hmac
+import json
+import logging
+import os
+import signal
+
+import tornado.httpserver
+import tornado.netutil
+import tornado.web
+from telegram import Update
+from telegram.ext import Application
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_URL = os.getenv("REPCHESS_WEBHOOK_URL")
+WEBHOOK_LISTEN = os.getenv("REPCHESS_WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("REPCHESS_WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("REPCHESS_WEBHOOK_PATH", "telegram-webhook")
+WEBHOOK_SECRET = os.getenv("REPCHESS_WEBHOOK_SECRET")
+# updates waiting in application.update_queue before new ones get 503
+WEBHOOK_MAX_QUEUE = int(os.getenv("REPCHESS_WEBHOOK_MAX_QUEUE", "1000"))
+# parallel connections the Bot API server may open to us (setWebhook max_connections)
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("REPCHESS_WEBHOOK_MAX_CONNECTIONS", "40"))
+RETRY_AFTER_SECONDS = 1
+
+
+class WebhookStats:
+    def __init__(self):
+        self.accepted = 0
+        self.rejected_busy = 0
+        self.rejected_secret = 0
+        self.bad_requests = 0
+        self.max_queue_depth = 0
+
+
+class UpdateHandler(tornado.web.RequestHandler):
+    def initialize(self, receiver: "WebhookReceiver"):
+        self.receiver = receiver
+
+    def post(self):
+        receiver = self.receiver
+        secret = self.request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+        if not hmac.compare_digest(secret.encode(), receiver.secret_token.encode()):
+            receiver.stats.rejected_secret += 1
+            logger.warning(f"webhook request with wrong secret token from {self.request.remote_ip}")
+            raise tornado.web.HTTPError(403)
+
+        depth = receiver.queue_depth()
+        if depth >= receiver.max_queue:
+            receiver.stats.rejected_busy += 1
+            logger.warning(f"webhook queue is full ({depth} updates), asking Bot API to retry")
+            # not HTTPError: send_error() would drop the header
+            self.set_status(503)
+            self.set_header("Retry-After", str(RETRY_AFTER_SECONDS))
+            return
+
+        try:
+            data = json.loads(self.request.body)
+            update = Update.de_json(data, receiver.application.bot)
+        except Exception as e:
+            receiver.stats.bad_requests += 1
+            logger.error(f"can't parse webhook update: {e}")
+            raise tornado.web.HTTPError(400)
+
+        receiver.application.update_queue.put_nowait(update)
+        receiver.stats.accepted += 1
+        receiver.stats.max_queue_depth = max(receiver.stats.max_queue_depth, depth + 1)
+        self.set_status(200)
+
+    def write_error(self, status_code: int, **kwargs):
+        # no tracebacks or html pages for the Bot API server
+        self.finish()
+
+
+class HealthHandler(tornado.web.RequestHandler):
+    def initialize(self, receiver: "WebhookReceiver"):
+        self.receiver = receiver
+
+    def get(self):
+        self.write(self.receiver.health())
+
+
+class WebhookReceiver:
+    """HTTP server which puts updates from the Bot API server into application.update_queue."""
+    def __init__(
+        self,
+        application: Application,
+        secret_token: str,
+        path: str = WEBHOOK_PATH,
+        max_queue: int = WEBHOOK_MAX_QUEUE,
+    ):
+        if not secret_token:
+            raise ValueError("webhook mode needs a secret token (REPCHESS_WEBHOOK_SECRET)")
+        self.application = application
+        self.secret_token = secret_token
+        self.path = path.strip("/")
+        self.max_queue = max_queue
+        self.stats = WebhookStats()
+        self._server = None
+
+    def queue_depth(self) -> int:
+        # with concurrent updates the queue is emptied at once, the updates wait in the processor
+        processor = getattr(self.application, "update_processor", None)
+        return self.application.update_queue.qsize() + getattr(processor, "pending_updates", 0)
+
+    def health(self) -> dict:
+        return {
+            "pending_updates": self.queue_depth(),
+            "max_queue": self.max_queue,
+            "max_queue_depth": self.stats.max_queue_depth,
+            "accepted": self.stats.accepted,
+            "rejected_busy": self.stats.rejected_busy,
+            "rejected_secret": self.stats.rejected_secret,
+            "bad_requests": self.stats.bad_requests,
+        }
+
+    def make_app(self) -> tornado.web.Application:
+        return tornado.web.Application([
+            (rf"/{self.path}/?", UpdateHandler, {"receiver": self}),
+            (r"/healthz", HealthHandler, {"receiver": self}),
+        ])
+
+    def listen(self, port: int, address: str = WEBHOOK_LISTEN) -> int:
+        """Start listening, returns the port (useful with port=0 in tests)."""
+        self._server = tornado.httpserver.HTTPServer(self.make_app(), xheaders=True)
+        sockets = tornado.netutil.bind_sockets(port, address)
+        self._server.add_sockets(sockets)
+        port = sockets[0].getsockname()[1]
+        logger.info(f"webhook receiver listens on {address}:{port}/{self.path}")
+        return port
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.stop()
+            await self._server.close_all_connections()
+            self._server = None
+
+
+async def serve_webhook(
+    application: Application,
+    receiver: WebhookReceiver,
+    webhook_url: str,
+    port: int,
+    stop: asyncio.Event,
+):
+    """The same lifecycle as Application.run_polling, but updates come from the receiver."""
+    await application.initialize()
+    try:
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+        receiver.listen(port)
+        await application.bot.set_webhook(
+            url=webhook_url,
+            secret_token=receiver.secret_token,
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+            allowed_updates=Update.ALL_TYPES,
+        )
+        logger.info(f"webhook is set to {webhook_url}")
+        await stop.wait()
+    finally:
+        # the webhook is kept: updates wait in the Bot API server until the next start
+        await receiver.stop()
+        if application.running:
+            await application.stop()
+            if application.post_stop:
+                await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+
+def run_webhook(application: Application, webhook_url: str, secret_token: str, port: int = WEBHOOK_PORT):
+    receiver = WebhookReceiver(application, secret_token)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM, signal.SIGABRT):
+        loop.add_signal_handler(sig, stop.set)
+    try:
+        loop.run_until_complete(serve_webhook(application, receiver, webhook_url, port, stop))
+    finally:
+        loop.close()